@@ -0,0 +1,347 @@
+# agents/batch_diagnosis.py
+"""
+Batch diagnosis for field surveys: hundreds of leaf photos from a directory, a
+zip archive or a list of URLs, classified by the pest model in batches.
+
+Images are read, decoded and resized on a thread pool while the previous batch
+is in the model, and rows come out in input order (see `diagnose_images`).
+Low-confidence images are flagged `needs_review`; `start_vision_review` sends one
+to Gemini Vision in the background, so the batch never waits for it.
+
+    python -m tools.diagnose_batch photos/ --out results.csv     # CLI
+    POST /diagnose/batch                                          # API, api/diagnose_router.py
+"""
+import asyncio
+import concurrent.futures
+import functools
+import ipaddress
+import json
+import os
+import socket
+import threading
+import time
+import zipfile
+from collections import deque
+from typing import Callable, Iterable, Iterator
+from urllib.parse import urlparse
+
+import httpx
+import numpy as np
+
+from agents.pest_detection_agent import (
+    CLASS_NAMES, CONFIDENCE_THRESHOLD, DEFAULT_REMEDY, HEALTHY_CLASSES, IMG_SIZE, REMEDY_KNOWLEDGE_BASE,
+    diagnose_with_vision_ai_async,
+)
+from core.config import settings
+from core.http_client import BATCH_MEDIA, get_client, run_sync, submit_async
+from core.inference_engine import EngineOverloadedError
+from core.resilience import call
+from utils.image_admission import ByteCap, ImageRejected
+from utils.image_pipeline import decode_image, open_image
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp")
+CSV_FIELDS = ("name", "class_name", "confidence", "healthy", "needs_review", "remedy", "top_k", "vision_reply", "error")
+
+
+class BatchItem:
+    """One image to diagnose: a name for the results and a callable returning its bytes."""
+
+    __slots__ = ("name", "load")
+
+    def __init__(self, name: str, load: Callable[[], bytes]):
+        self.name = name
+        self.load = load
+
+
+# --- Sources ---
+def _read_file(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+def from_directory(path: str) -> Iterator[BatchItem]:
+    """Image files under `path`, recursively, in a stable order."""
+    for root, dirs, files in os.walk(path):
+        dirs.sort()
+        for name in sorted(files):
+            if name.lower().endswith(IMAGE_EXTENSIONS):
+                full = os.path.join(root, name)
+                yield BatchItem(os.path.relpath(full, path), functools.partial(_read_file, full))
+
+def from_zip(archive: zipfile.ZipFile) -> Iterator[BatchItem]:
+    """Image members of an open zip archive; oversized members fail on load instead of filling memory."""
+    lock = threading.Lock()
+
+    def read(info: zipfile.ZipInfo) -> bytes:
+        if info.file_size > settings.BATCH_MAX_IMAGE_BYTES:
+            raise ValueError(f"{info.file_size} bytes uncompressed exceeds BATCH_MAX_IMAGE_BYTES")
+        with lock:  # one shared file handle underneath
+            return archive.read(info)
+
+    for info in archive.infolist():
+        name = info.filename
+        if not info.is_dir() and name.lower().endswith(IMAGE_EXTENSIONS) and not name.startswith("__MACOSX/"):
+            yield BatchItem(name, functools.partial(read, info))
+
+MAX_REDIRECTS = 5
+
+
+class URLRejected(ValueError):
+    """A batch URL the server will not fetch: not http(s), or a host that is not allowed."""
+
+
+def is_http_url(url: str) -> bool:
+    parsed = urlparse(url)
+    return parsed.scheme in ("http", "https") and bool(parsed.hostname)
+
+async def check_url(url: str) -> str | None:
+    """
+    Raises URLRejected unless `url` is http(s) and its host is in BATCH_URL_ALLOWED_HOSTS
+    or (with no allow-list) resolves only to public addresses, so a caller cannot make
+    the server fetch from itself or its private network. Returns the vetted address to
+    connect to, or None for an allow-listed host.
+    """
+    if not is_http_url(url):
+        raise URLRejected(f"not an http(s) URL: {url[:200]}")
+    parsed = urlparse(url)
+    host = parsed.hostname.lower()
+    if settings.BATCH_URL_ALLOWED_HOSTS:
+        if not any(host == h or host.endswith("." + h) for h in settings.BATCH_URL_ALLOWED_HOSTS):
+            raise URLRejected(f"{host} is not in BATCH_URL_ALLOWED_HOSTS")
+        return None
+    port = parsed.port or (443 if parsed.scheme == "https" else 80)
+    try:
+        infos = await asyncio.get_running_loop().getaddrinfo(host, port, type=socket.SOCK_STREAM)
+    except socket.gaierror as e:
+        raise URLRejected(f"cannot resolve {host}: {e}")
+    addresses = [ipaddress.ip_address(sockaddr[0].split("%", 1)[0]) for *_, sockaddr in infos]
+    for ip in addresses:
+        if not ip.is_global or ip.is_multicast:
+            raise URLRejected(f"{host} resolves to a non-public address ({ip})")
+    return str(addresses[0])
+
+def _pinned(url: str, address: str | None) -> tuple[httpx.URL, dict, dict]:
+    """
+    The request URL, headers and extensions that reach `url` at `address`. Connecting
+    to the address check_url vetted (with the original Host header and TLS server
+    name) means a second DNS lookup cannot swap in a private one.
+    """
+    target = httpx.URL(url)
+    if address is None:
+        return target, {}, {}
+    host = target.host
+    return target.copy_with(host=address), {"Host": target.netloc.decode("ascii")}, {"sni_hostname": host}
+
+async def _fetch(url: str) -> bytes:
+    """
+    Downloads one image, following redirects only to URLs that pass check_url and
+    stopping as soon as the body passes BATCH_MAX_IMAGE_BYTES.
+    """
+    address = await check_url(url)
+
+    async def attempt() -> bytes | ValueError:
+        target, pinned = url, address
+        for _ in range(MAX_REDIRECTS + 1):
+            # Twilio media needs the account credentials; they are never sent to any other host.
+            host = urlparse(target).hostname or ""
+            auth = (settings.TWILIO_ACCOUNT_SID, settings.TWILIO_AUTH_TOKEN) if host.endswith(".twilio.com") else None
+            request_url, headers, extensions = _pinned(target, pinned)
+            async with get_client().stream(
+                "GET", request_url, headers=headers, extensions=extensions, auth=auth,
+                timeout=BATCH_MEDIA.timeout, follow_redirects=False,
+            ) as response:
+                if response.is_redirect:
+                    target = str(httpx.URL(target).join(response.headers["location"]))
+                    try:
+                        pinned = await check_url(target)
+                    except URLRejected as e:
+                        return e
+                    continue
+                response.raise_for_status()
+                # Returned rather than raised: a bad image says nothing about the upstream's health.
+                try:
+                    cap, buffer = ByteCap(settings.BATCH_MAX_IMAGE_BYTES), bytearray()
+                    async for chunk in response.aiter_bytes():
+                        cap.add(len(chunk))
+                        buffer += chunk
+                except ImageRejected as e:
+                    return e
+                return bytes(buffer)
+        return URLRejected(f"more than {MAX_REDIRECTS} redirects")
+
+    result = await call(BATCH_MEDIA, attempt)
+    if isinstance(result, ValueError):
+        raise result
+    return result
+
+def from_urls(urls: Iterable[str]) -> Iterator[BatchItem]:
+    for url in urls:
+        yield BatchItem(url, lambda url=url: run_sync(_fetch(url)))
+
+
+# --- Model access ---
+def engine_predictor(engine) -> Callable[[np.ndarray], np.ndarray]:
+    """
+    A batch predict function over the webhook's shared engine (MicroBatchEngine or
+    sidecar client). Live messages come first: when the engine queue is full, the
+    batch waits for room rather than failing.
+    """
+    def submit(image: np.ndarray) -> concurrent.futures.Future:
+        for _ in range(200):
+            try:
+                return engine.submit(image)
+            except EngineOverloadedError:
+                time.sleep(0.05)
+        raise EngineOverloadedError("inference engine stayed full for 10 s")
+
+    def predict_batch(batch: np.ndarray) -> np.ndarray:
+        if hasattr(engine, "submit"):
+            futures = [submit(image) for image in batch]
+            return np.stack([f.result() for f in futures])
+        return np.stack([engine.predict(image) for image in batch])
+
+    return predict_batch
+
+
+# --- Pipeline ---
+class BatchStats:
+    """Counts and timings for one batch run; `summary()` includes throughput."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.images = self.errors = self.needs_review = self.batches = 0
+        self.bytes_read = 0
+        self.decode_seconds = self.predict_seconds = 0.0
+
+    def summary(self) -> dict:
+        wall = time.perf_counter() - self.started
+        return {
+            "images": self.images,
+            "errors": self.errors,
+            "needs_review": self.needs_review,
+            "batches": self.batches,
+            "megabytes_read": round(self.bytes_read / 1e6, 1),
+            "wall_seconds": round(wall, 2),
+            "images_per_second": round(self.images / wall, 1) if wall else 0.0,
+            "decode_seconds": round(self.decode_seconds, 2),
+            "predict_seconds": round(self.predict_seconds, 2),
+        }
+
+def _prepare(item: BatchItem) -> tuple[np.ndarray, int, float]:
+    started = time.perf_counter()
+    data = item.load()
+    pixels = np.asarray(decode_image(data, IMG_SIZE), dtype=np.uint8)
+    return pixels, len(data), time.perf_counter() - started
+
+def _result(name: str, probabilities: np.ndarray, top_k: int) -> dict:
+    order = np.argsort(probabilities)[::-1][:max(1, top_k)]
+    class_name = CLASS_NAMES[order[0]]
+    confidence = float(probabilities[order[0]])
+    healthy = class_name in HEALTHY_CLASSES
+    return {
+        "name": name,
+        "class_name": class_name,
+        "confidence": round(confidence, 4),
+        "healthy": healthy,
+        "needs_review": confidence < CONFIDENCE_THRESHOLD,
+        "remedy": None if healthy else REMEDY_KNOWLEDGE_BASE.get(class_name, DEFAULT_REMEDY),
+        "top_k": [{"class_name": CLASS_NAMES[i], "probability": round(float(probabilities[i]), 4)} for i in order],
+        "error": None,
+    }
+
+def _error(name: str, e: Exception) -> dict:
+    return {"name": name, "class_name": None, "confidence": None, "healthy": None, "needs_review": False,
+            "remedy": None, "top_k": [], "error": repr(e)}
+
+def diagnose_images(
+    items: Iterable[BatchItem],
+    predict_batch: Callable[[np.ndarray], np.ndarray],
+    batch_size: int = 32,
+    workers: int = 4,
+    top_k: int = 3,
+    stats: BatchStats | None = None,
+) -> Iterator[tuple[BatchItem, dict]]:
+    """
+    Yields (item, result) in input order. `workers` threads load and decode up to
+    two batches ahead while `predict_batch` runs on this thread. An image that
+    cannot be read or decoded gets a result with `error` set; the batch goes on.
+    """
+    stats = stats if stats is not None else BatchStats()
+    source = iter(items)
+    pending: deque[tuple[BatchItem, concurrent.futures.Future]] = deque()
+    batch = np.empty((batch_size, IMG_SIZE, IMG_SIZE, 3), dtype=np.float32)
+
+    with concurrent.futures.ThreadPoolExecutor(workers, thread_name_prefix="batch-decode") as pool:
+        def refill() -> None:
+            while len(pending) < 2 * batch_size:
+                item = next(source, None)
+                if item is None:
+                    return
+                pending.append((item, pool.submit(_prepare, item)))
+
+        refill()
+        while pending:
+            slots: list[tuple[BatchItem, int | Exception]] = []
+            n = 0
+            while pending and n < batch_size:
+                item, future = pending.popleft()
+                refill()
+                try:
+                    batch[n], size, seconds = future.result()
+                except Exception as e:
+                    slots.append((item, e))
+                    continue
+                stats.bytes_read += size
+                stats.decode_seconds += seconds
+                slots.append((item, n))
+                n += 1
+
+            probabilities, failure = None, None
+            if n:
+                started = time.perf_counter()
+                try:
+                    probabilities = np.asarray(predict_batch(batch[:n]))
+                except Exception as e:
+                    failure = e
+                stats.predict_seconds += time.perf_counter() - started
+                stats.batches += 1
+
+            for item, slot in slots:
+                if isinstance(slot, Exception) or failure is not None:
+                    result = _error(item.name, slot if isinstance(slot, Exception) else failure)
+                    stats.errors += 1
+                else:
+                    result = _result(item.name, probabilities[slot], top_k)
+                    stats.needs_review += result["needs_review"]
+                stats.images += 1
+                yield item, result
+
+
+# --- Vision review of low-confidence images ---
+_review_limits: dict[asyncio.AbstractEventLoop, asyncio.Semaphore] = {}
+
+async def _vision_review(item: BatchItem) -> dict:
+    loop = asyncio.get_running_loop()
+    limit = _review_limits.setdefault(loop, asyncio.Semaphore(settings.GEMINI_MAX_CONCURRENCY))
+    # Bounded before loading, so a survey of unclear photos is not all held in memory at once.
+    async with limit:
+        try:
+            data = await asyncio.to_thread(item.load)
+            reply = await diagnose_with_vision_ai_async(open_image(data))
+        except Exception as e:
+            return {"name": item.name, "vision_reply": None, "error": repr(e)}
+    return {"name": item.name, "vision_reply": str(reply), "error": None}
+
+def start_vision_review(item: BatchItem) -> concurrent.futures.Future:
+    """Queues one image for Gemini Vision on the background loop; resolves to {name, vision_reply, error}."""
+    return submit_async(_vision_review(item))
+
+
+# --- Output ---
+def jsonl_line(row: dict) -> str:
+    return json.dumps(row, ensure_ascii=False) + "\n"
+
+def csv_record(row: dict) -> list:
+    """A result or vision review row as CSV_FIELDS values (top-k as "class:probability;...")."""
+    values = dict(row)
+    values["top_k"] = ";".join(f"{t['class_name']}:{t['probability']}" for t in row.get("top_k") or ())
+    return ["" if values.get(field) is None else values[field] for field in CSV_FIELDS]
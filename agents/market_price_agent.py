@@ -1,26 +1,29 @@
 # agents/market_price_agent.py
-import google.generativeai as genai
-from core.config import settings
+import logging
+from core.gemini import get_model_async
+from core.http_client import GEMINI, run_blocking, run_sync
+from core.resilience import CircuitOpenError
+from utils.templates import register_static_text
 
-# Configure the model at the agent level for this specific task
-try:
-    genai.configure(api_key=settings.GEMINI_API_KEY)
-    model = genai.GenerativeModel('gemini-flash-latest')
-except Exception as e:
-    model = None
-    print(f"CRITICAL ERROR in market_price_agent: Failed to configure Gemini AI. Error: {e}")
+logger = logging.getLogger(__name__)
 
-def get_market_price(commodity: str, location: str = 'Khargone') -> str:
+class PriceNotFoundError(LookupError):
+    pass
+
+class PriceServiceUnavailableError(RuntimeError):
+    pass
+
+UNAVAILABLE_MESSAGE = "Sorry, the market price service is currently unavailable."
+MISSING_COMMODITY_MESSAGE = "Please specify which crop you'd like the price for."
+CONNECTION_ERROR_MESSAGE = "Sorry, I'm having trouble connecting to the market price service right now."
+register_static_text(UNAVAILABLE_MESSAGE, MISSING_COMMODITY_MESSAGE, CONNECTION_ERROR_MESSAGE)
+
+async def fetch_market_price(commodity: str, location: str = 'Khargone') -> str:
     """
     Gets the market price for a commodity by asking the Gemini LLM,
-    requesting a WhatsApp-formatted response.
+    requesting a WhatsApp-formatted response. Raises on failure so callers
+    (and caches) can tell errors apart from real answers.
     """
-    if not model:
-        return "Sorry, the market price service is currently unavailable."
-
-    if not commodity:
-        return "Please specify which crop you'd like the price for."
-
     # --- REVISED PROMPT TO REQUEST FORMATTING ---
     prompt = (
         f"What is the most recent modal price for '{commodity}' in the '{location}' district of Madhya Pradesh, India? "
@@ -31,14 +34,39 @@ def get_market_price(commodity: str, location: str = 'Khargone') -> str:
         f"*- Price:* Around ₹[Price] per Quintal"
     )
 
-    try:
-        response = model.generate_content(prompt)
-        if response.text and len(response.text) > 10:
-             return response.text.strip()
-        else:
-             # Formatted fallback response
-             return f"⚠️ Sorry, I couldn't find a specific price for *{commodity}* in *{location}* right now."
+    model = await get_model_async()
+    if not model:
+        raise PriceServiceUnavailableError("Gemini is not configured")
+    response = await run_blocking(GEMINI, model.generate_content, prompt)
+    if response.text and len(response.text) > 10:
+        return response.text.strip()
+    raise PriceNotFoundError(f"No price found for {commodity} in {location}")
+
+def market_price_error_message(commodity: str, location: str, e: Exception) -> str:
+    if isinstance(e, (PriceServiceUnavailableError, CircuitOpenError)):
+        return UNAVAILABLE_MESSAGE
+    if isinstance(e, PriceNotFoundError):
+        # Formatted fallback response
+        return f"⚠️ Sorry, I couldn't find a specific price for *{commodity}* in *{location}* right now."
+    logger.error("Market price AI error: %r", e)
+    return CONNECTION_ERROR_MESSAGE
+
+def check_request(commodity: str) -> str | None:
+    """Returns a reply explaining why the request cannot be served, or None if it can."""
+    if not commodity:
+        return MISSING_COMMODITY_MESSAGE
+    return None
 
+async def get_market_price_async(commodity: str, location: str = 'Khargone') -> str:
+    """Gets a WhatsApp-formatted market price, or a friendly error message."""
+    problem = check_request(commodity)
+    if problem:
+        return problem
+    try:
+        return await fetch_market_price(commodity, location)
     except Exception as e:
-        print(f"Market Price AI Error: {e}")
-        return "Sorry, I'm having trouble connecting to the market price service right now."
\ No newline at end of file
+        return market_price_error_message(commodity, location, e)
+
+def get_market_price(commodity: str, location: str = 'Khargone') -> str:
+    """Sync wrapper around get_market_price_async."""
+    return run_sync(get_market_price_async(commodity, location))
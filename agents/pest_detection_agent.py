@@ -1,21 +1,35 @@
 # agents/pest_detection_agent.py (Optimized Drop-in Replacement)
 
-import requests
+import asyncio
+import logging
 import numpy as np
 import json
-import os
-import uuid
-from keras.utils import load_img, img_to_array
-from keras.applications.efficientnet import preprocess_input
+import time
+from core.cache import CACHES, NearDuplicateCache
 from core.config import settings
-from keras.models import Model
-from keras.applications import EfficientNetB0
-from keras.layers import Input, GlobalAveragePooling2D, Dense, Dropout
-import google.generativeai as genai
+from core.gemini import VISION_MODEL, get_model_async
+from core.inference_engine import MicroBatchEngine, EngineOverloadedError
+from core.inference_server import InferenceClient
+from core.model_backends import load_backend
+from core.http_client import GEMINI, TWILIO_MEDIA, get_client, run_blocking, run_sync
+from core.lazy import LazyResource
+from core.resilience import call
+from core.metrics import DIAGNOSES, ERRORS, IMAGES_REJECTED, STAGE_SECONDS
+from utils.image_admission import ByteCap, ImageRejected, check_quality, check_response, probe, vision_payload
+from utils.image_hash import HASHERS
+from utils.image_pipeline import decode_image, open_image, to_model_input
+from utils.templates import TemplatedText, register_static_text, register_template
 from PIL import Image
 
+logger = logging.getLogger(__name__)
+
 # --- Model architecture definition (no changes needed) ---
 def create_model_architecture(num_classes):
+    # Keras/TensorFlow are imported here, not at module import, to keep startup fast.
+    from keras.models import Model
+    from keras.applications import EfficientNetB0
+    from keras.layers import Input, GlobalAveragePooling2D, Dense, Dropout
+
     inputs = Input(shape=(224, 224, 3))
     base_model = EfficientNetB0(weights=None, include_top=False, input_tensor=inputs)
     x = base_model.output
@@ -26,17 +40,60 @@ def create_model_architecture(num_classes):
     model = Model(inputs=inputs, outputs=outputs)
     return model
 
-# --- Model and Class Name Loading ---
+IMG_SIZE = 224
+
+# --- Class Name Loading ---
 try:
     with open(settings.CLASS_NAMES_PATH, 'r') as f:
         CLASS_NAMES = json.load(f)
-    model = create_model_architecture(num_classes=len(CLASS_NAMES))
-    model.load_weights(settings.MODEL_PATH)
 except Exception as e:
-    print(f"CRITICAL ERROR: Failed to load ML model or class names: {e}")
-    model = None
+    logger.critical("Failed to load class names: %s", e)
     CLASS_NAMES = []
 
+# --- Model Loading and Micro-batching Inference Engine ---
+# Loaded lazily (or on a background thread at startup, see main.py), not at import.
+# Concurrent image requests are grouped into small batches and run on one worker thread.
+def load_pest_backend(name: str | None = None):
+    """The classifier runtime selected by INFERENCE_BACKEND (Keras, TFLite or ONNX)."""
+    if not CLASS_NAMES:
+        raise RuntimeError("class names are not loaded")
+    return load_backend(
+        name or settings.INFERENCE_BACKEND,
+        build_fn=lambda: create_model_architecture(num_classes=len(CLASS_NAMES)),
+        keras_path=settings.MODEL_PATH,
+        tflite_path=settings.TFLITE_MODEL_PATH,
+        onnx_path=settings.ONNX_MODEL_PATH,
+        num_threads=settings.INFERENCE_THREADS,
+    )
+
+def build_local_engine() -> MicroBatchEngine:
+    """Loads the model in this process and starts its micro-batching engine."""
+    backend = load_pest_backend()
+    logger.info("Pest model loaded (%s backend).", backend.name)
+    engine = MicroBatchEngine(
+        backend.predict_on_batch,
+        input_shape=(IMG_SIZE, IMG_SIZE, 3),
+        max_batch_size=settings.INFERENCE_MAX_BATCH_SIZE,
+        max_wait_ms=settings.INFERENCE_MAX_WAIT_MS,
+        max_queue_size=settings.INFERENCE_QUEUE_SIZE,
+        name="pest-inference",
+    ).start()
+    # Warm-up: build the predict graph now rather than on the first farmer's photo.
+    engine.predict(np.zeros((IMG_SIZE, IMG_SIZE, 3), dtype=np.float32))
+    return engine
+
+def _load_inference_engine() -> MicroBatchEngine | InferenceClient:
+    # In sidecar mode the model lives in core/inference_server.py's process and this
+    # worker only holds a socket client with the same predict() interface.
+    if settings.INFERENCE_MODE == "sidecar":
+        client = InferenceClient(settings.INFERENCE_SOCKET, settings.INFERENCE_SIDECAR_TIMEOUT)
+        client.wait_until_available(settings.INFERENCE_SIDECAR_STARTUP_TIMEOUT)
+        logger.info("Connected to inference sidecar at %s.", settings.INFERENCE_SOCKET)
+        return client
+    return build_local_engine()
+
+pest_model = LazyResource("pest_model", _load_inference_engine)
+
 # --- 1. Comprehensive Set of Healthy Classes ---
 # This set explicitly defines all class names that represent a healthy plant.
 HEALTHY_CLASSES = {
@@ -81,22 +138,30 @@ REMEDY_KNOWLEDGE_BASE = {
     "Tomato mold leaf": "Also known as Leaf Mold. Ensure good air circulation and lower humidity. Apply fungicides containing chlorothalonil or mancozeb."
 }
 DEFAULT_REMEDY = "Consult a local agricultural expert for specific treatment options."
-IMG_SIZE = 224
 
-# --- Gemini Vision AI Fallback Configuration ---
-try:
-    genai.configure(api_key=settings.GEMINI_API_KEY)
-    vision_model = genai.GenerativeModel('gemini-pro-vision')
-    print("✅ Gemini Vision model configured successfully for pest detection fallback.")
-except Exception as e:
-    vision_model = None
-    print(f"WARNING: Could not configure Gemini Vision model. Fallback will not work. Error: {e}")
+# Below this top-1 probability the local model's answer goes to Gemini Vision instead.
+CONFIDENCE_THRESHOLD = 0.50
+
+# --- Diagnosis cache keyed by a perceptual hash of the decoded photo ---
+# Entries are dicts of class_name, confidence, vision_reply (None if the local model
+# was confident) and the seconds inference and vision AI took, which hits add to the
+# saved_* counters.
+diagnosis_cache = NearDuplicateCache(
+    "diagnosis", settings.DIAGNOSIS_CACHE_SIZE, settings.DIAGNOSIS_CACHE_MAX_DISTANCE
+)
+diagnosis_cache.stats.update(saved_inference_seconds=0.0, saved_vision_calls=0, saved_vision_seconds=0.0)
+CACHES[diagnosis_cache.name] = diagnosis_cache
+image_hash = HASHERS[settings.DIAGNOSIS_HASH]
 
-def diagnose_with_vision_ai(image_path: str) -> str:
+# --- Gemini Vision AI Fallback ---
+VISION_UNAVAILABLE_MESSAGE = "AI Vision model is not available. Please check server configuration."
+VISION_FAILED_MESSAGE = "The advanced AI analysis failed. Please ensure the image is clear."
+
+async def diagnose_with_vision_ai_async(img: Image.Image) -> str:
+    vision_model = await get_model_async(VISION_MODEL)
     if not vision_model:
-        return "AI Vision model is not available. Please check server configuration."
+        return VISION_UNAVAILABLE_MESSAGE
     try:
-        img = Image.open(image_path)
         prompt = (
             "You are an expert agriculturalist. Analyze this image of a plant leaf. "
             "Identify any disease or pest. If it's healthy, say so. "
@@ -104,77 +169,189 @@ def diagnose_with_vision_ai(image_path: str) -> str:
             "Format the response as: 'Diagnosis: [Your Diagnosis]. Suggested Remedy: [Your Remedy].' "
             "Disclaimer: This is an AI suggestion. Consult a local expert."
         )
-        response = vision_model.generate_content([prompt, img])
+        payload = await asyncio.to_thread(vision_payload, img)
+        response = await run_blocking(GEMINI, vision_model.generate_content, [prompt, payload])
         return response.text.strip()
     except Exception as e:
-        print(f"Gemini Vision Error: {e}")
-        return "The advanced AI analysis failed. Please ensure the image is clear."
+        logger.error("Gemini vision error: %r", e)
+        ERRORS.inc("vision_fallback")
+        return VISION_FAILED_MESSAGE
+
+def diagnose_with_vision_ai(img: Image.Image) -> str:
+    """Sync wrapper around diagnose_with_vision_ai_async."""
+    return run_sync(diagnose_with_vision_ai_async(img))
+
+def _classify(engine: MicroBatchEngine | InferenceClient, image_bytes: bytes | bytearray) -> tuple[int, dict | None, np.ndarray | None]:
+    """
+    Decodes and hashes one image, raises ImageRejected if it fails the quality gate,
+    then returns (hash, cached diagnosis, None) on a cache hit or
+    (hash, None, class probabilities) after running the model.
+    Runs on a worker thread; the thread-local input buffer stays in use until the
+    engine has copied it into the batch, so decode and predict must stay together here.
+    """
+    with STAGE_SECONDS.time("preprocessing"):
+        img = decode_image(image_bytes, IMG_SIZE)
+        key = image_hash(img)
+    with STAGE_SECONDS.time("admission"):
+        check_quality(img)
+    cached = diagnosis_cache.get(key)
+    if cached is not None:
+        return key, cached, None
+    # EfficientNet's preprocess_input is a pass-through (rescaling is a layer inside the
+    # model), so the raw 0-255 input is what every backend expects and Keras is not needed here.
+    with STAGE_SECONDS.time("model_predict"):
+        return key, None, engine.predict(to_model_input(img), timeout=settings.INFERENCE_PREDICT_TIMEOUT)
+
+def _reply_from_cache(cached: dict) -> str:
+    stats = diagnosis_cache.stats
+    stats["saved_inference_seconds"] += cached["inference_seconds"]
+    if cached["vision_reply"] is not None:
+        stats["saved_vision_calls"] += 1
+        stats["saved_vision_seconds"] += cached["vision_seconds"]
+        return cached["vision_reply"]
+    return _format_diagnosis(cached["class_name"], cached["confidence"])
+
+async def _download_image(image_url: str) -> bytearray:
+    """
+    Streams the Twilio media body into an in-memory buffer. Raises ImageRejected,
+    without reading the rest of the body, for media that is not a photo or too large.
+    """
+    async def attempt() -> bytearray | ImageRejected:
+        async with get_client().stream(
+            "GET",
+            image_url,
+            auth=(settings.TWILIO_ACCOUNT_SID, settings.TWILIO_AUTH_TOKEN),
+            timeout=TWILIO_MEDIA.timeout,
+        ) as response:
+            response.raise_for_status()
+            # Returned rather than raised: a farmer's video says nothing about Twilio's health.
+            try:
+                check_response(response.headers)
+                cap, buffer = ByteCap(), bytearray()
+                async for chunk in response.aiter_bytes():
+                    cap.add(len(chunk))
+                    buffer += chunk
+            except ImageRejected as e:
+                return e
+        return buffer
+
+    result = await call(TWILIO_MEDIA, attempt)
+    if isinstance(result, ImageRejected):
+        raise result
+    return result
+
+def _rejected(e: ImageRejected) -> str:
+    logger.info("Photo rejected before diagnosis (%s)", e)
+    IMAGES_REJECTED.inc(e.reason)
+    return e.reply
+
+# --- Reply templates (skeletons are translated once and cached) ---
+HEALTHY_TEMPLATE = register_template(
+    "✅ *Diagnosis:* Healthy\n\n"
+    "Looks like a healthy {diagnosis}.\n\n"
+    "- *Recommendation:* Your plant appears healthy. Continue to monitor for pests and ensure proper watering.\n"
+    "_(Model Confidence: {confidence})_"
+)
+DISEASED_TEMPLATE = register_template(
+    "🩺 *Diagnosis:* {diagnosis}\n\n"
+    "- *Suggested Remedy:* {remedy}\n\n"
+    "_(Model Confidence: {confidence})_\n\n"
+    "```Disclaimer: This is an AI suggestion. Always consult a local expert.```"
+)
+register_static_text(DEFAULT_REMEDY, *REMEDY_KNOWLEDGE_BASE.values())
+register_static_text(*(name.replace('_', ' ') for name in CLASS_NAMES))
+register_static_text(
+    "Could not download the image from the provided URL. Please try again.",
+    "Our diagnosis service is busy right now. Please send the photo again in a minute.",
+    "Could not process the image. Please try sending a clear photo of a single leaf.",
+)
+
+def _format_diagnosis(class_name: str, confidence: float) -> str:
+    is_healthy = class_name in HEALTHY_CLASSES
+    diagnosis = class_name.replace('_', ' ')
+
+    if is_healthy:
+        # --- FORMATTED HEALTHY RESPONSE ---
+        return TemplatedText(
+            HEALTHY_TEMPLATE,
+            {"diagnosis": diagnosis, "confidence": f"{confidence:.1%}"},
+            translatable=("diagnosis",),
+        )
+    else:
+        # --- FORMATTED DISEASED RESPONSE ---
+        remedy = REMEDY_KNOWLEDGE_BASE.get(class_name, DEFAULT_REMEDY)
+        return TemplatedText(
+            DISEASED_TEMPLATE,
+            {"diagnosis": diagnosis, "remedy": remedy, "confidence": f"{confidence:.1%}"},
+            translatable=("diagnosis", "remedy"),
+        )
 
 # --- Main Diagnosis Function with Optimized Logic ---
-def diagnose_from_url(image_url: str) -> str:
-    if not model:
+async def diagnose_from_url_async(image_url: str) -> str:
+    # Waits for the model off the event loop if it is still loading.
+    engine = pest_model.value if pest_model.ready else await asyncio.to_thread(pest_model.get)
+    if not engine:
         return "Error: The primary diagnosis model is not loaded. Please check server logs."
     
-    # --- Image download logic (no changes) ---
+    # --- Image download: kept in memory, never written to disk ---
     try:
-        response = requests.get(
-            image_url,
-            auth=(settings.TWILIO_ACCOUNT_SID, settings.TWILIO_AUTH_TOKEN)
-        )
-        response.raise_for_status()
-        temp_dir = os.getenv("TEMP_DIR", "/tmp") 
-        os.makedirs(temp_dir, exist_ok=True)
-        image_path = os.path.join(temp_dir, f"{uuid.uuid4()}.jpg")
-        with open(image_path, "wb") as f: f.write(response.content)
+        with STAGE_SECONDS.time("image_download"):
+            image_bytes = await _download_image(image_url)
+        probe(image_bytes)
+    except ImageRejected as e:
+        return _rejected(e)
     except Exception as e:
-        print(f"Image Download Error: {e}")
+        logger.error("Image download error: %r", e)
+        ERRORS.inc("image_download")
         return "Could not download the image from the provided URL. Please try again."
 
     try:
-        img = load_img(image_path, target_size=(IMG_SIZE, IMG_SIZE), color_mode='rgb')
-        img_array = img_to_array(img)
-        img_array = np.expand_dims(img_array, axis=0)
-        processed_image = preprocess_input(img_array)
-        predictions = model.predict(processed_image, verbose=0)
-        
-        confidence = np.max(predictions[0])
-        class_name = CLASS_NAMES[np.argmax(predictions[0])]
-        
-        CONFIDENCE_THRESHOLD = 0.50
-        
+        started = time.perf_counter()
+        key, cached, predictions = await asyncio.to_thread(_classify, engine, image_bytes)
+        if cached is not None:
+            logger.debug("Diagnosis cache hit (%s)", cached["class_name"])
+            DIAGNOSES.inc("cache")
+            return _reply_from_cache(cached)
+        inference_seconds = time.perf_counter() - started
+
+        confidence = float(np.max(predictions))
+        class_name = CLASS_NAMES[np.argmax(predictions)]
+        entry = {"class_name": class_name, "confidence": confidence, "vision_reply": None,
+                 "inference_seconds": inference_seconds, "vision_seconds": 0.0}
+
         if confidence >= CONFIDENCE_THRESHOLD:
-            print(f"--- High Confidence Diagnosis ({confidence:.1%}) from Local Model ---")
-            
-            is_healthy = class_name in HEALTHY_CLASSES
-            diagnosis = class_name.replace('_', ' ')
-            os.remove(image_path)
-
-            if is_healthy:
-                # --- FORMATTED HEALTHY RESPONSE ---
-                return (
-                    f"✅ *Diagnosis:* Healthy\n\n"
-                    f"Looks like a healthy {diagnosis}.\n\n"
-                    f"- *Recommendation:* Your plant appears healthy. Continue to monitor for pests and ensure proper watering.\n"
-                    f"_(Model Confidence: {confidence:.1%})_"
-                )
-            else:
-                # --- FORMATTED DISEASED RESPONSE ---
-                remedy = REMEDY_KNOWLEDGE_BASE.get(class_name, DEFAULT_REMEDY)
-                return (
-                    f"🩺 *Diagnosis:* {diagnosis}\n\n"
-                    f"- *Suggested Remedy:* {remedy}\n\n"
-                    f"_(Model Confidence: {confidence:.1%})_\n\n"
-                    f"```Disclaimer: This is an AI suggestion. Always consult a local expert.```"
-                )
+            logger.debug("High confidence diagnosis (%.1f%%) from local model", confidence * 100)
+            DIAGNOSES.inc("model")
+            diagnosis_cache.set(key, entry)
+            return _format_diagnosis(class_name, confidence)
         else:
-            print(f"--- Low Confidence ({confidence:.1%}). Falling back to Gemini Vision AI. ---")
-            vision_result = diagnose_with_vision_ai(image_path)
-            os.remove(image_path)
-            # The vision model is already prompted to provide a formatted response, so no change is needed here.
-            return vision_result
+            logger.debug("Low confidence (%.1f%%), falling back to Gemini vision AI", confidence * 100)
+            DIAGNOSES.inc("vision")
+            # The vision model gets the downloaded photo, downscaled for upload (vision_payload).
+            # It is already prompted to provide a formatted response, so no change is needed here.
+            started = time.perf_counter()
+            with STAGE_SECONDS.time("vision_fallback"):
+                reply = await diagnose_with_vision_ai_async(open_image(image_bytes))
+            if reply not in (VISION_UNAVAILABLE_MESSAGE, VISION_FAILED_MESSAGE):
+                entry.update(vision_reply=reply, vision_seconds=time.perf_counter() - started)
+                diagnosis_cache.set(key, entry)
+            return reply
 
+    except ImageRejected as e:
+        return _rejected(e)
+    except EngineOverloadedError as e:
+        logger.warning("Prediction queue full: %s", e)
+        ERRORS.inc("model_overloaded")
+        return "Our diagnosis service is busy right now. Please send the photo again in a minute."
+    except TimeoutError:
+        logger.warning("Prediction took longer than %.0fs", settings.INFERENCE_PREDICT_TIMEOUT)
+        ERRORS.inc("model_timeout")
+        return "Our diagnosis service is busy right now. Please send the photo again in a minute."
     except Exception as e:
-        if os.path.exists(image_path):
-            os.remove(image_path)
-        print(f"Prediction Error: {e}")
-        return "Could not process the image. Please try sending a clear photo of a single leaf."
\ No newline at end of file
+        logger.error("Prediction error: %r", e)
+        ERRORS.inc("model_predict")
+        return "Could not process the image. Please try sending a clear photo of a single leaf."
+
+def diagnose_from_url(image_url: str) -> str:
+    """Sync wrapper around diagnose_from_url_async."""
+    return run_sync(diagnose_from_url_async(image_url))
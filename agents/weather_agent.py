@@ -1,43 +1,89 @@
 # agents/weather_agent.py
-import requests
-import time
+import logging
+import httpx
 from core.config import settings
+from core.http_client import WEATHER, get_client, run_sync
+from core.resilience import CircuitOpenError, call
+from utils.templates import TemplatedText, register_static_text, register_template
 
-def get_weather_forecast(location: str) -> str:
-    """Returns a simplified, well-formatted weather forecast for WhatsApp."""
+logger = logging.getLogger(__name__)
+
+class WeatherConfigError(RuntimeError):
+    pass
+
+# --- REVISED FORMATTED REPORT ---
+REPORT_TEMPLATE = register_template(
+    "🌤️ *Weather in {location}*\n\n"
+    "*- Condition:* {condition}\n"
+    "*- Temp:* *{temp}°C* (Feels like: {feels_like}°C)\n"
+    "*- Humidity:* *{humidity}%*\n\n"
+    "💡 *Advisory:* {advisory}"
+)
+ADVISORY_FAVORABLE = "Weather seems favorable for normal farming activities."
+ADVISORY_RAIN = "Rain expected. Ensure proper drainage and protect crops if necessary."
+ADVISORY_HEAT = "High temperatures expected. Ensure adequate irrigation for crops."
+FETCH_FAILED_MESSAGE = "Sorry, I couldn't fetch the weather right now."
+register_static_text(ADVISORY_FAVORABLE, ADVISORY_RAIN, ADVISORY_HEAT, FETCH_FAILED_MESSAGE)
+
+def _format_report(location: str, data: dict) -> str:
+    temp = data['main']['temp']
+    feels_like = data['main']['feels_like']
+    humidity = data['main']['humidity']
+    weather_desc = data['weather'][0]['description']
+
+    advisory = ADVISORY_FAVORABLE
+    if "rain" in weather_desc.lower():
+        advisory = ADVISORY_RAIN
+    elif temp > 35:
+        advisory = ADVISORY_HEAT
+
+    return TemplatedText(
+        REPORT_TEMPLATE,
+        {
+            "location": location.capitalize(),
+            "condition": weather_desc.capitalize(),
+            "temp": temp,
+            "feels_like": feels_like,
+            "humidity": humidity,
+            "advisory": advisory,
+        },
+        translatable=("condition", "advisory"),
+    )
+
+async def fetch_weather_report(location: str) -> str:
+    """Fetches and formats the report. Raises on failure so callers (and caches) can tell errors apart."""
     api_key = settings.WEATHER_API_KEY
     if not api_key:
-        return "Error: Weather API key not configured."
-    
-    url = "http://api.openweathermap.org/data/2.5/weather"
+        raise WeatherConfigError("Weather API key not configured.")
+
     params = {"q": location, "appid": api_key, "units": "metric"}
-    
-    try:
-        response = requests.get(url, params=params)
+
+    async def attempt() -> httpx.Response:
+        response = await get_client().get(settings.WEATHER_API_URL, params=params, timeout=WEATHER.timeout)
         response.raise_for_status()
-        data = response.json()
-        
-        temp = data['main']['temp']
-        feels_like = data['main']['feels_like']
-        humidity = data['main']['humidity']
-        weather_desc = data['weather'][0]['description']
-        
-        advisory = "Weather seems favorable for normal farming activities."
-        if "rain" in weather_desc.lower():
-            advisory = "Rain expected. Ensure proper drainage and protect crops if necessary."
-        elif temp > 35:
-            advisory = "High temperatures expected. Ensure adequate irrigation for crops."
-
-        # --- REVISED FORMATTED REPORT ---
-        report = (f"🌤️ *Weather in {location.capitalize()}*\n\n"
-                  f"*- Condition:* {weather_desc.capitalize()}\n"
-                  f"*- Temp:* *{temp}°C* (Feels like: {feels_like}°C)\n"
-                  f"*- Humidity:* *{humidity}%*\n\n"
-                  f"💡 *Advisory:* {advisory}")
-        return report
-
-    except requests.exceptions.HTTPError as e:
+        return response
+
+    # A GET is safe to hedge when OpenWeatherMap is slow.
+    response = await call(WEATHER, attempt, hedge=True)
+    return _format_report(location, response.json())
+
+def weather_error_message(location: str, e: Exception) -> str:
+    if isinstance(e, WeatherConfigError):
+        return f"Error: {e}"
+    if isinstance(e, httpx.HTTPStatusError):
         return f"Could not retrieve weather for '{location}'. Please check the city name."
+    if isinstance(e, CircuitOpenError):
+        return FETCH_FAILED_MESSAGE
+    logger.error("Weather error: %r", e)
+    return FETCH_FAILED_MESSAGE
+
+async def get_weather_forecast_async(location: str) -> str:
+    """Returns a simplified, well-formatted weather forecast for WhatsApp."""
+    try:
+        return await fetch_weather_report(location)
     except Exception as e:
-        print(f"Weather Error: {e}")
-        return "Sorry, I couldn't fetch the weather right now."
\ No newline at end of file
+        return weather_error_message(location, e)
+
+def get_weather_forecast(location: str) -> str:
+    """Sync wrapper around get_weather_forecast_async."""
+    return run_sync(get_weather_forecast_async(location))
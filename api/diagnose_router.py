@@ -0,0 +1,151 @@
+# api/diagnose_router.py
+"""
+POST /diagnose/batch: batch diagnosis of survey photos for extension workers
+(agents/batch_diagnosis.py). The request body is one of
+  application/json      {"urls": ["https://...", ...]}
+  application/zip       a zip archive of photos
+  multipart/form-data   a zip archive in the "archive" field
+Query parameters: format (jsonl or csv), top_k, vision_review.
+
+Rows are streamed as they are diagnosed, in input order, using the webhook's
+pest model engine. Gemini Vision replies for low-confidence photos (with
+vision_review) follow as extra rows, and a JSONL response ends with a
+{"summary": ...} line with throughput. The endpoint is disabled unless
+BATCH_API_TOKEN is set, and callers send it as "Authorization: Bearer <token>".
+"""
+import asyncio
+import concurrent.futures
+import csv
+import hmac
+import io
+import logging
+import tempfile
+import zipfile
+from itertools import islice
+from typing import Annotated, AsyncIterator, Iterator
+
+from fastapi import APIRouter, Header, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+
+from agents.batch_diagnosis import (
+    CSV_FIELDS, BatchItem, BatchStats, csv_record, diagnose_images, engine_predictor, from_urls, from_zip,
+    is_http_url, jsonl_line, start_vision_review,
+)
+from agents.pest_detection_agent import pest_model
+from core.config import settings
+
+logger = logging.getLogger(__name__)
+router = APIRouter()
+
+
+async def _spool(chunks: AsyncIterator[bytes]) -> tempfile.SpooledTemporaryFile:
+    """Copies an upload to a file the streamed response owns, enforcing BATCH_MAX_UPLOAD_MB."""
+    limit = settings.BATCH_MAX_UPLOAD_MB * 1024 * 1024
+    spool = tempfile.SpooledTemporaryFile(max_size=16 * 1024 * 1024)
+    size = 0
+    async for chunk in chunks:
+        size += len(chunk)
+        if size > limit:
+            spool.close()
+            raise HTTPException(413, f"upload exceeds BATCH_MAX_UPLOAD_MB ({settings.BATCH_MAX_UPLOAD_MB})")
+        spool.write(chunk)
+    spool.seek(0)
+    return spool
+
+async def _read_chunks(upload) -> AsyncIterator[bytes]:
+    while chunk := await upload.read(1024 * 1024):
+        yield chunk
+
+def _open_zip(file) -> zipfile.ZipFile:
+    try:
+        return zipfile.ZipFile(file)
+    except zipfile.BadZipFile:
+        raise HTTPException(400, "body is not a valid zip archive")
+
+async def _items(request: Request) -> tuple[list[BatchItem], zipfile.ZipFile | None]:
+    ctype = request.headers.get("content-type", "").lower()
+    archive = None
+    if "application/json" in ctype:
+        body = await request.json()
+        urls = body.get("urls") if isinstance(body, dict) else None
+        if not isinstance(urls, list) or not all(isinstance(u, str) and is_http_url(u) for u in urls):
+            raise HTTPException(400, 'expected {"urls": ["https://...", ...]}')
+        source = from_urls(urls)
+    elif "multipart/form-data" in ctype:
+        form = await request.form()
+        upload = form.get("archive")
+        if upload is None or isinstance(upload, str):
+            raise HTTPException(400, 'expected a zip file in the "archive" field')
+        # The form's files are closed with the request, before the response has streamed.
+        archive = _open_zip(await _spool(_read_chunks(upload)))
+        source = from_zip(archive)
+    elif "zip" in ctype:
+        archive = _open_zip(await _spool(request.stream()))
+        source = from_zip(archive)
+    else:
+        raise HTTPException(415, "send JSON with urls, a zip archive or a multipart upload")
+
+    items = list(islice(source, settings.BATCH_MAX_IMAGES + 1))
+    if len(items) > settings.BATCH_MAX_IMAGES:
+        if archive is not None:
+            archive.close()
+        raise HTTPException(413, f"more than BATCH_MAX_IMAGES ({settings.BATCH_MAX_IMAGES}) photos")
+    return items, archive
+
+def _rows(items: list[BatchItem], archive: zipfile.ZipFile | None, engine, fmt: str, top_k: int, vision_review: bool) -> Iterator[str]:
+    stats = BatchStats()
+    reviews: list[concurrent.futures.Future] = []
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def render(row: dict) -> str:
+        if fmt == "jsonl":
+            return jsonl_line(row)
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerow(csv_record(row))
+        return buffer.getvalue()
+
+    try:
+        if fmt == "csv":
+            writer.writerow(CSV_FIELDS)
+            yield buffer.getvalue()
+        results = diagnose_images(items, engine_predictor(engine), settings.BATCH_SIZE, settings.BATCH_WORKERS, top_k, stats)
+        for item, result in results:
+            if vision_review and result["needs_review"]:
+                reviews.append(start_vision_review(item))
+            yield render(result)
+        for future in concurrent.futures.as_completed(reviews):
+            yield render(future.result())
+    finally:
+        for future in reviews:
+            future.cancel()
+        if archive is not None:
+            archive.close()
+
+    summary = {**stats.summary(), "vision_reviews": len(reviews)}
+    logger.info("Batch diagnosis finished: %s", summary)
+    if fmt == "jsonl":
+        yield jsonl_line({"summary": summary})
+
+@router.post("/batch")
+async def diagnose_batch(
+    request: Request,
+    format: Annotated[str, Query(pattern="^(jsonl|csv)$")] = "jsonl",
+    top_k: Annotated[int, Query(ge=1, le=10)] = 3,
+    vision_review: bool = False,
+    authorization: Annotated[str | None, Header()] = None,
+):
+    """Diagnoses every photo in the request and streams one row per photo (see module docstring)."""
+    if not settings.BATCH_API_TOKEN:
+        raise HTTPException(404, "batch diagnosis is not enabled")
+    if not hmac.compare_digest((authorization or "").encode(), f"Bearer {settings.BATCH_API_TOKEN}".encode()):
+        raise HTTPException(401, "invalid token")
+
+    engine = await asyncio.to_thread(pest_model.get)
+    if not engine:
+        raise HTTPException(503, "pest model is not available")
+
+    items, archive = await _items(request)
+    media_type = "application/x-ndjson" if format == "jsonl" else "text/csv"
+    return StreamingResponse(_rows(items, archive, engine, format, top_k, vision_review), media_type=media_type)
@@ -1,69 +1,152 @@
-import json
-import traceback
+import asyncio
+import logging
+import time
+import httpx
 from fastapi import APIRouter, Form, Response
 from twilio.twiml.messaging_response import MessagingResponse
 from typing import Annotated
 from core import router as tools
-from agents.pest_detection_agent import diagnose_from_url
-from utils.ai_processor import handle_query_with_ai, translate_final_text
+from core.config import settings
+from core.job_queue import JobQueue, JobWorkerPool, PermanentJobError
+from core.metrics import ERRORS, REPLY_SECONDS, STAGE_SECONDS, WEBHOOK_SECONDS
+from core.sessions import create_session_store
+from core.twilio_api import send_message
+from agents.pest_detection_agent import diagnose_from_url_async
+from utils.ai_processor import handle_query_with_ai_async, translate_final_text_async, translate_final_texts_async
+from utils.templates import register_static_text
+from utils.translation import cached_translation_async
 
+logger = logging.getLogger(__name__)
 router = APIRouter()
-user_sessions = {}
+sessions = create_session_store(
+    settings.SESSION_BACKEND, settings.SESSION_TTL, settings.SESSION_MAX_USERS,
+    sqlite_path=settings.SESSION_DB_PATH,
+    history_messages=settings.SESSION_HISTORY_MESSAGES,
+    context_ttl=settings.SESSION_CONTEXT_TTL,
+)
 
-@router.post("/chat")
-async def chat_webhook(
-    From: Annotated[str, Form()],
-    Body: Annotated[str, Form()],
-    NumMedia: Annotated[int, Form()] = 0,
-    MediaUrl0: Annotated[str | None, Form()] = None
-):
-    response_twiml = MessagingResponse()
+ANALYZING_PHOTO_MESSAGE = "🔍 Analyzing your photo, the diagnosis will follow in a moment..."
+register_static_text(ANALYZING_PHOTO_MESSAGE)
+
+async def build_reply(user_id: str, body: str, num_media: int = 0, media_url: str | None = None) -> str:
+    """Works out the translated reply to one incoming message and records it in the user's session."""
     final_reply = ""
-    user_id = From
+    session, lang_code = None, None
+    user_message, reply_en = body, ""
+    kind = "photo" if num_media > 0 and media_url else "text"
+    started = time.perf_counter()
 
     try:
-        if NumMedia > 0 and MediaUrl0:
-            diagnosis_en = diagnose_from_url(MediaUrl0)
-            lang_code = user_sessions.get(user_id, {}).get("lang_code", "en")
-            final_reply = translate_final_text(diagnosis_en, lang_code)
+        # The SQLite store may wait up to its busy timeout for another worker's write lock.
+        session = await asyncio.to_thread(sessions.get, user_id)
+        if kind == "photo":
+            user_message = body or "[photo]"
+            reply_en = await diagnose_from_url_async(media_url)
+            final_reply = await translate_final_text_async(reply_en, session.lang_code if session else "en")
         else:
-            print(f"--- User Query Received: \"{Body}\" ---")
-            ai_action = handle_query_with_ai(Body)
-            print(f"--- AI Action Parsed: {json.dumps(ai_action, indent=2)} ---")
+            logger.debug("User query received: %r", body)
+            with STAGE_SECONDS.time("intent_parse"):
+                ai_action = await handle_query_with_ai_async(body, session.history if session else ())
+            logger.debug("AI action parsed: %s", ai_action)
 
             if "final_response" in ai_action:
-                final_reply = ai_action["final_response"]
-            
-            elif "call_tool" in ai_action:
-                tool_info = ai_action["call_tool"]
-                tool_name = tool_info.get("tool_name")
-                params = tool_info.get("parameters", {})
-                lang_code = tool_info.get("lang_code", "en")
-                
-                user_sessions[user_id] = {"lang_code": lang_code}
-
-                tool_result = ""
-                if tool_name == "get_weather_forecast":
-                    tool_result = tools.get_weather_forecast(params.get("location"))
-                elif tool_name == "get_market_price":
-                    tool_result = tools.get_market_price(params.get("commodity"), params.get("location"))
-                elif tool_name == "diagnose_plant_disease":
-                    tool_result = "Okay, please send me a clear photo of the plant's leaf."
-                else:
-                    tool_result = "I'm not sure how to handle that yet. Can you try rephrasing?"
-                
-                final_reply = translate_final_text(tool_result, lang_code)
+                final_reply = reply_en = ai_action["final_response"]
+            elif calls := tools.tool_calls(ai_action):
+                lang_code = calls[0].get("lang_code", "en")
+                results = await tools.run_tools(calls)
+                # Every answer goes into one reply, translated in a single pass.
+                reply_en = "\n\n".join(results)
+                final_reply = "\n\n".join(await translate_final_texts_async(results, lang_code))
 
     except Exception:
-        traceback.print_exc()
+        logger.exception("Failed to build a reply")
+        ERRORS.inc("reply")
         final_reply = "I'm sorry, a critical error occurred. Please try again in a moment."
 
     if not final_reply:
         final_reply = "I'm sorry, I couldn't process that request. Please try rephrasing."
 
-    response_twiml.message(final_reply)
-    
-    final_response_str = str(response_twiml)
-    print(f"--- Sending TwiML Response: {final_response_str} ---")
-    return Response(content=final_response_str, media_type="application/xml")
+    try:
+        await asyncio.to_thread(
+            sessions.update, user_id, lang_code, (("user", user_message), ("assistant", str(reply_en)))
+        )
+    except Exception as e:
+        logger.error("Session update error: %r", e)
+        ERRORS.inc("session_update")
+
+    REPLY_SECONDS.observe(time.perf_counter() - started, kind)
+    return final_reply
+
+# --- Async reply mode: acknowledge now, deliver through the Twilio Messages API ---
+async def _deliver_reply(job: dict) -> None:
+    message = job["payload"]
+    # A retry after a failed send reuses the reply instead of redoing the work.
+    reply = job["result"]
+    if reply is None:
+        reply = await build_reply(message["from"], message["body"], message["num_media"], message["media_url"])
+        try:
+            await asyncio.to_thread(reply_queue.save_result, job["id"], reply)
+        except Exception as e:
+            # Only costs a rebuild if the send below fails too.
+            logger.warning("Could not save the reply for %s: %r", job["id"], e)
+    try:
+        await send_message(message["from"], reply, settings.TWILIO_WHATSAPP_NUMBER or message["to"])
+    except httpx.HTTPStatusError as e:
+        if e.response.status_code < 500 and e.response.status_code != 429:
+            raise PermanentJobError(f"Twilio rejected the message: {e.response.status_code} {e.response.text[:200]}")
+        raise
+
+reply_queue: JobQueue | None = None
+reply_workers: JobWorkerPool | None = None
+if settings.REPLY_MODE == "async":
+    reply_queue = JobQueue(settings.REPLY_QUEUE_PATH)
+    reply_workers = JobWorkerPool(
+        reply_queue, _deliver_reply,
+        concurrency=settings.REPLY_WORKERS,
+        max_attempts=settings.REPLY_MAX_ATTEMPTS,
+        backoff_base=settings.REPLY_BACKOFF_SECONDS,
+    )
+
+def _twiml(message: str | None = None) -> Response:
+    with STAGE_SECONDS.time("twiml_render"):
+        response_twiml = MessagingResponse()
+        if message:
+            response_twiml.message(message)
+        return Response(content=str(response_twiml), media_type="application/xml")
+
+@router.post("/chat")
+async def chat_webhook(
+    From: Annotated[str, Form()],
+    Body: Annotated[str, Form()] = "",
+    NumMedia: Annotated[int, Form()] = 0,
+    MediaUrl0: Annotated[str | None, Form()] = None,
+    MessageSid: Annotated[str | None, Form()] = None,
+    To: Annotated[str | None, Form()] = None,
+):
+    with WEBHOOK_SECONDS.time(settings.REPLY_MODE):
+        return await _handle_message(From, Body, NumMedia, MediaUrl0, MessageSid, To)
+
+async def _handle_message(From: str, Body: str, NumMedia: int, MediaUrl0: str | None,
+                          MessageSid: str | None, To: str | None) -> Response:
+    if reply_queue is not None and MessageSid:
+        job = {"from": From, "to": To, "body": Body, "num_media": NumMedia, "media_url": MediaUrl0}
+        try:
+            added = await asyncio.to_thread(reply_queue.enqueue, MessageSid, job)
+        except Exception:
+            # The queue is unusable (e.g. the database stays locked): answer in the TwiML instead.
+            logger.exception("Could not queue %s; replying synchronously", MessageSid)
+            ERRORS.inc("reply_queue")
+        else:
+            if not added:
+                logger.info("Duplicate delivery of %s, already queued", MessageSid)
+                return _twiml()
+            reply_workers.notify()
+            # Photos take a while, so say so; text replies usually arrive within seconds.
+            if NumMedia > 0 and MediaUrl0:
+                session = await asyncio.to_thread(sessions.get, From)
+                return _twiml(await cached_translation_async(ANALYZING_PHOTO_MESSAGE, session.lang_code if session else "en"))
+            return _twiml()
 
+    final_reply = await build_reply(From, Body, NumMedia, MediaUrl0)
+    logger.debug("Sending reply to %s: %r", From, final_reply)
+    return _twiml(final_reply)
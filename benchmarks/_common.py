@@ -0,0 +1,46 @@
+# benchmarks/_common.py
+"""Shared helpers for the benchmark scripts. Run benchmarks from the project root,
+e.g. `python -m benchmarks.bench_inference`."""
+import math
+import os
+
+# Settings() requires these; benchmarks never talk to the real services.
+for _key in ("WEATHER_API_KEY", "GEMINI_API_KEY", "TWILIO_ACCOUNT_SID", "TWILIO_AUTH_TOKEN"):
+    os.environ.setdefault(_key, "benchmark")
+
+
+def percentile(samples: list[float], pct: float) -> float:
+    """Nearest-rank percentile of `samples` (pct in 0..100)."""
+    if not samples:
+        return float("nan")
+    ordered = sorted(samples)
+    k = max(0, min(len(ordered) - 1, math.ceil(pct / 100.0 * len(ordered)) - 1))
+    return ordered[k]
+
+
+def print_table(headers: list[str], rows: list[list]) -> None:
+    widths = [max(len(str(h)), *(len(str(r[i])) for r in rows)) for i, h in enumerate(headers)]
+    print("  ".join(str(h).rjust(w) for h, w in zip(headers, widths)))
+    for row in rows:
+        print("  ".join(str(c).rjust(w) for c, w in zip(row, widths)))
+
+
+def status_kb(field: str) -> int:
+    """A memory field (VmRSS, VmHWM, ...) of this process from /proc/self/status, in kB (0 off Linux)."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return 0
+
+
+def reset_peak_rss() -> None:
+    """Resets VmHWM to the current RSS (Linux), so later peaks exclude earlier imports."""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
@@ -0,0 +1,229 @@
+# benchmarks/bench_admission.py
+"""
+What image admission (utils/image_admission.py) saves on a realistic mix of
+incoming WhatsApp media: good leaf photos next to blurry and dark ones, a scanned
+document, a large PNG screenshot, a video and a PDF.
+
+Each message goes through diagnose_from_url_async with the real pest model and
+a local Twilio media stub (in a separate process, so its CPU is not counted)
+that sends at --mbps, so an aborted download stops close to where it was cut.
+Gemini Vision is a stub that converts its input with the SDK's own content
+conversion, so the upload size and encoding CPU are the real ones. Variants:
+  off   admission checks replaced by no-ops, full-resolution PIL image to Gemini
+  on    content-type/byte-cap/header checks, quality gate, downscaled vision upload
+Reported per media kind and variant (averages per message):
+  reply            first words of the reply
+  cpu_ms           process CPU time (decode, inference, vision encoding)
+  download_kb      bytes the media stub sent
+  upload_kb        image bytes sent to Gemini Vision
+  predict / vision model predictions and Gemini Vision calls
+
+    python -m benchmarks.bench_admission --rounds 3
+"""
+import argparse
+import asyncio
+import io
+import json
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFilter
+
+from benchmarks._common import print_table  # sets dummy env vars
+from benchmarks.bench_diagnosis_cache import make_leaf_photo
+
+KINDS = ("leaf", "blurry", "dark", "document", "screenshot", "video", "pdf")
+
+
+def _jpeg(img: Image.Image, quality: int = 90) -> bytes:
+    buf = io.BytesIO()
+    img.save(buf, format="JPEG", quality=quality)
+    return buf.getvalue()
+
+
+def make_media(kind: str, rng: random.Random) -> tuple[bytes, str]:
+    """(body, content type) of one message's media."""
+    if kind in ("leaf", "blurry", "dark"):
+        img = Image.open(io.BytesIO(make_leaf_photo(rng, (2592, 1944))))  # a 5 MP phone photo
+        if kind == "blurry":
+            img = img.filter(ImageFilter.GaussianBlur(40))  # ~3 px at the model's 224 px
+        elif kind == "dark":
+            img = img.point(lambda v: v // 12)
+        return _jpeg(img), "image/jpeg"
+    if kind == "document":
+        img = Image.new("RGB", (1700, 2200), (248, 248, 244))
+        draw = ImageDraw.Draw(img)
+        for y in range(80, 2100, 28):
+            draw.text((90, y), "Invoice 4471  Urea 45kg x 4  Rs 1,068  DAP 50kg x 2  Rs 2,700  " * 2, fill=(20, 20, 20))
+        return _jpeg(img, 85), "image/jpeg"
+    if kind == "screenshot":
+        img = Image.new("RGB", (3024, 4032), (236, 229, 221))
+        draw = ImageDraw.Draw(img)
+        for y in range(100, 4000, 160):
+            draw.rounded_rectangle((80, y, 2400, y + 120), 30, fill=(220, 248, 198))
+            draw.text((120, y + 40), f"message {y} " * 12, fill=(0, 0, 0))
+        buf = io.BytesIO()
+        img.save(buf, format="PNG")
+        return buf.getvalue(), "image/png"
+    body = np.random.default_rng(rng.randrange(2**32)).integers(0, 255, 9_000_000 if kind == "video" else 3_000_000, dtype=np.uint8)
+    return body.tobytes(), "video/mp4" if kind == "video" else "application/pdf"
+
+
+def serve_media(directory: str, port: int, mbps: float) -> None:
+    """Twilio media stub: streams files from `directory` at `mbps` and counts the bytes sent."""
+    import uvicorn
+    from fastapi import FastAPI
+    from fastapi.responses import StreamingResponse
+
+    app = FastAPI()
+    app.state.sent = 0
+    with open(os.path.join(directory, "manifest.json")) as f:
+        manifest = json.load(f)
+
+    @app.get("/media/{name}")
+    async def media(name: str):
+        path = os.path.join(directory, name)
+
+        async def chunks():
+            with open(path, "rb") as f:
+                while chunk := f.read(64 * 1024):
+                    app.state.sent += len(chunk)
+                    yield chunk
+                    await asyncio.sleep(len(chunk) * 8 / (mbps * 1e6))
+
+        return StreamingResponse(chunks(), media_type=manifest[name],
+                                 headers={"content-length": str(os.path.getsize(path))})
+
+    @app.get("/sent")
+    async def sent():
+        return {"sent": app.state.sent}
+
+    uvicorn.run(app, host="127.0.0.1", port=port, log_level="warning")
+
+
+class StubVisionModel:
+    """Gemini Vision stand-in: runs the SDK's content conversion, records the image bytes, then sleeps."""
+
+    def __init__(self, latency: float):
+        from google.generativeai.types import content_types
+
+        self._to_contents = content_types.to_contents
+        self.latency = latency
+        self.calls = 0
+        self.uploaded = 0
+
+    def generate_content(self, contents, **kwargs):
+        from benchmarks.stubs import _StubResponse
+
+        for content in self._to_contents(contents):
+            self.uploaded += sum(len(part.inline_data.data) for part in content.parts)
+        self.calls += 1
+        time.sleep(self.latency)
+        return _StubResponse("Diagnosis: Leaf spot. Suggested Remedy: Remove affected leaves.")
+
+
+def disable_admission(agent) -> None:
+    class NoCap:
+        def add(self, n: int) -> None:
+            pass
+
+    agent.check_response = lambda headers: None
+    agent.ByteCap = NoCap
+    agent.probe = lambda data: None
+    agent.check_quality = lambda img: None
+    agent.vision_payload = lambda img: img
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rounds", type=int, default=3, help="messages per media kind and variant")
+    parser.add_argument("--vision-ms", type=float, default=300.0)
+    parser.add_argument("--mbps", type=float, default=50.0, help="media download bandwidth")
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    rng = random.Random(7)
+    manifest, messages = {}, []
+    for i in range(args.rounds):
+        for kind in KINDS:
+            body, content_type = make_media(kind, rng)
+            name = f"{kind}-{i}"
+            manifest[name] = content_type
+            with open(os.path.join(directory, name), "wb") as f:
+                f.write(body)
+            messages.append((kind, name))
+    with open(os.path.join(directory, "manifest.json"), "w") as f:
+        json.dump(manifest, f)
+
+    from benchmarks.stubs import free_port
+
+    port = free_port()
+    server = multiprocessing.get_context("spawn").Process(target=serve_media, args=(directory, port, args.mbps), daemon=True)
+    server.start()
+
+    os.environ.setdefault("CUDA_VISIBLE_DEVICES", "-1")
+    from agents import pest_detection_agent as agent
+    from core import gemini
+    from core.cache import NearDuplicateCache
+    from core.config import settings
+    from core.http_client import get_client
+
+    vision = StubVisionModel(args.vision_ms / 1000)
+    gemini.set_model(gemini.VISION_MODEL, vision)
+    engine = agent.pest_model.get()
+    admission = {name: getattr(agent, name) for name in ("check_response", "ByteCap", "probe", "check_quality", "vision_payload")}
+
+    async def run() -> list:
+        rows = []
+        base = f"http://127.0.0.1:{port}"
+        for _ in range(100):
+            try:
+                await get_client().get(f"{base}/sent")
+                break
+            except Exception:
+                await asyncio.sleep(0.1)
+        for variant in ("off", "on"):
+            if variant == "off":
+                disable_admission(agent)
+            else:
+                for name, value in admission.items():
+                    setattr(agent, name, value)
+            agent.diagnosis_cache = NearDuplicateCache("bench", settings.DIAGNOSIS_CACHE_SIZE)
+            agent.diagnosis_cache.stats.update(saved_inference_seconds=0.0, saved_vision_calls=0, saved_vision_seconds=0.0)
+            per_kind = {kind: {"cpu": 0.0, "down": 0, "up": 0, "predict": 0, "vision": 0, "reply": ""} for kind in KINDS}
+            for kind, name in messages:
+                sent = (await get_client().get(f"{base}/sent")).json()["sent"]
+                images, calls, uploaded = engine.stats["images"], vision.calls, vision.uploaded
+                cpu = time.process_time()
+                reply = await agent.diagnose_from_url_async(f"{base}/media/{name}")
+                s = per_kind[kind]
+                s["cpu"] += time.process_time() - cpu
+                s["down"] += (await get_client().get(f"{base}/sent")).json()["sent"] - sent
+                s["up"] += vision.uploaded - uploaded
+                s["predict"] += engine.stats["images"] - images
+                s["vision"] += vision.calls - calls
+                s["reply"] = " ".join(str(reply).split()[:4])
+            n = args.rounds
+            for kind, s in per_kind.items():
+                rows.append([kind, variant, s["reply"][:34], f"{s['cpu'] / n * 1000:.0f}", f"{s['down'] / n / 1024:.0f}",
+                             f"{s['up'] / n / 1024:.0f}", f"{s['predict'] / n:.1f}", f"{s['vision'] / n:.1f}"])
+            totals = [sum(float(r[i]) for r in rows[-len(KINDS):]) for i in (3, 4, 5)]
+            rows.append(["(all)", variant, "", *(f"{t:.0f}" for t in totals), "", ""])
+        return rows
+
+    try:
+        rows = asyncio.run(run())
+    finally:
+        server.terminate()
+
+    rows.sort(key=lambda r: (KINDS + ("(all)",)).index(r[0]))
+    print(f"{args.rounds} messages per kind, Gemini Vision {args.vision_ms:.0f} ms, {settings.INFERENCE_BACKEND} backend")
+    print_table(["media", "admission", "reply", "cpu_ms", "download_kb", "upload_kb", "predict", "vision"], rows)
+
+
+if __name__ == "__main__":
+    main()
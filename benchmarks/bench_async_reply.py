@@ -0,0 +1,158 @@
+# benchmarks/bench_async_reply.py
+"""
+Webhook latency as Twilio sees it, with REPLY_MODE=sync (reply in the TwiML
+response) and REPLY_MODE=async (acknowledge, then send through the Messages API).
+
+Every upstream is a local stub: OpenWeatherMap, Twilio media, the Twilio
+Messages API and Gemini. Gemini text has a --gemini-ms latency and Gemini vision
+a --vision-ms latency. Half the messages are leaf photos; a photo reaches the
+vision fallback whenever the model is unsure, which is always with untrained
+weights. Messages arrive at a fixed --rate regardless of how fast the webhook
+answers. Every 10th message is delivered again 5 s later with the same
+MessageSid, the way Twilio retries a slow webhook.
+
+Reported per mode:
+  webhook p50/p99/max   time until the webhook answered
+  over_15s              answers slower than Twilio's 15 s webhook timeout
+  delivered             distinct users who got a reply (TwiML or REST)
+  dup_sends             REST messages beyond one per user (should be 0)
+  delivery p50/p99      time until the reply reached the user (async: REST receipt)
+
+Set MODEL_PATH (and INFERENCE_BACKEND) to a model the app can load:
+
+    MODEL_PATH=model/saved_model/krishi_multicrop_model.keras python -m benchmarks.bench_async_reply --requests 100
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("CUDA_VISIBLE_DEVICES", "-1")
+os.environ.setdefault("TF_CPP_MIN_LOG_LEVEL", "3")
+os.environ["DIAGNOSIS_CACHE_SIZE"] = "0"
+
+from benchmarks._common import percentile, print_table  # noqa: E402  (sets dummy env vars)
+
+TWILIO_TIMEOUT = 15.0
+
+
+def run_mode(mode: str, args) -> dict:
+    import httpx
+
+    from benchmarks.stubs import StubGeminiModel, StubServer, make_twilio_api_app, make_upstream_app
+    from core import gemini
+    from core.config import settings
+
+    tmp = tempfile.mkdtemp()
+    upstream = StubServer(make_upstream_app(weather_latency=0.05, media_latency=0.2)).start()
+    twilio_app = make_twilio_api_app(latency=0.1, fail_rate=args.twilio_fail_rate)
+    twilio = StubServer(twilio_app).start()
+    settings.WEATHER_API_URL = f"{upstream.url}/data/2.5/weather"
+    settings.TWILIO_API_URL = twilio.url
+    settings.REPLY_MODE = mode
+    settings.REPLY_QUEUE_PATH = os.path.join(tmp, "reply_jobs.sqlite3")
+    settings.REPLY_BACKOFF_SECONDS = 0.5
+    settings.SESSION_DB_PATH = os.path.join(tmp, "sessions.sqlite3")
+    settings.STARTUP_MODE = "eager"
+    text_model = StubGeminiModel(latency=args.gemini_ms / 1000)
+    gemini.set_model(gemini.TEXT_MODEL, text_model)
+    gemini.set_model(gemini.INTENT_MODEL, text_model)
+    gemini.set_model(gemini.VISION_MODEL, StubGeminiModel(latency=args.vision_ms / 1000))
+
+    from main import app
+
+    server = StubServer(app).start()
+    sent_at: dict[str, float] = {}
+    webhook: list[float] = []
+    twiml_delivery: list[float] = []
+
+    async def drive():
+        # Open loop: messages arrive at --rate per second however slowly the webhook answers,
+        # as they do from Twilio.
+        async with httpx.AsyncClient(base_url=server.url, timeout=120, limits=httpx.Limits(max_connections=None)) as client:
+            async def one(i: int, delay: float, repeat: bool = False):
+                await asyncio.sleep(delay)
+                user = f"whatsapp:+91{9000000000 + i}"
+                data = {"From": user, "To": "whatsapp:+14155238886", "MessageSid": f"SM{i:032d}",
+                        "Body": "meri fasal ke liye mausam", "NumMedia": "0"}
+                if i % 2:
+                    data.update(Body="", NumMedia="1", MediaUrl0=f"{upstream.url}/media/leaf{i}.jpg")
+                start = time.perf_counter()
+                sent_at.setdefault(user, start)
+                r = await client.post("/twilio/chat", data=data)
+                elapsed = time.perf_counter() - start
+                webhook.append(elapsed)
+                if mode == "sync" and not repeat and "<Message>" in r.text:
+                    twiml_delivery.append(elapsed)
+
+            jobs = [one(i, i / args.rate) for i in range(args.requests)]
+            # Twilio's retry of a slow webhook arrives a few seconds after the original.
+            jobs += [one(i, i / args.rate + 5.0, repeat=True) for i in range(0, args.requests, 10)]
+            await asyncio.gather(*jobs)
+
+    try:
+        asyncio.run(drive())
+        if mode == "async":
+            deadline = time.perf_counter() + args.drain_timeout
+            while len({to for to, _, _ in twilio_app.state.messages}) < args.requests and time.perf_counter() < deadline:
+                time.sleep(0.2)
+    finally:
+        server.stop()
+        twilio.stop()
+        upstream.stop()
+
+    messages = twilio_app.state.messages
+    first = {}
+    for to, _, received in messages:
+        first.setdefault(to, received)
+    delivery = twiml_delivery if mode == "sync" else [first[u] - sent_at[u] for u in first]
+    return {
+        "webhook": webhook,
+        "delivery": delivery,
+        "delivered": len(twiml_delivery) if mode == "sync" else len(first),
+        "dup_sends": len(messages) - len(first),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--rate", type=float, default=4.0, help="incoming messages per second")
+    parser.add_argument("--gemini-ms", type=float, default=1500.0)
+    parser.add_argument("--vision-ms", type=float, default=6000.0)
+    parser.add_argument("--twilio-fail-rate", type=float, default=0.1, help="share of Messages API calls answered 503")
+    parser.add_argument("--drain-timeout", type=float, default=300.0)
+    parser.add_argument("--modes", nargs="+", choices=("sync", "async"), default=["sync", "async"])
+    parser.add_argument("--run-mode", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_mode:
+        print(json.dumps(run_mode(args.run_mode, args)))
+        return
+
+    rows = []
+    for mode in args.modes:
+        out = subprocess.run(
+            [sys.executable, "-m", "benchmarks.bench_async_reply", "--run-mode", mode, *sys.argv[1:]],
+            capture_output=True, text=True, check=True,
+        ).stdout.strip().splitlines()[-1]
+        r = json.loads(out)
+        w, d = r["webhook"], r["delivery"]
+        rows.append([
+            mode,
+            f"{percentile(w, 50) * 1000:.0f}", f"{percentile(w, 99) * 1000:.0f}", f"{max(w) * 1000:.0f}",
+            sum(t > TWILIO_TIMEOUT for t in w),
+            f"{r['delivered']}/{args.requests}", r["dup_sends"],
+            f"{percentile(d, 50) * 1000:.0f}", f"{percentile(d, 99) * 1000:.0f}",
+        ])
+
+    print_table(["mode", "webhook_p50_ms", "webhook_p99_ms", "webhook_max_ms", "over_15s",
+                 "delivered", "dup_sends", "delivery_p50_ms", "delivery_p99_ms"], rows)
+
+
+if __name__ == "__main__":
+    main()
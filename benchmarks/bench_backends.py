@@ -0,0 +1,112 @@
+# benchmarks/bench_backends.py
+"""
+Latency, throughput and resident memory of each pest model backend on CPU.
+
+Each backend runs in its own subprocess so memory figures are not shared:
+  load_ms      building/loading the model, runtime import included
+  p50/p99_ms   single-image predict_on_batch latency
+  img/sec      throughput with --batch-size images per call
+  rss_mb       resident memory after the run; peak_mb is the high-water mark
+
+Backends are given as NAME or NAME=ARTIFACT, e.g. to compare quantization modes:
+
+    python -m benchmarks.bench_backends --backends keras tflite=model/fp32.tflite tflite=model/int8.tflite
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+os.environ.setdefault("CUDA_VISIBLE_DEVICES", "-1")
+os.environ.setdefault("TF_CPP_MIN_LOG_LEVEL", "3")
+
+from benchmarks._common import percentile, print_table, status_kb  # noqa: E402  (sets dummy env vars)
+
+
+def worker(spec: str, iterations: int, batch_size: int) -> None:
+    import numpy as np
+    from agents.pest_detection_agent import IMG_SIZE, load_pest_backend
+    from core.config import settings
+
+    name, _, artifact = spec.partition("=")
+    if artifact:
+        setattr(settings, {"keras": "MODEL_PATH", "tflite": "TFLITE_MODEL_PATH", "onnx": "ONNX_MODEL_PATH"}[name], artifact)
+
+    start = time.perf_counter()
+    backend = load_pest_backend(name)
+    load_s = time.perf_counter() - start
+
+    rng = np.random.default_rng(0)
+    batch = rng.uniform(0, 255, (batch_size, IMG_SIZE, IMG_SIZE, 3)).astype(np.float32)
+    backend.predict_on_batch(batch[:1])
+    backend.predict_on_batch(batch)
+
+    latencies = []
+    for i in range(iterations):
+        start = time.perf_counter()
+        backend.predict_on_batch(batch[i % batch_size:i % batch_size + 1])
+        latencies.append(time.perf_counter() - start)
+
+    rounds = max(1, iterations // batch_size)
+    start = time.perf_counter()
+    for _ in range(rounds):
+        backend.predict_on_batch(batch)
+    throughput = rounds * batch_size / (time.perf_counter() - start)
+
+    print(json.dumps({
+        "load_s": load_s, "latencies": latencies, "throughput": throughput,
+        "rss_kb": status_kb("VmRSS"), "peak_kb": status_kb("VmHWM"),
+    }))
+
+
+def default_backends() -> list[str]:
+    from core.config import settings
+
+    specs = ["keras"]
+    specs += [name for name, path in (("tflite", settings.TFLITE_MODEL_PATH), ("onnx", settings.ONNX_MODEL_PATH))
+              if os.path.exists(path)]
+    return specs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backends", nargs="+", help="default: keras plus any exported artifacts")
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        worker(args.worker, args.iterations, args.batch_size)
+        return
+
+    rows = []
+    for spec in args.backends or default_backends():
+        proc = subprocess.run(
+            [sys.executable, "-m", "benchmarks.bench_backends", "--worker", spec,
+             "--iterations", str(args.iterations), "--batch-size", str(args.batch_size)],
+            capture_output=True, text=True,
+        )
+        if proc.returncode != 0:
+            rows.append([spec, "error", "-", "-", "-", "-", "-"])
+            print(f"{spec}: {proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else 'failed'}", file=sys.stderr)
+            continue
+        result = json.loads(proc.stdout.strip().splitlines()[-1])
+        t = result["latencies"]
+        rows.append([
+            spec,
+            f"{result['load_s'] * 1000:.0f}",
+            f"{percentile(t, 50) * 1000:.1f}",
+            f"{percentile(t, 99) * 1000:.1f}",
+            f"{result['throughput']:.1f}",
+            f"{result['rss_kb'] / 1024:.0f}",
+            f"{result['peak_kb'] / 1024:.0f}",
+        ])
+
+    print_table(["backend", "load_ms", "p50_ms", "p99_ms", "img/sec", "rss_mb", "peak_mb"], rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+# benchmarks/bench_diagnosis_cache.py
+"""
+How well the perceptual-hash diagnosis cache recognises a re-sent photo, and
+what a lookup costs.
+
+1. Matching: synthetic leaf photos are put through what WhatsApp forwarding does
+   (JPEG re-compression, downscaling, a slight crop, a brightness shift). For each
+   hash and distance threshold we report the share of variants that hit the cache
+   and the share of unrelated photos that would wrongly match.
+2. Lookup: NearDuplicateCache.get latency at several cache sizes, for a
+   near-duplicate probe and a miss, against a linear Hamming scan.
+
+    python -m benchmarks.bench_diagnosis_cache --photos 200
+"""
+import argparse
+import io
+import random
+import time
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageEnhance
+
+from benchmarks._common import percentile, print_table  # sets dummy env vars
+from core.cache import NearDuplicateCache
+from utils.image_hash import HASHERS, hamming
+from utils.image_pipeline import decode_image
+
+IMG_SIZE = 224
+
+
+def make_leaf_photo(rng: random.Random, size: tuple[int, int] = (1280, 960)) -> bytes:
+    """A leaf-ish blob with spots on a textured background, saved as a phone-quality JPEG."""
+    w, h = size
+    img = Image.new("RGB", size, (rng.randint(60, 140), rng.randint(50, 110), rng.randint(30, 80)))
+    draw = ImageDraw.Draw(img)
+    cx, cy = rng.randint(w // 3, 2 * w // 3), rng.randint(h // 3, 2 * h // 3)
+    rx, ry = rng.randint(w // 5, w // 3), rng.randint(h // 6, h // 3)
+    draw.ellipse((cx - rx, cy - ry, cx + rx, cy + ry), fill=(rng.randint(30, 90), rng.randint(110, 200), rng.randint(20, 80)))
+    for _ in range(rng.randint(3, 25)):
+        x, y, r = rng.randint(cx - rx, cx + rx), rng.randint(cy - ry, cy + ry), rng.randint(5, 40)
+        draw.ellipse((x - r, y - r, x + r, y + r), fill=(rng.randint(80, 160), rng.randint(60, 120), rng.randint(10, 50)))
+    noise = np.random.default_rng(rng.randint(0, 2**32)).normal(0, 8, (h, w, 3))
+    img = Image.fromarray(np.clip(np.asarray(img, dtype=np.float32) + noise, 0, 255).astype(np.uint8))
+    return _jpeg(img, 90)
+
+
+def _jpeg(img: Image.Image, quality: int) -> bytes:
+    buf = io.BytesIO()
+    img.save(buf, format="JPEG", quality=quality)
+    return buf.getvalue()
+
+
+VARIANTS = {
+    "recompress q60": lambda img: _jpeg(img, 60),
+    "downscale 50%": lambda img: _jpeg(img.resize((img.width // 2, img.height // 2)), 75),
+    "crop 3%": lambda img: _jpeg(img.crop((int(img.width * 0.03), int(img.height * 0.03), img.width, img.height)), 80),
+    "brighter 10%": lambda img: _jpeg(ImageEnhance.Brightness(img).enhance(1.1), 80),
+}
+
+
+def matching(n_photos: int, thresholds: list[int]) -> None:
+    rng = random.Random(3)
+    photos = [make_leaf_photo(rng) for _ in range(n_photos)]
+    rows = []
+    for hash_name, hasher in HASHERS.items():
+        originals = [hasher(decode_image(p, IMG_SIZE)) for p in photos]
+        variant_distances = {name: [] for name in VARIANTS}
+        for photo, original in zip(photos, originals):
+            img = Image.open(io.BytesIO(photo))
+            for name, make_variant in VARIANTS.items():
+                variant_distances[name].append(hamming(original, hasher(decode_image(make_variant(img), IMG_SIZE))))
+        unrelated = [hamming(a, b) for i, a in enumerate(originals) for b in originals[i + 1:]]
+        for k in thresholds:
+            rows.append([
+                hash_name, k,
+                *(f"{np.mean(np.array(d) <= k):.0%}" for d in variant_distances.values()),
+                f"{np.mean(np.array(unrelated) <= k):.3%}",
+            ])
+    print_table(["hash", "max_dist", *VARIANTS, "false_match"], rows)
+
+
+def lookup(sizes: list[int], max_distance: int, probes: int) -> None:
+    rng = random.Random(5)
+    rows = []
+    for size in sizes:
+        cache = NearDuplicateCache("bench", size, max_distance)
+        hashes = [rng.getrandbits(64) for _ in range(size)]
+        for h in hashes:
+            cache.set(h, h)
+        near = [h ^ (1 << rng.randrange(64)) ^ (1 << rng.randrange(64)) for h in rng.sample(hashes, min(probes, size))]
+        misses = [rng.getrandbits(64) for _ in range(probes)]
+
+        def timed(fn, keys):
+            out = []
+            for k in keys:
+                start = time.perf_counter()
+                fn(k)
+                out.append(time.perf_counter() - start)
+            return out
+
+        scan = lambda q: min(hashes, key=lambda h: hamming(h, q))
+        hit_t, miss_t, scan_t = timed(cache.get, near), timed(cache.get, misses), timed(scan, misses[:50])
+        rows.append([
+            size,
+            f"{percentile(hit_t, 50) * 1e6:.1f}", f"{percentile(hit_t, 99) * 1e6:.1f}",
+            f"{percentile(miss_t, 50) * 1e6:.1f}", f"{percentile(miss_t, 99) * 1e6:.1f}",
+            f"{percentile(scan_t, 50) * 1e6:.0f}",
+        ])
+    print_table(["entries", "near_hit_p50_us", "near_hit_p99_us", "miss_p50_us", "miss_p99_us", "linear_scan_p50_us"], rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--photos", type=int, default=100)
+    parser.add_argument("--thresholds", type=int, nargs="+", default=[2, 4, 6, 8])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 5000, 50000])
+    parser.add_argument("--max-distance", type=int, default=4)
+    parser.add_argument("--probes", type=int, default=1000)
+    args = parser.parse_args()
+
+    matching(args.photos, args.thresholds)
+    print()
+    lookup(args.sizes, args.max_distance, args.probes)
+
+
+if __name__ == "__main__":
+    main()
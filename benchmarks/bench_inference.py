@@ -0,0 +1,75 @@
+# benchmarks/bench_inference.py
+"""
+Micro-batching benchmark for the pest detection model on CPU.
+
+For each max batch size, a pool of concurrent clients submits preprocessed
+224x224 images to a MicroBatchEngine and we report throughput (images/sec)
+and per-request p50/p99 latency.
+
+    python -m benchmarks.bench_inference --requests 256 --wait-ms 5
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+os.environ.setdefault("CUDA_VISIBLE_DEVICES", "-1")
+
+from benchmarks._common import percentile, print_table  # noqa: E402  (sets dummy env vars)
+import numpy as np  # noqa: E402
+from agents.pest_detection_agent import create_model_architecture, CLASS_NAMES, IMG_SIZE  # noqa: E402
+from core.inference_engine import MicroBatchEngine  # noqa: E402
+
+
+def run(model, batch_size: int, n_requests: int, wait_ms: float) -> list:
+    engine = MicroBatchEngine(
+        model.predict_on_batch,
+        input_shape=(IMG_SIZE, IMG_SIZE, 3),
+        max_batch_size=batch_size,
+        max_wait_ms=wait_ms,
+        max_queue_size=max(n_requests, 64),
+    ).start()
+
+    image = np.random.default_rng(0).uniform(0, 255, (IMG_SIZE, IMG_SIZE, 3)).astype(np.float32)
+    # Trace the graph for every batch shape up front so compilation is not measured.
+    for n in range(1, batch_size + 1):
+        model.predict_on_batch(np.repeat(image[None], n, axis=0))
+
+    def one_request(_):
+        start = time.perf_counter()
+        engine.predict(image)
+        return time.perf_counter() - start
+
+    # Twice as many clients as batch slots keeps the queue fed.
+    with ThreadPoolExecutor(max_workers=batch_size * 2) as pool:
+        start = time.perf_counter()
+        latencies = list(pool.map(one_request, range(n_requests)))
+        elapsed = time.perf_counter() - start
+
+    engine.stop()
+    avg_batch = engine.stats["images"] / max(engine.stats["batches"], 1)
+    return [
+        batch_size,
+        f"{n_requests / elapsed:.1f}",
+        f"{percentile(latencies, 50) * 1000:.1f}",
+        f"{percentile(latencies, 99) * 1000:.1f}",
+        f"{avg_batch:.2f}",
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=128, help="Images submitted per batch size.")
+    parser.add_argument("--wait-ms", type=float, default=5.0, help="Engine max wait before dispatching a partial batch.")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 4, 8, 16])
+    args = parser.parse_args()
+
+    # Random weights are fine for latency; the graph is identical to production.
+    model = create_model_architecture(num_classes=len(CLASS_NAMES) or 27)
+
+    rows = [run(model, b, args.requests, args.wait_ms) for b in args.batch_sizes]
+    print_table(["max_batch", "images/sec", "p50_ms", "p99_ms", "avg_batch"], rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+# benchmarks/bench_intent.py
+"""
+Offline evaluation of the local intent fast path (utils/intent_router.py)
+against the labelled set in benchmarks/data/intent_eval.jsonl.
+
+Reports coverage (share of queries answered locally), accuracy of those
+answers, how often it correctly deferred to Gemini, per-query latency, and the
+Gemini time saved (answered queries x --gemini-ms, the meta-prompt round-trip).
+
+    python -m benchmarks.bench_intent --gemini-ms 900 -v
+"""
+import argparse
+import json
+import os
+import time
+
+from benchmarks._common import percentile  # sets dummy env vars
+from utils.intent_router import classify_intent
+
+EVAL_PATH = os.path.join(os.path.dirname(__file__), "data", "intent_eval.jsonl")
+
+
+def _call_matches(call: dict, expected: dict) -> bool:
+    params = call.get("parameters", {})
+    return (
+        call.get("tool_name") == expected["tool_name"]
+        and call.get("lang_code") == expected["lang_code"]
+        and params.get("location") == expected.get("location")
+        and params.get("commodity") == expected.get("commodity")
+    )
+
+
+def is_correct(action: dict, expected: dict) -> bool:
+    if expected["kind"] == "final_response":
+        return "final_response" in action
+    if expected["kind"] == "call_tool":
+        return "call_tool" in action and _call_matches(action["call_tool"], expected)
+    if expected["kind"] == "call_tools":
+        # Same tool calls in the same order (the reply joins their answers in call order).
+        calls = action.get("call_tools") or []
+        return len(calls) == len(expected["calls"]) and all(map(_call_matches, calls, expected["calls"]))
+    return False
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--eval", default=EVAL_PATH)
+    parser.add_argument("--gemini-ms", type=float, default=900.0, help="Typical meta-prompt round-trip to credit per fast-path hit.")
+    parser.add_argument("--repeat", type=int, default=200, help="Timing repetitions per query.")
+    parser.add_argument("-v", "--verbose", action="store_true", help="Print every miss and wrong answer.")
+    args = parser.parse_args()
+
+    with open(args.eval, encoding="utf-8") as f:
+        cases = [json.loads(line) for line in f if line.strip()]
+
+    answered = correct = deferred_ok = should_defer = 0
+    timings = []
+    for case in cases:
+        query, expected = case["query"], case["expected"]
+        action = classify_intent(query)
+
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            classify_intent(query)
+        timings.append((time.perf_counter() - start) / args.repeat)
+
+        if expected["kind"] == "gemini":
+            should_defer += 1
+            deferred_ok += action is None
+        if action is None:
+            if args.verbose and expected["kind"] != "gemini":
+                print(f"  deferred: {query!r}")
+            continue
+        answered += 1
+        if is_correct(action, expected):
+            correct += 1
+        elif args.verbose:
+            print(f"  WRONG:    {query!r} -> {json.dumps(action, ensure_ascii=False)}")
+
+    total = len(cases)
+    print(f"queries:            {total}")
+    print(f"fast-path coverage: {answered / total:.1%} ({answered}/{total})")
+    print(f"fast-path accuracy: {correct / max(answered, 1):.1%} ({correct}/{answered})")
+    print(f"correct deferrals:  {deferred_ok}/{should_defer}")
+    print(f"latency p50 / p99:  {percentile(timings, 50) * 1e6:.1f} / {percentile(timings, 99) * 1e6:.1f} µs")
+    saved = answered * args.gemini_ms / 1000
+    print(f"Gemini time saved:  {saved:.1f}s over {total} queries "
+          f"(~{saved / total * 1000:.0f} ms/query at {args.gemini_ms:.0f} ms per meta-prompt)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+# benchmarks/bench_intent_prompt.py
+"""
+Gemini intent parsing, before and after the compact prompt rework, over the
+recorded queries in benchmarks/data/intent_eval.jsonl (the local fast path is
+off, so every query goes to Gemini).
+
+1. Prompt size per request: the legacy meta-prompt (rebuilt as an f-string
+   around every query) against the compact system instruction + response
+   schema + message now sent. Tokens are estimated as characters / 4 unless
+   --count-tokens asks the real API (needs GEMINI_API_KEY).
+2. Latency under bursts: each query arrives from --users farmers within
+   --spread-ms, as happens when a message is forwarded around a village group.
+   Gemini is a stub with --gemini-ms latency (plus --prefill-ms per 1000 input
+   tokens, 0 by default). A --drift share of its replies are wrapped the way
+   free-form models drift ("Here is the JSON: ...", trailing remarks). That
+   breaks the legacy fence-stripping parser. Schema-constrained output returns
+   bare JSON, so the stub sends the new path none.
+Reported per variant:
+  chars / tokens       input per Gemini request
+  gemini_calls         upstream calls for the whole replay
+  p50/p99_ms           handle_query_with_ai_async latency
+  parse_failures       queries answered with the "please rephrase" fallback
+
+    python -m benchmarks.bench_intent_prompt --users 3 --drift 0.1
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+
+from benchmarks._common import percentile, print_table  # sets dummy env vars
+from benchmarks.bench_intent import EVAL_PATH
+
+LEGACY_FAILED_REPLY = "I'm sorry, I had trouble understanding that. Can you please rephrase?"
+
+
+def legacy_prompt(user_query: str) -> str:
+    """The meta-prompt as it was built for every message before the rework (no history)."""
+    return f"""
+    You are KrishiMitra, a friendly and helpful AI assistant for farmers.
+    Your primary goal is to understand a farmer's query in their native language and provide an appropriate action or response.
+    Adopt a conversational and encouraging tone, like a knowledgeable friend ("mitra").
+    Analyze the user's query and the language it is in.
+
+    Your tools:
+    1. `get_weather_forecast`: For weather-related queries. Requires a `location` (city name).
+    2. `get_market_price`: For crop market prices ("mandi bhav"). Requires a `commodity` (e.g., "Soyabean", "Gehu") and an optional `location`.
+    3. `diagnose_plant_disease`: If the user mentions a sick plant, pests, leaves with spots, etc., and wants to send a photo.
+    4. `general_greeting_or_chat`: For simple greetings, thanks, or general questions that don't fit other tools.
+
+    Analyze the query below and respond with a JSON object ONLY. The JSON object must have one of two main keys:
+
+    A) "call_tools": If tools are needed. The value MUST be a list with one object per question asked
+       (e.g., "Indore weather and soyabean bhav in Dewas" needs two), each containing:
+       - "tool_name": One of the tool names from the list above.
+       - "parameters": An object with the required parameters extracted from the query (e.g., {{"location": "Indore", "commodity": "Wheat"}}).
+       - "lang_code": The two-letter ISO 639-1 code of the user's language (e.g., "hi" for Hindi, "en" for English, "mr" for Marathi).
+
+    B) "final_response": Use this for `general_greeting_or_chat`. The value MUST be a complete, ready-to-send response.
+       **IMPORTANT**: This final response MUST be in the user's original language, as identified by the `lang_code`.
+
+
+    ---
+    User Query: "{user_query}"
+    ---
+
+    Respond with ONLY the JSON object. Do not add any extra text or formatting.
+    """
+
+
+class DriftingModel:
+    """Wraps a stub model; a `drift` share of replies get prose around the JSON."""
+
+    WRAPPERS = (
+        "Here is the JSON:\n{}",
+        "{}\n\nLet me know if you need anything else!",
+        "```json\n{}\n```",  # the one drift the legacy parser did handle
+    )
+
+    def __init__(self, model, drift: float, prefill_ms: float, fixed_chars: int = 0, seed: int = 0):
+        from benchmarks.stubs import _StubResponse
+
+        self._response = _StubResponse
+        self.model = model
+        self.drift = drift
+        self.prefill_ms = prefill_ms
+        self.fixed_chars = fixed_chars  # system instruction + schema, sent with every request
+        self.rng = random.Random(seed)
+        self.calls = 0
+
+    def generate_content(self, contents, **kwargs):
+        self.calls += 1
+        prompt = contents if isinstance(contents, str) else str(contents)
+        time.sleep((self.fixed_chars + len(prompt)) / 4 / 1000 * self.prefill_ms / 1000)
+        text = self.model.generate_content(contents, **kwargs).text
+        if self.rng.random() < self.drift:
+            text = self.rng.choice(self.WRAPPERS).format(text)
+        return self._response(text)
+
+
+async def legacy_handle(model, user_query: str) -> dict:
+    """The pre-rework Gemini path: full prompt, fence stripping, json.loads."""
+    from core.http_client import GEMINI, run_blocking
+
+    try:
+        response = await run_blocking(GEMINI, model.generate_content, legacy_prompt(user_query))
+        return json.loads(response.text.strip().replace("```json", "").replace("```", ""))
+    except Exception:
+        return {"final_response": LEGACY_FAILED_REPLY}
+
+
+def count_tokens(texts: list[str], exact: bool) -> float:
+    if not exact:
+        return sum(len(t) for t in texts) / 4
+    from core import gemini
+
+    return gemini.get_model(gemini.TEXT_MODEL).count_tokens(texts).total_tokens
+
+
+async def replay(variant: str, queries: list[str], args) -> tuple[list[float], int]:
+    from utils import ai_processor
+
+    rng = random.Random(1)
+    latencies, failures = [], 0
+
+    async def one(query: str, delay: float):
+        nonlocal failures
+        await asyncio.sleep(delay)
+        start = time.perf_counter()
+        if variant == "legacy":
+            action = await legacy_handle(args.legacy_model, query)
+            failed = action.get("final_response") == LEGACY_FAILED_REPLY
+        else:
+            action = await ai_processor.handle_query_with_ai_async(query)
+            failed = action.get("final_response") == ai_processor.PARSE_FAILED_REPLY
+        latencies.append(time.perf_counter() - start)
+        failures += failed
+
+    # One query's burst at a time, --gap-ms apart, so bursts of different queries overlap a little.
+    tasks = []
+    for i, query in enumerate(queries):
+        base = i * args.gap_ms / 1000
+        tasks += [one(query, base + rng.uniform(0, args.spread_ms / 1000)) for _ in range(args.users)]
+    await asyncio.gather(*tasks)
+    return latencies, failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--eval", default=EVAL_PATH)
+    parser.add_argument("--users", type=int, default=3, help="farmers sending each query")
+    parser.add_argument("--spread-ms", type=float, default=1500.0, help="window in which a query's copies arrive")
+    parser.add_argument("--gap-ms", type=float, default=500.0, help="between the first copies of successive queries")
+    parser.add_argument("--gemini-ms", type=float, default=900.0)
+    parser.add_argument("--prefill-ms", type=float, default=0.0, help="extra latency per 1000 input tokens")
+    parser.add_argument("--drift", type=float, default=0.1)
+    parser.add_argument("--count-tokens", action="store_true", help="exact counts from the Gemini API")
+    args = parser.parse_args()
+
+    from benchmarks.stubs import StubGeminiModel
+    from core import gemini
+    from core.config import settings
+    from utils import ai_processor
+
+    settings.INTENT_FAST_PATH = False
+
+    with open(args.eval) as f:
+        queries = [json.loads(line)["query"] for line in f if line.strip()]
+
+    schema = json.dumps(ai_processor.INTENT_SCHEMA)
+    sizes = {
+        "legacy": [[legacy_prompt(q)] for q in queries],
+        "compact": [[ai_processor.INTENT_INSTRUCTION, schema, f'User Query: "{q}"'] for q in queries],
+    }
+
+    stub = StubGeminiModel(latency=args.gemini_ms / 1000)
+    args.legacy_model = DriftingModel(stub, args.drift, args.prefill_ms)
+    compact_model = DriftingModel(stub, 0.0, args.prefill_ms, len(ai_processor.INTENT_INSTRUCTION) + len(schema))
+    gemini.set_model(gemini.INTENT_MODEL, compact_model)
+
+    rows = []
+    for variant, model in (("legacy", args.legacy_model), ("compact", compact_model)):
+        chars = sum(len(t) for texts in sizes[variant] for t in texts) / len(queries)
+        tokens = sum(count_tokens(texts, args.count_tokens) for texts in sizes[variant]) / len(queries)
+        latencies, failures = asyncio.run(replay(variant, queries, args))
+        rows.append([
+            variant, f"{chars:.0f}", f"{tokens:.0f}", model.calls,
+            f"{percentile(latencies, 50) * 1000:.0f}", f"{percentile(latencies, 99) * 1000:.0f}", failures,
+        ])
+
+    print(f"{len(queries)} queries x {args.users} users within {args.spread_ms:.0f} ms; Gemini {args.gemini_ms:.0f} ms, "
+          f"drift {args.drift:.0%}; tokens {'from the API' if args.count_tokens else 'estimated as chars / 4'}")
+    print_table(["variant", "chars", "tokens", "gemini_calls", "p50_ms", "p99_ms", "parse_failures"], rows)
+
+
+if __name__ == "__main__":
+    main()
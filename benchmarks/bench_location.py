@@ -0,0 +1,88 @@
+# benchmarks/bench_location.py
+"""
+Per-query latency of city lookup as the gazetteer grows from 100 to 50k places
+(roughly every Indian district and tehsil), comparing the old linear scan
+(`city in words` for every city) with the n-gram index in utils/location_extractor.
+
+Place names are synthetic but shaped like real ones, with ~15% multi-word names.
+spaCy is not involved: both paths are measured on their gazetteer step only.
+
+    python -m benchmarks.bench_location --queries 500
+"""
+import argparse
+import random
+import re
+import time
+
+from benchmarks._common import percentile, print_table  # sets dummy env vars
+from utils.location_extractor import LocationMatcher
+
+SYLLABLES = ["pur", "ga", "na", "bad", "khar", "gon", "de", "was", "ujj", "ain", "bho", "pal", "ra", "tam",
+             "sa", "gar", "kan", "nag", "dhar", "war", "ko", "ta", "ji", "man", "sol", "ha", "ri", "du", "lia"]
+TEMPLATES = [
+    "{} ka mausam batao", "what is the weather in {} today", "soyabean bhav {} mandi",
+    "{} me kal barish hogi kya", "price of wheat in {} district please", "hello I am a farmer from {}",
+]
+
+
+def make_gazetteer(n: int, rng: random.Random) -> list[str]:
+    names = set()
+    while len(names) < n:
+        name = "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4)))
+        if rng.random() < 0.15:
+            name = f"{rng.choice(['navi', 'new', 'old', 'north', 'south'])} {name}"
+        names.add(name)
+    return sorted(names)
+
+
+def linear_scan(cities: list[str], text: str) -> str | None:
+    """The previous implementation (minus the spaCy fallback)."""
+    words = re.findall(r'\w+', text.lower())
+    for city in cities:
+        if city in words:
+            return city.capitalize()
+    return None
+
+
+def time_queries(fn, queries: list[str]) -> list[float]:
+    out = []
+    for q in queries:
+        start = time.perf_counter()
+        fn(q)
+        out.append(time.perf_counter() - start)
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000, 50000])
+    parser.add_argument("--queries", type=int, default=300)
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    rows = []
+    for size in args.sizes:
+        cities = make_gazetteer(size, rng)
+        start = time.perf_counter()
+        matcher = LocationMatcher(cities)
+        build_ms = (time.perf_counter() - start) * 1000
+
+        # Half the queries mention a known place, half mention none (worst case for the scan).
+        queries = [rng.choice(TEMPLATES).format(rng.choice(cities) if i % 2 else "somewhere")
+                   for i in range(args.queries)]
+        old = time_queries(lambda q: linear_scan(cities, q), queries)
+        new = time_queries(matcher.match, queries)
+        rows.append([
+            size,
+            f"{build_ms:.0f}",
+            f"{percentile(old, 50) * 1e6:.0f}",
+            f"{percentile(old, 99) * 1e6:.0f}",
+            f"{percentile(new, 50) * 1e6:.1f}",
+            f"{percentile(new, 99) * 1e6:.1f}",
+        ])
+
+    print_table(["places", "index_build_ms", "scan_p50_us", "scan_p99_us", "index_p50_us", "index_p99_us"], rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+# benchmarks/bench_multi_intent.py
+"""
+Reply latency for two-question messages ("<city> ka mausam aur soyabean ka bhav
+<city>"), with the tools run one after another ("sequential") or concurrently
+through core/router.run_tools ("concurrent").
+
+Messages go through build_reply, the same code the webhook runs. The fast-path
+intent router parses them, so there is no meta-prompt call. The weather API is a
+local stub with --weather-ms latency. Gemini (market prices, translation) is
+stubbed with --gemini-ms latency. Every message names new cities, so the tool
+caches miss. Reported per variant:
+  p50/p99_ms       build_reply latency
+  gemini_calls     Gemini calls per message (market price + translation)
+
+    python -m benchmarks.bench_multi_intent --messages 40
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+from benchmarks._common import percentile, print_table  # sets dummy env vars
+
+
+async def run(variant: str, cities: list[str], gemini) -> tuple[list[float], int]:
+    from api import webhook_router
+    from core import router as tools
+
+    async def run_sequentially(calls):
+        return [await tools.run_tool(c.get("tool_name"), c.get("parameters")) for c in calls]
+
+    concurrent = tools.run_tools
+    if variant == "sequential":
+        tools.run_tools = run_sequentially
+
+    latencies = []
+    calls_before = gemini.calls
+    for i in range(0, len(cities) - 1, 2):
+        start = time.perf_counter()
+        await webhook_router.build_reply(f"whatsapp:+91{9000000000 + i}",
+                                         f"{cities[i]} ka mausam aur soyabean ka bhav {cities[i + 1]}")
+        latencies.append(time.perf_counter() - start)
+    tools.run_tools = concurrent
+    return latencies, gemini.calls - calls_before
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=40, help="per variant")
+    parser.add_argument("--weather-ms", type=float, default=400.0)
+    parser.add_argument("--gemini-ms", type=float, default=900.0)
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    os.environ.update(CACHE_BACKEND="memory", SESSION_BACKEND="memory",
+                      TRANSLATION_CACHE_PATH=os.path.join(tmp, "translations.sqlite3"))
+
+    from benchmarks.stubs import StubGeminiModel, StubServer, make_upstream_app
+    from core import gemini
+    from core.config import settings
+    from utils.intent_router import _display
+    from utils.location_extractor import INDIAN_CITIES
+
+    upstream = StubServer(make_upstream_app(weather_latency=args.weather_ms / 1000)).start()
+    settings.WEATHER_API_URL = f"{upstream.url}/data/2.5/weather"
+    model = StubGeminiModel(latency=args.gemini_ms / 1000)
+    gemini.set_model(gemini.TEXT_MODEL, model)
+    gemini.set_model(gemini.INTENT_MODEL, model)
+
+    # Single-word gazetteer names, so each message splits into exactly two questions.
+    names = [_display(c) for c in INDIAN_CITIES if c.isalpha()]
+    needed = 2 * args.messages
+    if len(names) < 2 * needed:
+        raise SystemExit(f"only {len(names)} usable city names for {2 * needed} needed")
+
+    rows = []
+    try:
+        for n, variant in enumerate(("sequential", "concurrent")):
+            latencies, calls = asyncio.run(run(variant, names[n * needed:(n + 1) * needed], model))
+            rows.append([
+                variant,
+                f"{percentile(latencies, 50) * 1000:.0f}",
+                f"{percentile(latencies, 99) * 1000:.0f}",
+                f"{calls / len(latencies):.1f}",
+            ])
+    finally:
+        upstream.stop()
+
+    print(f"weather {args.weather_ms:.0f} ms, Gemini {args.gemini_ms:.0f} ms per call")
+    print_table(["variant", "p50_ms", "p99_ms", "gemini_calls"], rows)
+
+
+if __name__ == "__main__":
+    main()
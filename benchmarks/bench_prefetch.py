@@ -0,0 +1,186 @@
+# benchmarks/bench_prefetch.py
+"""
+Weather and market price answers with advisory prefetch (core/prefetch.py) off
+and on, over a day-like stream of questions in which a few districts and crops
+are asked about far more often than the rest (Zipf-distributed).
+
+Each question runs the same code as the webhook after intent parsing:
+router.run_tools, then translation into the asker's language (60% Hindi, 25%
+Marathi, 15% English). OpenWeatherMap is a local stub with --weather-ms latency.
+Gemini (prices, translation) is a stub with --gemini-ms latency. Time is
+compressed by --scale: cache TTLs, stale windows, the prefetch interval, the
+demand half-life and the budget window all shrink by that factor. So
+--minutes 60 --scale 30 replays an hour of traffic in two minutes, with the
+default settings and budgets.
+
+Reported per variant:
+  p50/p95/p99_ms     answer latency (tools + translation) after the first --warmup minutes
+  from_memory        share of answers in under 5 ms (no upstream call waited on)
+  repeat_from_memory the same for questions asked before; a district or crop asked
+                     about for the first time always waits for the upstream
+  stale              answers served from an expired entry while it was refreshed
+  weather_calls      OpenWeatherMap requests (farmers' and prefetch)
+  gemini_calls       Gemini requests (prices and translations)
+  prefetch           refreshes / translations / calls refused by the budget
+
+    python -m benchmarks.bench_prefetch --minutes 60 --scale 30 --rate 3
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks._common import percentile, print_table  # sets dummy env vars
+
+CITIES = [
+    "Indore", "Dewas", "Ujjain", "Bhopal", "Khargone", "Dhar", "Ratlam", "Mandsaur", "Neemuch", "Shajapur",
+    "Sehore", "Vidisha", "Raisen", "Hoshangabad", "Harda", "Khandwa", "Burhanpur", "Barwani", "Jhabua", "Alirajpur",
+    "Guna", "Ashoknagar", "Shivpuri", "Gwalior", "Morena", "Bhind", "Datia", "Sagar", "Damoh", "Jabalpur",
+]
+COMMODITIES = ["Soyabean", "Wheat", "Gram", "Maize", "Cotton", "Onion", "Garlic", "Mustard"]
+LANGS = (("hi", 0.6), ("mr", 0.25), ("en", 0.15))
+MEMORY_MS = 5.0
+
+
+def memory_share(latencies: list[float]) -> float:
+    return sum(t * 1000 < MEMORY_MS for t in latencies) / max(1, len(latencies))
+
+
+def zipf_choice(rng: random.Random, items: list, s: float):
+    weights = [1 / (i + 1) ** s for i in range(len(items))]
+    return rng.choices(items, weights)[0]
+
+
+def questions(args) -> list[tuple[float, dict, str, bool]]:
+    """(arrival offset in seconds, tool call, lang_code, asked before), Poisson arrivals at --rate."""
+    rng = random.Random(args.seed)
+    out, at, end, seen = [], 0.0, args.minutes * 60 / args.scale, set()
+    while True:
+        at += rng.expovariate(args.rate)
+        if at >= end:
+            return out
+        lang = rng.choices([l for l, _ in LANGS], [w for _, w in LANGS])[0]
+        city = zipf_choice(rng, CITIES, args.zipf)
+        if rng.random() < 0.7:
+            call = {"tool_name": "get_weather_forecast", "parameters": {"location": city}}
+        else:
+            call = {"tool_name": "get_market_price",
+                    "parameters": {"commodity": zipf_choice(rng, COMMODITIES, args.zipf), "location": city}}
+        key = json.dumps(call, sort_keys=True)
+        out.append((at, {**call, "lang_code": lang}, lang, key in seen))
+        seen.add(key)
+
+
+def run_variant(variant: str, args) -> dict:
+    scale = args.scale
+    tmp = tempfile.mkdtemp()
+    os.environ.update(
+        CACHE_BACKEND="memory",
+        TRANSLATION_CACHE_BACKEND="memory",
+        TRANSLATION_CACHE_PATH=os.path.join(tmp, "translations.sqlite3"),
+        WEATHER_CACHE_TTL=str(int(600 / scale)),
+        MARKET_CACHE_TTL=str(int(1800 / scale)),
+        WEATHER_STALE_WHILE_REVALIDATE=str(int(300 / scale)),
+        MARKET_STALE_WHILE_REVALIDATE=str(int(1800 / scale)),
+        PREFETCH_INTERVAL=str(60 / scale),
+        PREFETCH_HALF_LIFE=str(6 * 3600 / scale),
+        PREFETCH_TOP_N="20" if variant == "on" else "0",
+    )
+
+    from benchmarks.stubs import StubGeminiModel, StubServer, make_upstream_app
+    from core import gemini, prefetch
+    from core import router as tools
+    from core.config import settings
+    from core.http_client import WEATHER
+    from utils.ai_processor import translate_final_texts_async
+
+    prefetch.RefreshBudget.WINDOW = 3600 / scale
+    upstream = StubServer(make_upstream_app(weather_latency=args.weather_ms / 1000)).start()
+    settings.WEATHER_API_URL = f"{upstream.url}/data/2.5/weather"
+    model = StubGeminiModel(latency=args.gemini_ms / 1000)
+    gemini.set_model(gemini.TEXT_MODEL, model)
+
+    latencies: list[float] = []
+    repeats: list[float] = []
+    warmup = args.warmup * 60 / scale
+
+    async def drive():
+        prefetch.prefetcher.start()
+
+        async def one(at: float, call: dict, lang: str, repeat: bool):
+            await asyncio.sleep(at)
+            start = time.perf_counter()
+            results = await tools.run_tools([call])
+            await translate_final_texts_async(results, lang)
+            if at >= warmup:
+                latencies.append(time.perf_counter() - start)
+                if repeat:
+                    repeats.append(latencies[-1])
+
+        await asyncio.gather(*(one(*q) for q in questions(args)))
+        await prefetch.prefetcher.stop()
+
+    try:
+        asyncio.run(drive())
+    finally:
+        upstream.stop()
+
+    stale = tools.weather_cache.stats["revalidated"] + tools.market_price_cache.stats["revalidated"]
+    return {
+        "latencies": latencies,
+        "repeats": repeats,
+        "stale": stale,
+        "weather_calls": WEATHER.stats["calls"],
+        "gemini_calls": model.calls,
+        "prefetch": prefetch.prefetcher.stats,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--minutes", type=float, default=60.0, help="of (uncompressed) traffic to replay")
+    parser.add_argument("--scale", type=float, default=30.0, help="time compression factor")
+    parser.add_argument("--warmup", type=float, default=15.0, help="minutes at the start left out of the latencies")
+    parser.add_argument("--rate", type=float, default=3.0, help="questions per (compressed) second")
+    parser.add_argument("--zipf", type=float, default=1.1, help="popularity skew of districts and crops")
+    parser.add_argument("--weather-ms", type=float, default=400.0)
+    parser.add_argument("--gemini-ms", type=float, default=900.0)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--variants", nargs="+", choices=("off", "on"), default=["off", "on"])
+    parser.add_argument("--run-variant", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_variant:
+        print(json.dumps(run_variant(args.run_variant, args)))
+        return
+
+    rows = []
+    for variant in args.variants:
+        # A fresh process per variant: caches and the prefetcher are built from settings at import.
+        out = subprocess.run(
+            [sys.executable, "-m", "benchmarks.bench_prefetch", "--run-variant", variant, *sys.argv[1:]],
+            capture_output=True, text=True, check=True,
+        ).stdout.strip().splitlines()[-1]
+        r = json.loads(out)
+        lat, p = r["latencies"], r["prefetch"]
+        rows.append([
+            variant, len(lat),
+            f"{percentile(lat, 50) * 1000:.1f}", f"{percentile(lat, 95) * 1000:.0f}", f"{percentile(lat, 99) * 1000:.0f}",
+            f"{memory_share(lat):.1%}", f"{memory_share(r['repeats']):.1%}", r["stale"],
+            r["weather_calls"], r["gemini_calls"],
+            f"{p['refreshed']}/{p['translated']}/{p['over_budget']}",
+        ])
+
+    print(f"{args.minutes:.0f} min of questions (first {args.warmup:.0f} left out) at {args.rate:g}/s, time compressed {args.scale:g}x; "
+          f"weather {args.weather_ms:.0f} ms, Gemini {args.gemini_ms:.0f} ms")
+    print_table(["prefetch", "answers", "p50_ms", "p95_ms", "p99_ms", "from_memory", "repeat_from_memory", "stale",
+                 "weather_calls", "gemini_calls", "prefetch"], rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+# benchmarks/bench_preprocess.py
+"""
+Compares per-image preprocessing cost of the old temp-file path
+(write .jpg, keras load_img, img_to_array, delete) with the in-memory
+draft-mode pipeline in utils/image_pipeline.py, on a synthetic 12MP photo.
+
+Each path runs in its own subprocess. Peak RSS is read from VmHWM after the
+imports, with the high-water mark reset via /proc/self/clear_refs (Linux), so
+the TensorFlow import does not swamp the decode cost.
+
+    python -m benchmarks.bench_preprocess --iterations 20
+"""
+import argparse
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+
+os.environ.setdefault("CUDA_VISIBLE_DEVICES", "-1")
+
+from benchmarks._common import percentile, print_table, reset_peak_rss, status_kb  # noqa: E402
+
+IMG_SIZE = 224
+
+
+def make_phone_photo(width: int = 4000, height: int = 3000) -> bytes:
+    """A 12MP JPEG with smooth gradients plus noise, roughly the size of a phone photo."""
+    import numpy as np
+    from PIL import Image
+
+    rng = np.random.default_rng(42)
+    y, x = np.mgrid[0:height, 0:width].astype(np.float32)
+    base = np.stack([
+        80 + 60 * np.sin(x / 300.0),
+        140 + 50 * np.cos(y / 250.0),
+        60 + 40 * np.sin((x + y) / 400.0),
+    ], axis=-1)
+    pixels = np.clip(base + rng.normal(0, 12, base.shape), 0, 255).astype(np.uint8)
+    buf = io.BytesIO()
+    Image.fromarray(pixels).save(buf, format="JPEG", quality=92)
+    return buf.getvalue()
+
+
+def legacy_path(data: bytes):
+    from keras.utils import load_img, img_to_array
+    from keras.applications.efficientnet import preprocess_input
+    import numpy as np
+
+    image_path = os.path.join(tempfile.gettempdir(), f"{uuid.uuid4()}.jpg")
+    with open(image_path, "wb") as f:
+        f.write(data)
+    img = load_img(image_path, target_size=(IMG_SIZE, IMG_SIZE), color_mode="rgb")
+    arr = preprocess_input(np.expand_dims(img_to_array(img), axis=0))
+    os.remove(image_path)
+    return arr
+
+
+def in_memory_path(data: bytes):
+    from keras.applications.efficientnet import preprocess_input
+    from utils.image_pipeline import decode_image, to_model_input
+
+    return preprocess_input(to_model_input(decode_image(data, IMG_SIZE)))
+
+
+PATHS = {"temp-file": legacy_path, "in-memory": in_memory_path}
+
+
+def worker(name: str, photo_path: str, iterations: int) -> None:
+    fn = PATHS[name]
+    with open(photo_path, "rb") as f:
+        data = f.read()
+    # Import everything either path needs so RSS growth reflects decoding only.
+    import keras.utils, keras.applications.efficientnet, utils.image_pipeline  # noqa: E401,F401
+    reset_peak_rss()
+    baseline = status_kb("VmRSS")
+    fn(data)  # first call is excluded from timings
+    timings = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn(data)
+        timings.append(time.perf_counter() - start)
+    peak = status_kb("VmHWM")
+    print(json.dumps({"timings": timings, "peak_kb": peak, "growth_kb": peak - baseline}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--worker", choices=PATHS, help=argparse.SUPPRESS)
+    parser.add_argument("--photo", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        worker(args.worker, args.photo, args.iterations)
+        return
+
+    data = make_phone_photo()
+    with tempfile.NamedTemporaryFile(suffix=".jpg", delete=False) as f:
+        f.write(data)
+        photo_path = f.name
+    print(f"Test photo: 4000x3000 JPEG, {len(data) / 1e6:.1f} MB")
+
+    rows = []
+    try:
+        for name in PATHS:
+            out = subprocess.run(
+                [sys.executable, "-m", "benchmarks.bench_preprocess", "--worker", name,
+                 "--photo", photo_path, "--iterations", str(args.iterations)],
+                capture_output=True, text=True, check=True,
+            ).stdout.strip().splitlines()[-1]
+            result = json.loads(out)
+            t = result["timings"]
+            rows.append([
+                name,
+                f"{sum(t) / len(t) * 1000:.1f}",
+                f"{percentile(t, 50) * 1000:.1f}",
+                f"{percentile(t, 99) * 1000:.1f}",
+                f"{result['peak_kb'] / 1024:.0f}",
+                f"{result['growth_kb'] / 1024:.0f}",
+            ])
+    finally:
+        os.remove(photo_path)
+
+    print_table(["path", "mean_ms", "p50_ms", "p99_ms", "peak_rss_mb", "peak_over_base_mb"], rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+# benchmarks/bench_resilience.py
+"""
+Fault injection: weather tool latency and answers while OpenWeatherMap (a local
+stub) misbehaves. Variants:
+  baseline        circuit breaker, hedging and last-known-good replies off
+  breaker+hedge   circuit breaker and hedged requests on
+  +stale-if-error also serves last-known-good replies when a fetch fails
+The breaker reset is shortened to 5 s so recovery shows up within a run.
+Stale-while-revalidate is off in every variant: with it, expired entries are
+answered from the cache before the upstream is even asked, which hides the rest.
+
+Scenarios (the fault runs for --duration seconds after a healthy warm-up):
+  tail     --slow-rate of requests take 2 s instead of --weather-ms
+  partial  --error-rate of requests answered 503
+  outage   every request hangs until the client gives up (WEATHER_TIMEOUT)
+
+Requests for --cities cities arrive at --rate per second, and the weather cache
+TTL is --ttl seconds, so entries keep expiring during the fault. Reported per
+row:
+  p50/p99/max_ms   get_weather_forecast_async latency
+  live             replies with fresh data
+  stale            last-known-good replies (served during the fault)
+  failed           error replies
+  upstream_reqs    requests that reached the stub
+
+    python -m benchmarks.bench_resilience --scenarios tail partial outage
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+
+from benchmarks._common import percentile, print_table  # sets dummy env vars
+
+VARIANTS = {
+    "baseline": {"CIRCUIT_BREAKER_FAILURES": "0", "WEATHER_HEDGE_PERCENTILE": "0", "WEATHER_STALE_IF_ERROR": "0"},
+    "breaker+hedge": {"WEATHER_STALE_IF_ERROR": "0"},
+    "+stale-if-error": {},
+}
+SCENARIOS = ("tail", "partial", "outage")
+
+
+def run(scenario: str, args) -> dict:
+    from benchmarks.stubs import StubServer, make_faulty_weather_app
+    from core import router
+    from core.config import settings
+    from utils.location_extractor import INDIAN_CITIES
+
+    app = make_faulty_weather_app(latency=args.weather_ms / 1000)
+    upstream = StubServer(app).start()
+    settings.WEATHER_API_URL = f"{upstream.url}/data/2.5/weather"
+    cities = [c for c in INDIAN_CITIES if c.isalpha()][:args.cities]
+
+    async def drive(seconds: float, results: list | None) -> None:
+        async def one(city: str, delay: float):
+            await asyncio.sleep(delay)
+            start = time.perf_counter()
+            reply = await router.get_weather_forecast_async(city)
+            if results is not None:
+                results.append((time.perf_counter() - start, str(reply)))
+
+        n = int(seconds * args.rate)
+        await asyncio.gather(*(one(cities[i % len(cities)], i / args.rate) for i in range(n)))
+
+    async def main() -> list:
+        await drive(args.warmup, None)
+        app.state.requests = 0
+        if scenario == "tail":
+            app.state.slow_rate = args.slow_rate
+        elif scenario == "partial":
+            app.state.error_rate = args.error_rate
+        else:
+            app.state.hang = True
+        results: list = []
+        await drive(args.duration, results)
+        return results
+
+    try:
+        results = asyncio.run(main())
+    finally:
+        upstream.stop()
+
+    stale = sum(r.startswith(router.STALE_WEATHER_NOTE) for _, r in results)
+    live = sum(r.startswith("🌤️") for _, r in results)
+    return {
+        "latencies": [t for t, _ in results],
+        "live": live,
+        "stale": stale,
+        "failed": len(results) - live - stale,
+        "upstream": app.state.requests,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--rate", type=float, default=40.0)
+    parser.add_argument("--duration", type=float, default=20.0)
+    parser.add_argument("--warmup", type=float, default=4.0)
+    parser.add_argument("--cities", type=int, default=60)
+    parser.add_argument("--ttl", type=int, default=1)
+    parser.add_argument("--weather-ms", type=float, default=80.0)
+    parser.add_argument("--slow-rate", type=float, default=0.05)
+    parser.add_argument("--error-rate", type=float, default=0.3)
+    parser.add_argument("--run", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        print(json.dumps(run(args.run, args)))
+        return
+
+    rows = []
+    for scenario in args.scenarios:
+        for variant, env in VARIANTS.items():
+            env = dict(os.environ, CACHE_BACKEND="memory", WEATHER_CACHE_TTL=str(args.ttl),
+                       WEATHER_STALE_WHILE_REVALIDATE="0", CIRCUIT_BREAKER_RESET_SECONDS="5", **env)
+            out = subprocess.run(
+                [sys.executable, "-m", "benchmarks.bench_resilience", "--run", scenario, *sys.argv[1:]],
+                env=env, capture_output=True, text=True, check=True,
+            ).stdout.strip().splitlines()[-1]
+            r = json.loads(out)
+            lat = r["latencies"]
+            rows.append([
+                scenario, variant,
+                f"{percentile(lat, 50) * 1000:.0f}", f"{percentile(lat, 99) * 1000:.0f}", f"{max(lat) * 1000:.0f}",
+                r["live"], r["stale"], r["failed"], r["upstream"],
+            ])
+
+    print_table(["scenario", "variant", "p50_ms", "p99_ms", "max_ms", "live", "stale", "failed", "upstream_reqs"], rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+# benchmarks/bench_sessions.py
+"""
+Memory and latency of the session stores at 1M distinct users, against the old
+module-level `user_sessions` dict of dicts.
+
+Each variant runs in its own subprocess and fills the store with --users
+WhatsApp numbers (a language preference each, plus one question/answer turn
+for the "+history" variants), then reports:
+  rss_mb      resident memory added by the store (after gc)
+  bytes/user  rss_mb spread over the users
+  disk_mb     database size (SQLite only)
+  update/get  per-call latency on the filled store
+
+    python -m benchmarks.bench_sessions --users 1000000
+"""
+import argparse
+import gc
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks._common import percentile, print_table, status_kb  # sets dummy env vars
+
+VARIANTS = ("legacy dict", "memory", "memory+history", "sqlite", "sqlite+history")
+TURN = (("user", "soyabean ka bhav indore"), ("assistant", "🌾 *Latest Price for Soyabean*\n\n*- Location:* Indore"))
+
+
+def user_id(i: int) -> str:
+    return f"whatsapp:+91{9000000000 + i}"
+
+
+def build(variant: str, db_path: str):
+    from core.sessions import MemorySessionStore, SQLiteSessionStore
+
+    if variant == "legacy dict":
+        store = {}
+
+        def update(uid, lang_code, messages):
+            store[uid] = {"lang_code": lang_code}
+
+        return store, update, store.get
+    if variant.startswith("memory"):
+        store = MemorySessionStore(ttl=90 * 86400, max_size=10_000_000, history_messages=6)
+    else:
+        store = SQLiteSessionStore(db_path, ttl=90 * 86400, max_size=10_000_000, history_messages=6, sweep_every=10**9)
+    return store, store.update, store.get
+
+
+def worker(variant: str, users: int, samples: int) -> None:
+    with_history = variant.endswith("+history")
+    db_path = os.path.join(tempfile.mkdtemp(), "sessions.sqlite3")
+    # Keys are built up front and kept alive in every variant so only the store itself is measured.
+    ids = [user_id(i) for i in range(users)]
+    langs = ("hi", "mr", "en")
+    gc.collect()
+    baseline = status_kb("VmRSS")
+
+    store, update, get = build(variant, db_path)
+    start = time.perf_counter()
+    for i, uid in enumerate(ids):
+        update(uid, langs[i % 3], TURN if with_history else ())
+    fill_s = time.perf_counter() - start
+    gc.collect()
+    rss_kb = status_kb("VmRSS") - baseline
+
+    rng = random.Random(1)
+    update_t, get_t = [], []
+    for _ in range(samples):
+        uid = ids[rng.randrange(users)]
+        t = time.perf_counter()
+        update(uid, "hi", TURN if with_history else ())
+        update_t.append(time.perf_counter() - t)
+        t = time.perf_counter()
+        get(uid)
+        get_t.append(time.perf_counter() - t)
+
+    disk = sum(os.path.getsize(db_path + suffix) for suffix in ("", "-wal") if os.path.exists(db_path + suffix))
+    print(json.dumps({"rss_kb": rss_kb, "disk": disk, "fill_s": fill_s, "update": update_t, "get": get_t}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=1_000_000)
+    parser.add_argument("--samples", type=int, default=2000)
+    parser.add_argument("--variants", nargs="+", choices=VARIANTS, default=list(VARIANTS))
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        worker(args.worker, args.users, args.samples)
+        return
+
+    rows = []
+    for variant in args.variants:
+        out = subprocess.run(
+            [sys.executable, "-m", "benchmarks.bench_sessions", "--worker", variant,
+             "--users", str(args.users), "--samples", str(args.samples)],
+            capture_output=True, text=True, check=True,
+        ).stdout.strip().splitlines()[-1]
+        r = json.loads(out)
+        rows.append([
+            variant,
+            f"{r['rss_kb'] / 1024:.0f}",
+            f"{r['rss_kb'] * 1024 / args.users:.0f}",
+            f"{r['disk'] / 1e6:.0f}" if r["disk"] else "-",
+            f"{r['fill_s']:.1f}",
+            f"{percentile(r['update'], 50) * 1e6:.1f}",
+            f"{percentile(r['update'], 99) * 1e6:.1f}",
+            f"{percentile(r['get'], 50) * 1e6:.1f}",
+            f"{percentile(r['get'], 99) * 1e6:.1f}",
+        ])
+
+    print(f"{args.users:,} users")
+    print_table(["store", "rss_mb", "bytes/user", "disk_mb", "fill_s",
+                 "update_p50_us", "update_p99_us", "get_p50_us", "get_p99_us"], rows)
+
+
+if __name__ == "__main__":
+    main()
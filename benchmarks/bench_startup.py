@@ -0,0 +1,100 @@
+# benchmarks/bench_startup.py
+"""
+Cold-start timing for each STARTUP_MODE. For every mode a fresh uvicorn process
+is launched and polled until:
+
+  time-to-live   "/" answers 200 (the container health check passes)
+  time-to-ready  "/ready" reports every required resource as ready or failed
+
+Per-resource load times come from the /ready payload. Import time of `main`
+alone is measured in a separate subprocess.
+
+    python -m benchmarks.bench_startup --modes background eager lazy
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+import httpx
+
+from benchmarks._common import print_table  # sets dummy env vars
+from benchmarks.stubs import free_port
+
+SETTLED = ("ready", "failed")
+
+
+def import_seconds() -> float:
+    out = subprocess.run(
+        [sys.executable, "-c", "import time; t = time.perf_counter(); import main; print(time.perf_counter() - t)"],
+        capture_output=True, text=True, check=True, env=os.environ.copy(),
+    )
+    return float(out.stdout.strip().splitlines()[-1])
+
+
+def poll(url: str, deadline: float, done) -> tuple[float | None, dict | None]:
+    start = time.perf_counter()
+    while time.perf_counter() - start < deadline:
+        try:
+            response = httpx.get(url, timeout=1.0)
+            body = response.json()
+            if done(response, body):
+                return time.perf_counter() - start, body
+        except (httpx.HTTPError, ValueError):
+            pass
+        time.sleep(0.02)
+    return None, None
+
+
+def measure(mode: str, timeout: float) -> dict:
+    port = free_port()
+    env = dict(os.environ, STARTUP_MODE=mode)
+    start = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        live, _ = poll(f"http://127.0.0.1:{port}/", timeout, lambda r, b: r.status_code == 200)
+        live = live and (time.perf_counter() - start)
+        if mode == "lazy":
+            # Nothing loads until traffic arrives; readiness is whatever the first request triggers.
+            ready, body = None, httpx.get(f"http://127.0.0.1:{port}/ready", timeout=5.0).json()
+        else:
+            settled = lambda r, b: all(res["state"] in SETTLED for res in b["resources"].values() if res["required"])
+            ready, body = poll(f"http://127.0.0.1:{port}/ready", timeout, settled)
+            ready = ready and (time.perf_counter() - start)
+        return {"live": live, "ready": ready, "resources": (body or {}).get("resources", {})}
+    finally:
+        proc.terminate()
+        proc.wait(10)
+
+
+def fmt(seconds: float | None) -> str:
+    return "-" if seconds is None else f"{seconds * 1000:.0f}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modes", nargs="+", default=["background", "eager", "lazy"])
+    parser.add_argument("--timeout", type=float, default=120.0)
+    args = parser.parse_args()
+
+    print(f"import main: {import_seconds() * 1000:.0f} ms\n")
+
+    rows, resource_rows = [], []
+    for mode in args.modes:
+        result = measure(mode, args.timeout)
+        rows.append([mode, fmt(result["live"]), fmt(result["ready"])])
+        for name, status in result["resources"].items():
+            resource_rows.append([mode, name, status["state"], fmt(status["load_seconds"]), status["error"] or ""])
+
+    print_table(["mode", "time_to_live_ms", "time_to_ready_ms"], rows)
+    if resource_rows:
+        print()
+        print_table(["mode", "resource", "state", "load_ms", "error"], resource_rows)
+
+
+if __name__ == "__main__":
+    main()
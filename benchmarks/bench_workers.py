@@ -0,0 +1,164 @@
+# benchmarks/bench_workers.py
+"""
+Throughput and memory as the number of webhook worker processes grows, with the
+pest model loaded in every worker ("local") or once in the inference sidecar
+("sidecar", core/inference_server.py).
+
+Each worker is a separate process running the real image path,
+diagnose_from_url_async: media download from a local stub, decode, hash,
+inference, reply formatting. It runs --concurrency requests at a time for
+--duration seconds. The diagnosis cache is disabled and the vision fallback is
+stubbed, so every request reaches the model. Reported per row:
+  req/sec          aggregate over all workers
+  worker_rss_mb    mean resident memory of one worker
+  sidecar_rss_mb   resident memory of the sidecar (sidecar mode)
+  total_rss_mb     everything together
+
+Throughput only scales with workers if the machine has the cores for it.
+The model file comes from the usual settings (MODEL_PATH, INFERENCE_BACKEND, ...):
+
+    MODEL_PATH=model/saved_model/krishi_multicrop_model.keras python -m benchmarks.bench_workers --workers 1 2 4
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("CUDA_VISIBLE_DEVICES", "-1")
+os.environ.setdefault("TF_CPP_MIN_LOG_LEVEL", "3")
+# Every request must reach the model, so forwarded-photo caching is off.
+os.environ["DIAGNOSIS_CACHE_SIZE"] = "0"
+
+from benchmarks._common import percentile, print_table  # noqa: E402  (sets dummy env vars)
+from benchmarks.stubs import StubServer, make_upstream_app  # noqa: E402
+
+
+def rss_kb(pid: int) -> int:
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1])
+    return 0
+
+
+def worker(media_url: str, duration: float, concurrency: int) -> None:
+    from agents import pest_detection_agent
+    from benchmarks.stubs import StubGeminiModel
+    from core import gemini
+
+    gemini.set_model(gemini.VISION_MODEL, StubGeminiModel(latency=0))
+    if pest_detection_agent.pest_model.get() is None:
+        raise SystemExit(f"model failed to load: {pest_detection_agent.pest_model.error}")
+    print("ready", flush=True)
+    sys.stdin.readline()  # wait until every worker is loaded, then start together
+
+    async def run() -> list[float]:
+        latencies: list[float] = []
+        deadline = time.perf_counter() + duration
+
+        async def client():
+            while time.perf_counter() < deadline:
+                start = time.perf_counter()
+                await pest_detection_agent.diagnose_from_url_async(media_url)
+                latencies.append(time.perf_counter() - start)
+
+        await asyncio.gather(*(client() for _ in range(concurrency)))
+        return latencies
+
+    latencies = asyncio.run(run())
+    print(json.dumps({"latencies": latencies, "rss_kb": rss_kb(os.getpid())}), flush=True)
+
+
+def read_until(proc: subprocess.Popen, predicate) -> str | None:
+    """Next stdout line of `proc` matching `predicate`, skipping the app's own log lines."""
+    for line in proc.stdout:
+        if predicate(line.strip()):
+            return line.strip()
+    return None
+
+
+def start_sidecar(socket_path: str) -> subprocess.Popen:
+    env = dict(os.environ, INFERENCE_SOCKET=socket_path)
+    proc = subprocess.Popen([sys.executable, "-m", "core.inference_server"], env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    from core.inference_server import InferenceClient
+
+    InferenceClient(socket_path).wait_until_available(300)
+    return proc
+
+
+def measure(mode: str, n_workers: int, media_url: str, args, socket_path: str) -> list:
+    sidecar = start_sidecar(socket_path) if mode == "sidecar" else None
+    env = dict(os.environ, INFERENCE_MODE=mode, INFERENCE_SOCKET=socket_path, STARTUP_MODE="lazy")
+    workers = [
+        subprocess.Popen(
+            [sys.executable, "-m", "benchmarks.bench_workers", "--worker", media_url,
+             "--duration", str(args.duration), "--concurrency", str(args.concurrency)],
+            env=env, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True,
+        )
+        for _ in range(n_workers)
+    ]
+    try:
+        for w in workers:
+            if read_until(w, lambda line: line == "ready") is None:
+                raise RuntimeError("a worker failed to start; check MODEL_PATH / INFERENCE_BACKEND")
+        for w in workers:
+            w.stdin.write("go\n")
+            w.stdin.flush()
+        results = [json.loads(read_until(w, lambda line: line.startswith("{"))) for w in workers]
+        sidecar_kb = rss_kb(sidecar.pid) if sidecar else 0
+    finally:
+        for w in workers:
+            if w.poll() is None:
+                w.kill()
+            w.wait()
+        if sidecar:
+            sidecar.terminate()
+            sidecar.wait(10)
+
+    latencies = [t for r in results for t in r["latencies"]]
+    worker_kb = sum(r["rss_kb"] for r in results) / len(results)
+    return [
+        mode, n_workers,
+        f"{len(latencies) / args.duration:.1f}",
+        f"{percentile(latencies, 50) * 1000:.0f}",
+        f"{percentile(latencies, 99) * 1000:.0f}",
+        f"{worker_kb / 1024:.0f}",
+        f"{sidecar_kb / 1024:.0f}" if sidecar else "-",
+        f"{(worker_kb * n_workers + sidecar_kb) / 1024:.0f}",
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modes", nargs="+", choices=("local", "sidecar"), default=["local", "sidecar"])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--concurrency", type=int, default=4, help="in-flight requests per worker")
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        worker(args.worker, args.duration, args.concurrency)
+        return
+
+    upstream = StubServer(make_upstream_app(media_latency=0.02)).start()
+    socket_path = os.path.join(tempfile.mkdtemp(), "inference.sock")
+    rows = []
+    try:
+        for mode in args.modes:
+            for n in args.workers:
+                rows.append(measure(mode, n, f"{upstream.url}/media/leaf.jpg", args, socket_path))
+    finally:
+        upstream.stop()
+
+    print(f"{os.cpu_count()} CPUs")
+    print_table(["mode", "workers", "req/sec", "p50_ms", "p99_ms", "worker_rss_mb", "sidecar_rss_mb", "total_rss_mb"], rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+# benchmarks/load_webhook.py
+"""
+Load test for /twilio/chat against local stub upstreams.
+
+Starts a stub OpenWeatherMap server, swaps the Gemini models for a stub with
+a fixed latency, serves the real FastAPI app with uvicorn, then fires text
+webhook calls at 1, 10 and 100 concurrent clients and reports requests/sec
+and latency percentiles.
+
+    python -m benchmarks.load_webhook --requests 200 --gemini-ms 300 --weather-ms 50
+"""
+import argparse
+import asyncio
+import time
+
+from benchmarks._common import percentile, print_table  # sets dummy env vars
+import httpx
+
+from benchmarks.stubs import StubGeminiModel, StubServer, make_upstream_app
+from core.config import settings
+
+
+def patch_gemini(stub: StubGeminiModel) -> None:
+    from core import gemini
+
+    gemini.set_model(gemini.TEXT_MODEL, stub)
+    gemini.set_model(gemini.INTENT_MODEL, stub)
+
+
+async def drive(base_url: str, n_requests: int, concurrency: int) -> list:
+    sem = asyncio.Semaphore(concurrency)
+    latencies: list[float] = []
+    errors = 0
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=120, limits=httpx.Limits(max_connections=concurrency)) as client:
+        async def one(i: int):
+            nonlocal errors
+            async with sem:
+                start = time.perf_counter()
+                r = await client.post("/twilio/chat", data={"From": f"whatsapp:+91{i:010d}", "Body": "Indore ka mausam"})
+                latencies.append(time.perf_counter() - start)
+                if r.status_code != 200:
+                    errors += 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(n_requests)))
+        elapsed = time.perf_counter() - start
+
+    return [
+        concurrency,
+        n_requests,
+        f"{n_requests / elapsed:.1f}",
+        f"{percentile(latencies, 50) * 1000:.0f}",
+        f"{percentile(latencies, 99) * 1000:.0f}",
+        errors,
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200, help="Webhook calls per concurrency level.")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 10, 100])
+    parser.add_argument("--gemini-ms", type=float, default=300.0)
+    parser.add_argument("--weather-ms", type=float, default=50.0)
+    args = parser.parse_args()
+
+    upstream = StubServer(make_upstream_app(weather_latency=args.weather_ms / 1000)).start()
+    settings.WEATHER_API_URL = f"{upstream.url}/data/2.5/weather"
+    patch_gemini(StubGeminiModel(latency=args.gemini_ms / 1000))
+
+    from main import app
+
+    server = StubServer(app).start()
+    try:
+        rows = [asyncio.run(drive(server.url, max(args.requests, c), c)) for c in args.concurrency]
+    finally:
+        server.stop()
+        upstream.stop()
+
+    print_table(["concurrency", "requests", "req/sec", "p50_ms", "p99_ms", "errors"], rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,361 @@
+# benchmarks/replay.py
+"""
+Replays a recorded corpus of Twilio webhook posts (text and photo messages,
+debugger events) against the real FastAPI app. Use it to tell whether a change
+to the webhook, the agents or the startup warm-up in main.py made things
+faster or slower.
+
+Every upstream is a local stub with a seeded latency distribution (see
+stubs.latency_sampler): Gemini text (--gemini), Gemini vision (--vision),
+OpenWeatherMap (--weather), Twilio media (--media) and the Twilio Messages API
+(--twilio, REPLY_MODE=async). Posts are sent open-loop at their recorded
+offsets, divided by --speed, so a slow app does not slow the arrivals down.
+Cache, session and queue files go to a temporary directory, so every run
+starts cold in the same way.
+
+Reported:
+  startup        seconds from server start until /ready answers 200
+  throughput     posts per second over the replay, and errors: non-2xx
+                 responses plus degraded replies (DEGRADED_REPLIES, e.g. "model
+                 is not loaded"), which the app sends with a 200
+  routes         p50/p95/p99/max latency per route and message kind
+  stages         the same from the app's own timers (core/metrics.py):
+                 pipeline stages, tools, reply kinds, webhook
+  memory         RSS after warm-up and at the end, growth and peak
+  event loop     time the server's event loop was blocked: a probe sleeps
+                 --probe-ms at a time, and any oversleep beyond 2 ms counts
+
+--out writes everything as JSON with the git revision, settings and corpus
+hash; --compare prints the change from an earlier --out file. Only compare
+runs from the same machine, corpus and arguments. If /ready never answers 200
+the replay still runs, but the report says so and the exit status is 1.
+
+    MODEL_PATH=... python -m benchmarks.replay --out before.json
+    git checkout my-branch
+    MODEL_PATH=... python -m benchmarks.replay --compare before.json
+"""
+import argparse
+import asyncio
+import gc
+import hashlib
+import html
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+os.environ.setdefault("CUDA_VISIBLE_DEVICES", "-1")
+os.environ.setdefault("TF_CPP_MIN_LOG_LEVEL", "3")
+
+from benchmarks._common import percentile, print_table, reset_peak_rss, status_kb  # noqa: E402  (sets dummy env vars)
+
+CORPUS_PATH = os.path.join(os.path.dirname(__file__), "data", "webhook_corpus.jsonl")
+BLOCKED_THRESHOLD = 0.002
+# Fallback replies that mean the app could not do the work; they arrive with a 200.
+DEGRADED_REPLIES = (
+    "model is not loaded",
+    "diagnosis service is busy",
+    "Could not process the image",
+    "Could not download the image",
+    "Vision model is not available",
+    "advanced AI analysis failed",
+    "something went wrong while looking that up",
+    "a critical error occurred",
+    "couldn't process that request",
+)
+
+
+class LoopProbe:
+    """Sleeps `interval` seconds at a time on an event loop and records how late it wakes up."""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.lags: list[float] = []
+        self._task: asyncio.Task | None = None
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(self.interval)
+            self.lags.append(loop.time() - start - self.interval)
+
+    def start(self) -> None:
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def summary(self, wall: float) -> dict:
+        blocked = sum(lag for lag in self.lags if lag > BLOCKED_THRESHOLD)
+        return {
+            "blocked_s": round(blocked, 3),
+            "blocked_share": round(blocked / wall, 4) if wall else 0.0,
+            "p99_lag_ms": round(percentile(self.lags, 99) * 1000, 2),
+            "max_lag_ms": round(max(self.lags, default=0.0) * 1000, 2),
+        }
+
+
+def record_timers() -> dict:
+    """Makes every core/metrics histogram also keep its raw samples, keyed by "timer:label"."""
+    from core import metrics
+
+    samples: dict[str, list[float]] = defaultdict(list)
+    observe = metrics.Histogram.observe
+
+    def recording(self, value: float, *labels: str) -> None:
+        observe(self, value, *labels)
+        name = self.name.removeprefix("krishimitra_").removesuffix("_seconds")
+        samples[":".join((name, *labels))].append(value)
+
+    metrics.Histogram.observe = recording
+    return samples
+
+
+def distribution(values: list[float]) -> dict:
+    return {
+        "n": len(values),
+        "p50_ms": round(percentile(values, 50) * 1000, 1),
+        "p95_ms": round(percentile(values, 95) * 1000, 1),
+        "p99_ms": round(percentile(values, 99) * 1000, 1),
+        "max_ms": round(max(values) * 1000, 1),
+    }
+
+
+def load_corpus(path: str) -> tuple[list[dict], str]:
+    with open(path, "rb") as f:
+        raw = f.read()
+    return [json.loads(line) for line in raw.decode().splitlines() if line.strip()], hashlib.sha256(raw).hexdigest()[:16]
+
+
+def git_revision() -> dict:
+    try:
+        rev = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"],
+                                    capture_output=True, text=True).stdout.strip())
+        return {"commit": rev, "dirty": dirty}
+    except (OSError, subprocess.CalledProcessError):
+        return {"commit": None, "dirty": None}
+
+
+def is_degraded(reply: str) -> bool:
+    reply = html.unescape(reply)
+    return any(marker in reply for marker in DEGRADED_REPLIES)
+
+
+def kind_of(post: dict) -> str:
+    form = post["form"]
+    if post["route"] != "/twilio/chat":
+        return post["route"]
+    return "/twilio/chat photo" if form.get("NumMedia", "0") != "0" else "/twilio/chat text"
+
+
+def run(args) -> dict:
+    import httpx
+
+    corpus, corpus_hash = load_corpus(args.corpus)
+    tmp = tempfile.mkdtemp()
+    os.environ.update(
+        CACHE_SQLITE_PATH=os.path.join(tmp, "tool_cache.sqlite3"),
+        TRANSLATION_CACHE_PATH=os.path.join(tmp, "translations.sqlite3"),
+        SESSION_DB_PATH=os.path.join(tmp, "sessions.sqlite3"),
+        REPLY_QUEUE_PATH=os.path.join(tmp, "reply_jobs.sqlite3"),
+    )
+
+    from benchmarks.stubs import (
+        StubGeminiModel, StubServer, latency_sampler, make_twilio_api_app, make_upstream_app, sample_jpeg,
+    )
+    from core import gemini
+    from core.config import settings
+
+    photos: dict[str, bytes] = {}
+
+    def photo(name: str) -> bytes:
+        # A different leaf per file name, so the diagnosis cache only hits on repeated photos.
+        if name not in photos:
+            photos[name] = sample_jpeg(seed=int(hashlib.md5(name.encode()).hexdigest()[:8], 16))
+        return photos[name]
+
+    upstream = StubServer(make_upstream_app(
+        weather_latency=latency_sampler(args.weather, seed=1),
+        media_latency=latency_sampler(args.media, seed=2),
+        media=photo,
+    )).start()
+    twilio_app = make_twilio_api_app(latency=latency_sampler(args.twilio, seed=3))
+    twilio = StubServer(twilio_app).start()
+    settings.WEATHER_API_URL = f"{upstream.url}/data/2.5/weather"
+    settings.TWILIO_API_URL = twilio.url
+    text_model = StubGeminiModel(latency=latency_sampler(args.gemini, seed=4))
+    gemini.set_model(gemini.TEXT_MODEL, text_model)
+    gemini.set_model(gemini.INTENT_MODEL, text_model)
+    gemini.set_model(gemini.VISION_MODEL, StubGeminiModel(latency=latency_sampler(args.vision, seed=5)))
+
+    samples = record_timers()
+    from main import app
+
+    probe = LoopProbe(args.probe_ms / 1000)
+    app.router.on_startup.append(probe.start)
+
+    started = time.perf_counter()
+    server = StubServer(app).start()
+    results: dict = {}
+    try:
+        startup = None
+        while time.perf_counter() - started < args.ready_timeout:
+            if httpx.get(f"{server.url}/ready").status_code == 200:
+                startup = time.perf_counter() - started
+                break
+            time.sleep(0.05)
+        if startup is None:
+            print(f"\n*** WARNING: /ready not 200 after {args.ready_timeout:.0f} s; these numbers are for a "
+                  f"server that is not ready (is MODEL_PATH set?) ***\n", file=sys.stderr)
+
+        gc.collect()
+        reset_peak_rss()
+        rss_start = status_kb("VmRSS")
+        samples.clear()
+        probe.lags.clear()
+
+        latencies: dict[str, list[float]] = defaultdict(list)
+        errors = degraded = 0
+
+        async def drive() -> float:
+            limits = httpx.Limits(max_connections=None)
+            async with httpx.AsyncClient(base_url=server.url, timeout=120, limits=limits) as client:
+                async def one(i: int, post: dict, at: float):
+                    nonlocal errors, degraded
+                    await asyncio.sleep(at / args.speed)
+                    form = {k: v.replace("{media}", upstream.url) for k, v in post["form"].items()}
+                    if post["route"] == "/twilio/chat":
+                        form.setdefault("MessageSid", f"SM{i:032d}")
+                    start = time.perf_counter()
+                    try:
+                        r = await client.post(post["route"], data=form)
+                        if r.status_code >= 300:
+                            errors += 1
+                        elif is_degraded(r.text):
+                            degraded += 1
+                    except httpx.HTTPError:
+                        errors += 1
+                    latencies[kind_of(post)].append(time.perf_counter() - start)
+
+                span = max(p["at"] for p in corpus) + 1.0
+                posts = [(r * len(corpus) + i, p, r * span + p["at"]) for r in range(args.repeat) for i, p in enumerate(corpus)]
+                start = time.perf_counter()
+                await asyncio.gather(*(one(*post) for post in posts))
+                return time.perf_counter() - start
+
+        wall = asyncio.run(drive())
+        if settings.REPLY_MODE == "async":
+            time.sleep(args.drain)  # let queued replies go out before the end-of-run measurements
+            # The TwiML was only an acknowledgement; the replies went to the Messages API.
+            degraded += sum(is_degraded(body) for _, body, _ in twilio_app.state.messages)
+        gc.collect()
+        total = sum(len(v) for v in latencies.values())
+        results = {
+            "meta": {
+                "git": git_revision(),
+                "python": platform.python_version(),
+                "machine": f"{platform.machine()} x{os.cpu_count()}",
+                "corpus": os.path.basename(args.corpus),
+                "corpus_sha256": corpus_hash,
+                "args": {k: v for k, v in vars(args).items() if k not in ("out", "compare", "corpus")},
+                "settings": {k: getattr(settings, k) for k in
+                             ("REPLY_MODE", "INFERENCE_MODE", "INFERENCE_BACKEND", "STARTUP_MODE", "INTENT_FAST_PATH")},
+            },
+            "startup_s": round(startup, 2) if startup is not None else None,
+            "ready": startup is not None,
+            "throughput": {"posts": total, "errors": errors + degraded, "degraded": degraded, "wall_s": round(wall, 2),
+                           "posts_per_s": round(total / wall, 2)},
+            "routes": {k: distribution(v) for k, v in sorted(latencies.items())},
+            "stages": {k: distribution(v) for k, v in sorted(samples.items()) if v},
+            "memory": {
+                "rss_start_mb": round(rss_start / 1024, 1),
+                "rss_end_mb": round(status_kb("VmRSS") / 1024, 1),
+                "growth_mb": round((status_kb("VmRSS") - rss_start) / 1024, 1),
+                "peak_mb": round(status_kb("VmHWM") / 1024, 1),
+            },
+            "event_loop": probe.summary(wall),
+        }
+    finally:
+        server.stop()
+        twilio.stop()
+        upstream.stop()
+    return results
+
+
+def flatten(results: dict) -> dict[str, float]:
+    """The comparable numbers of a result file, as "section.key.field" -> value."""
+    flat = {"startup_s": results.get("startup_s")}
+    for section in ("throughput", "memory", "event_loop"):
+        for key, value in results[section].items():
+            flat[f"{section}.{key}"] = value
+    for section in ("routes", "stages"):
+        for name, dist in results[section].items():
+            for field in ("p50_ms", "p95_ms", "p99_ms"):
+                flat[f"{section}.{name}.{field}"] = dist[field]
+    return flat
+
+
+def report(results: dict) -> None:
+    meta = results["meta"]
+    if not results.get("ready", True):
+        print("*** WARNING: the server never became ready; errors and latencies are not representative ***\n")
+    print(f"commit {meta['git']['commit']}{' (dirty)' if meta['git']['dirty'] else ''}, corpus {meta['corpus']} "
+          f"({meta['corpus_sha256']}), {meta['machine']}, startup {results['startup_s']} s")
+    t = results["throughput"]
+    print(f"{t['posts']} posts in {t['wall_s']} s: {t['posts_per_s']} posts/s, {t['errors']} errors "
+          f"({t.get('degraded', 0)} degraded replies)\n")
+    for section in ("routes", "stages"):
+        rows = [[name, d["n"], d["p50_ms"], d["p95_ms"], d["p99_ms"], d["max_ms"]] for name, d in results[section].items()]
+        print_table([section[:-1], "n", "p50_ms", "p95_ms", "p99_ms", "max_ms"], rows)
+        print()
+    print("memory:", ", ".join(f"{k} {v}" for k, v in results["memory"].items()))
+    print("event loop:", ", ".join(f"{k} {v}" for k, v in results["event_loop"].items()))
+
+
+def compare(results: dict, baseline: dict) -> None:
+    old, new = flatten(baseline), flatten(results)
+    if baseline["meta"]["corpus_sha256"] != results["meta"]["corpus_sha256"] or baseline["meta"]["args"] != results["meta"]["args"]:
+        print("warning: corpus or arguments differ from the baseline; the numbers are not comparable", file=sys.stderr)
+    rows = []
+    for key in sorted(old.keys() | new.keys()):
+        a, b = old.get(key), new.get(key)
+        change = f"{(b - a) / a:+.0%}" if isinstance(a, (int, float)) and isinstance(b, (int, float)) and a else ""
+        rows.append([key, "" if a is None else a, "" if b is None else b, change])
+    print(f"\nagainst {baseline['meta']['git']['commit']}:")
+    print_table(["metric", "baseline", "this run", "change"], rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", default=CORPUS_PATH)
+    parser.add_argument("--speed", type=float, default=1.0, help="replay speed-up over the recorded arrival times")
+    parser.add_argument("--repeat", type=int, default=1, help="times to replay the corpus back to back")
+    parser.add_argument("--gemini", default="lognormal:700:0.4", help="latency distribution, ms")
+    parser.add_argument("--vision", default="lognormal:2500:0.4")
+    parser.add_argument("--weather", default="lognormal:120:0.5")
+    parser.add_argument("--media", default="lognormal:150:0.3")
+    parser.add_argument("--twilio", default="lognormal:100:0.3")
+    parser.add_argument("--probe-ms", type=float, default=10.0)
+    parser.add_argument("--ready-timeout", type=float, default=180.0)
+    parser.add_argument("--drain", type=float, default=5.0, help="seconds to wait for queued replies (async mode)")
+    parser.add_argument("--out", help="write the results as JSON")
+    parser.add_argument("--compare", help="a JSON file from an earlier --out")
+    args = parser.parse_args()
+
+    results = run(args)
+    report(results)
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f))
+    if not results["ready"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
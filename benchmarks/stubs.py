@@ -0,0 +1,204 @@
+# benchmarks/stubs.py
+"""Local stand-ins for the upstream services, used by the load and benchmark scripts."""
+import asyncio
+import io
+import json
+import random
+import re
+import socket
+import threading
+import time
+from typing import Callable
+
+import uvicorn
+from fastapi import FastAPI, Request, Response
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class StubServer:
+    """Runs an ASGI app under uvicorn on a background thread."""
+
+    def __init__(self, app, port: int | None = None):
+        self.port = port or free_port()
+        self.url = f"http://127.0.0.1:{self.port}"
+        self._server = uvicorn.Server(
+            uvicorn.Config(app, host="127.0.0.1", port=self.port, log_level="warning", lifespan="on")
+        )
+        self._thread = threading.Thread(target=self._server.run, daemon=True)
+
+    def start(self) -> "StubServer":
+        self._thread.start()
+        while not self._server.started:
+            time.sleep(0.01)
+        return self
+
+    def stop(self) -> None:
+        self._server.should_exit = True
+        self._thread.join(5)
+
+
+Latency = float | Callable[[], float]
+
+
+def latency_sampler(spec: str, seed: int = 0) -> Callable[[], float]:
+    """
+    Seconds per call drawn from a spec in milliseconds:
+      "300"                     fixed
+      "uniform:100:500"         uniform between the two
+      "lognormal:300:0.5"       median 300, sigma 0.5 (a long right tail, like real APIs)
+      "bimodal:200:3000:0.05"   200 normally, 3000 for a 5% share of calls
+    Draws are seeded, so a replay sees the same latencies on every run.
+    """
+    rng = random.Random(seed)
+    kind, *params = spec.split(":") if ":" in spec else ("fixed", spec)
+    p = [float(x) / 1000 for x in params]
+    if kind == "fixed":
+        return lambda: p[0]
+    if kind == "uniform":
+        return lambda: rng.uniform(p[0], p[1])
+    if kind == "lognormal":
+        sigma = float(params[1])
+        return lambda: p[0] * rng.lognormvariate(0, sigma)
+    if kind == "bimodal":
+        share = float(params[2])
+        return lambda: p[1] if rng.random() < share else p[0]
+    raise ValueError(f"unknown latency distribution {spec!r}")
+
+
+def _seconds(latency: Latency) -> float:
+    return latency() if callable(latency) else latency
+
+
+def sample_jpeg(width: int = 640, height: int = 480, seed: int = 0) -> bytes:
+    from PIL import Image
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    pixels = rng.integers(0, 255, (height, width, 3), dtype=np.uint8)
+    pixels[..., 1] = np.maximum(pixels[..., 1], 140)  # leaf-ish green cast
+    buf = io.BytesIO()
+    Image.fromarray(pixels).save(buf, format="JPEG", quality=90)
+    return buf.getvalue()
+
+
+def make_upstream_app(
+    weather_latency: Latency = 0.05, media_latency: Latency = 0.05, media: bytes | Callable[[str], bytes] | None = None
+) -> FastAPI:
+    """
+    OpenWeatherMap and Twilio media stubs with an added latency (seconds, or a
+    sampler). `media` is the photo served for every name, or a function of the name.
+    """
+    app = FastAPI()
+    media_bytes = media or sample_jpeg()
+
+    @app.get("/data/2.5/weather")
+    async def weather(q: str = "Indore"):
+        await asyncio.sleep(_seconds(weather_latency))
+        return {
+            "main": {"temp": 31.5, "feels_like": 33.0, "humidity": 48},
+            "weather": [{"description": "scattered clouds"}],
+            "name": q,
+        }
+
+    @app.get("/media/{name}")
+    async def media_file(name: str):
+        await asyncio.sleep(_seconds(media_latency))
+        body = media_bytes(name) if callable(media_bytes) else media_bytes
+        return Response(content=body, media_type="image/jpeg")
+
+    return app
+
+
+def make_faulty_weather_app(latency: float = 0.05, seed: int = 0) -> FastAPI:
+    """
+    OpenWeatherMap stub whose faults can be changed while it runs, through app.state:
+      slow_rate / slow_latency   share of requests that take slow_latency seconds instead
+      error_rate                 share of requests answered 503
+      hang                       every request hangs (a full outage seen as timeouts)
+    """
+    app = FastAPI()
+    app.state.slow_rate, app.state.slow_latency, app.state.error_rate, app.state.hang = 0.0, 2.0, 0.0, False
+    app.state.requests = 0
+    rng = random.Random(seed)
+
+    @app.get("/data/2.5/weather")
+    async def weather(q: str = "Indore"):
+        app.state.requests += 1
+        if app.state.hang:
+            await asyncio.sleep(3600)
+        roll = rng.random()
+        await asyncio.sleep(app.state.slow_latency if roll < app.state.slow_rate else latency)
+        if rng.random() < app.state.error_rate:
+            return Response(status_code=503, content='{"message": "Service Unavailable"}', media_type="application/json")
+        return {
+            "main": {"temp": 31.5, "feels_like": 33.0, "humidity": 48},
+            "weather": [{"description": "scattered clouds"}],
+            "name": q,
+        }
+
+    return app
+
+
+def make_twilio_api_app(latency: Latency = 0.05, fail_rate: float = 0.0, seed: int = 0) -> FastAPI:
+    """
+    Twilio Messages API stub. Accepted messages are appended to `app.state.messages`
+    as (to, body, received_at perf_counter); a `fail_rate` share of calls get a 503.
+    """
+    app = FastAPI()
+    app.state.messages = []
+    rng = random.Random(seed)
+
+    @app.post("/2010-04-01/Accounts/{account_sid}/Messages.json")
+    async def create_message(account_sid: str, request: Request):
+        await asyncio.sleep(_seconds(latency))
+        if rng.random() < fail_rate:
+            return Response(status_code=503, content='{"message": "Service Unavailable"}', media_type="application/json")
+        form = await request.form()
+        app.state.messages.append((form["To"], form["Body"], time.perf_counter()))
+        return Response(status_code=201, content=json.dumps({"sid": f"SM{len(app.state.messages):032d}"}),
+                        media_type="application/json")
+
+    return app
+
+
+class _StubResponse:
+    def __init__(self, text: str):
+        self.text = text
+
+
+class StubGeminiModel:
+    """
+    Drop-in for genai.GenerativeModel.generate_content. It sleeps for `latency`
+    seconds, or a sampler's draw (the real SDK call is blocking too) and returns
+    canned text based on which prompt it received.
+    """
+
+    def __init__(self, latency: Latency = 0.3):
+        self.latency = latency
+        self.calls = 0
+
+    def generate_content(self, contents, **kwargs):
+        self.calls += 1
+        time.sleep(_seconds(self.latency))
+        prompt = contents if isinstance(contents, str) else str(contents[0])
+        if "User Query:" in prompt:
+            query = re.search(r'User Query: "(.*)"', prompt)
+            words = (query.group(1) if query else "").split()
+            return _StubResponse(json.dumps({
+                "call_tool": {
+                    "tool_name": "get_weather_forecast",
+                    "parameters": {"location": words[0] if words else "Indore"},
+                    "lang_code": "hi",
+                }
+            }))
+        if prompt.startswith("Translate each string"):
+            texts = json.loads(prompt[prompt.index("\n["):])
+            return _StubResponse(json.dumps(["[hi] " + t for t in texts], ensure_ascii=False))
+        if prompt.startswith("Translate"):
+            return _StubResponse("[hi] " + prompt.split("Text:", 1)[-1].strip().strip('"'))
+        return _StubResponse("🌾 *Latest Price for Soyabean*\n\n*- Location:* Indore\n*- Price:* Around ₹4,600 per Quintal")
@@ -0,0 +1,418 @@
+# core/cache.py
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable
+
+_MISSING = object()
+logger = logging.getLogger(__name__)
+
+
+class MemoryBackend:
+    """Bounded LRU of key -> (expires_at, value). Thread-safe."""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._data: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> tuple[float, Any] | None:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                self._data.move_to_end(key)
+            return entry
+
+    def set(self, key: str, value: Any, expires_at: float) -> int:
+        """Stores the entry and returns how many entries were evicted to make room."""
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            evicted = 0
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+                evicted += 1
+            return evicted
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class SQLiteBackend:
+    """
+    Persistent store so cached entries survive restarts. One file can hold several
+    caches; each is isolated by `namespace` and capped at `max_size` rows (LRU by last access).
+
+    To keep writes cheap, the least recently used rows are evicted in one sweep every
+    `evict_every` inserts (so a namespace can run that far over `max_size` in between),
+    and a read only records its access time if the stored one is over TOUCH_AFTER
+    seconds old. Every call blocks on SQLite: from async code, go through
+    TTLCache's *_async methods, which run them in a thread.
+    """
+
+    TOUCH_AFTER = 60.0
+
+    def __init__(self, path: str, namespace: str, max_size: int, codec=json, evict_every: int | None = None):
+        self.namespace = namespace
+        self.max_size = max_size
+        self.codec = codec
+        self.evict_every = evict_every or max(1, max_size // 100)
+        self._inserts = 0
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache ("
+            " namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL,"
+            " expires_at REAL NOT NULL, accessed_at REAL NOT NULL,"
+            " PRIMARY KEY (namespace, key))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS cache_lru ON cache (namespace, accessed_at)")
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> tuple[float, Any] | None:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT expires_at, value, accessed_at FROM cache WHERE namespace = ? AND key = ?",
+                (self.namespace, key),
+            ).fetchone()
+            if row is None:
+                return None
+            if row[2] < now - self.TOUCH_AFTER:
+                self._conn.execute(
+                    "UPDATE cache SET accessed_at = ? WHERE namespace = ? AND key = ?",
+                    (now, self.namespace, key),
+                )
+        return row[0], self.codec.loads(row[1])
+
+    def get_many(self, keys: list[str]) -> dict[str, tuple[float, Any]]:
+        """get() for several keys at once; keys not stored are left out."""
+        return {key: entry for key in keys if (entry := self.get(key)) is not None}
+
+    def set(self, key: str, value: Any, expires_at: float) -> int:
+        """Stores the entry and returns how many entries the eviction sweep (if it ran) removed."""
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache (namespace, key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                (self.namespace, key, self.codec.dumps(value), expires_at, time.time()),
+            )
+            self._inserts += 1
+            if self._inserts < self.evict_every:
+                return 0
+            self._inserts = 0
+            return self._evict()
+
+    def _evict(self) -> int:
+        """Drops the rows older than the max_size most recently used; walks the LRU index, no sort."""
+        evicted = self._conn.execute(
+            "DELETE FROM cache WHERE namespace = ? AND accessed_at < ("
+            " SELECT accessed_at FROM cache WHERE namespace = ? ORDER BY accessed_at DESC LIMIT 1 OFFSET ?)",
+            (self.namespace, self.namespace, self.max_size - 1),
+        ).rowcount
+        return max(evicted, 0)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM cache WHERE namespace = ? AND key = ?", (self.namespace, key))
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM cache WHERE namespace = ?", (self.namespace,)).fetchone()[0]
+
+
+class TTLCache:
+    """
+    TTL + LRU cache with an in-memory first level and an optional persistent
+    second level. Concurrent misses for the same key share one in-flight fetch.
+
+    Expired entries can be kept as last-known-good values: get_or_fetch serves
+    one at once (refreshing in the background) for `stale_while_revalidate`
+    seconds after expiry, and instead of raising when the fetch fails for
+    `stale_if_error` seconds after expiry.
+
+    get/set/peek touch the persistent level on the calling thread; async code
+    uses get_async/get_many_async/set_async (and get_or_fetch), which do that
+    part in a thread so SQLite never blocks the event loop.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        ttl: float,
+        max_size: int,
+        persistent: SQLiteBackend | None = None,
+        stale_while_revalidate: float = 0.0,
+        stale_if_error: float = 0.0,
+    ):
+        self.name = name
+        self.ttl = ttl
+        self.memory = MemoryBackend(max_size)
+        self.persistent = persistent
+        self.stale_while_revalidate = stale_while_revalidate
+        self.stale_if_error = stale_if_error
+        self._keep_stale = max(stale_while_revalidate, stale_if_error)
+        self._inflight: dict[str, asyncio.Task] = {}
+        self.stats = {
+            "hits": 0, "misses": 0, "evictions": 0, "expired": 0, "coalesced": 0, "persistent_hits": 0,
+            "revalidated": 0, "stale_served": 0,
+        }
+
+    def _get_memory(self, key: str, now: float) -> Any:
+        entry = self.memory.get(key)
+        if entry is not None:
+            if entry[0] > now:
+                self.stats["hits"] += 1
+                return entry[1]
+            if entry[0] + self._keep_stale <= now:
+                self.memory.delete(key)
+            self.stats["expired"] += 1
+        return _MISSING
+
+    def _from_persistent(self, key: str, entry: tuple[float, Any] | None, now: float) -> Any:
+        if entry is not None and entry[0] > now:
+            self.stats["hits"] += 1
+            self.stats["persistent_hits"] += 1
+            self.stats["evictions"] += self.memory.set(key, entry[1], entry[0])
+            return entry[1]
+        self.stats["misses"] += 1
+        return _MISSING
+
+    def get(self, key: str, default: Any = None) -> Any:
+        now = time.time()
+        value = self._get_memory(key, now)
+        if value is _MISSING:
+            if self.persistent is None:
+                self.stats["misses"] += 1
+                return default
+            value = self._from_persistent(key, self.persistent.get(key), now)
+        return default if value is _MISSING else value
+
+    async def get_async(self, key: str, default: Any = None) -> Any:
+        """get(), with the persistent lookup done in a thread."""
+        return (await self.get_many_async([key], default))[key]
+
+    async def get_many_async(self, keys: list[str], default: Any = None) -> dict[str, Any]:
+        """get() for several keys; the ones not in memory share one persistent lookup in a thread."""
+        now = time.time()
+        results = {key: self._get_memory(key, now) for key in keys}
+        missing = [key for key, value in results.items() if value is _MISSING]
+        if missing and self.persistent is not None:
+            found = await asyncio.to_thread(self.persistent.get_many, missing)
+            for key in missing:
+                results[key] = self._from_persistent(key, found.get(key), now)
+        elif missing:
+            self.stats["misses"] += len(missing)
+        return {key: default if value is _MISSING else value for key, value in results.items()}
+
+    def _set_memory(self, key: str, value: Any, ttl: float | None) -> float:
+        expires_at = time.time() + (self.ttl if ttl is None else ttl)
+        self.stats["evictions"] += self.memory.set(key, value, expires_at)
+        return expires_at
+
+    def set(self, key: str, value: Any, ttl: float | None = None) -> None:
+        expires_at = self._set_memory(key, value, ttl)
+        if self.persistent is not None:
+            self.persistent.set(key, value, expires_at)
+
+    async def set_async(self, key: str, value: Any, ttl: float | None = None) -> None:
+        """set(), with the persistent write done in a thread."""
+        expires_at = self._set_memory(key, value, ttl)
+        if self.persistent is not None:
+            await asyncio.to_thread(self.persistent.set, key, value, expires_at)
+
+    def peek(self, key: str) -> tuple[float, Any] | None:
+        """The (expires_at, value) entry for `key`, fresh or expired, without counting a lookup."""
+        entry = self.memory.get(key)
+        if entry is None and self.persistent is not None:
+            entry = self.persistent.get(key)
+        return entry
+
+    async def peek_async(self, key: str) -> tuple[float, Any] | None:
+        """peek(), with the persistent lookup done in a thread."""
+        entry = self.memory.get(key)
+        if entry is None and self.persistent is not None:
+            entry = await asyncio.to_thread(self.persistent.get, key)
+        return entry
+
+    async def _stale(self, key: str) -> tuple[float, Any] | None:
+        """The expired (expires_at, value) entry for `key` while it is kept as last-known-good."""
+        entry = await self.peek_async(key)
+        if entry is not None and entry[0] + self._keep_stale > time.time():
+            return entry
+        return None
+
+    def _start_fill(self, key: str, fetch: Callable[[], Awaitable[Any]]) -> asyncio.Task:
+        """The in-flight fetch for `key` on this loop, started if there is none."""
+        loop = asyncio.get_running_loop()
+        task = self._inflight.get(key)
+        if task is not None and task.get_loop() is loop:
+            self.stats["coalesced"] += 1
+            return task
+        task = loop.create_task(self._fill(key, fetch))
+        # A background refresh may fail with nobody awaiting it.
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        self._inflight[key] = task
+        return task
+
+    async def get_or_fetch(
+        self, key: str, fetch: Callable[[], Awaitable[Any]], on_stale: Callable[[Any], Any] | None = None
+    ) -> Any:
+        """
+        Returns the cached value for `key`, or awaits `fetch()` and caches its result.
+        If `fetch` raises, nothing is cached and the exception propagates to every
+        waiter, unless a last-known-good value can be served; `on_stale(value)` then
+        builds what is returned (e.g. the value with a "not live" note).
+        """
+        value = await self.get_async(key, _MISSING)
+        if value is not _MISSING:
+            return value
+        stale = await self._stale(key) if self._keep_stale else None
+        task = self._start_fill(key, fetch)
+
+        if stale is not None and time.time() < stale[0] + self.stale_while_revalidate:
+            self.stats["revalidated"] += 1
+            return stale[1]
+        try:
+            # Shielded so one cancelled caller does not cancel the fetch shared with others.
+            return await asyncio.shield(task)
+        except Exception:
+            if stale is None or time.time() >= stale[0] + self.stale_if_error:
+                raise
+            self.stats["stale_served"] += 1
+            return stale[1] if on_stale is None else on_stale(stale[1])
+
+    async def refresh(self, key: str, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Awaits `fetch()` and caches its result even if the cached value is still
+        fresh, sharing a fetch already in flight. Raises if `fetch` does.
+        """
+        return await asyncio.shield(self._start_fill(key, fetch))
+
+    async def _fill(self, key: str, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        try:
+            value = await fetch()
+            await self.set_async(key, value)
+            return value
+        finally:
+            if self._inflight.get(key) is asyncio.current_task():
+                del self._inflight[key]
+
+    def snapshot(self) -> dict:
+        return {"name": self.name, "size": len(self.memory), **self.stats}
+
+
+class NearDuplicateCache:
+    """
+    LRU cache keyed by 64-bit perceptual hashes, where a lookup also matches any
+    stored hash within `max_distance` differing bits.
+
+    Near matches are found with a multi-index hash: the 64 bits are split into
+    max_distance + 1 blocks, and by the pigeonhole principle two hashes within
+    that distance agree exactly on at least one block. Each block has its own
+    dict, so a lookup is a handful of dict probes plus a popcount per candidate,
+    and evicted entries are simply removed from the block dicts.
+    """
+
+    BITS = 64
+
+    def __init__(self, name: str, max_size: int, max_distance: int = 4):
+        if not 0 <= max_distance < self.BITS:
+            raise ValueError("max_distance must be between 0 and 63")
+        self.name = name
+        self.max_size = max_size
+        self.max_distance = max_distance
+        blocks = max_distance + 1
+        bounds = [round(i * self.BITS / blocks) for i in range(blocks + 1)]
+        self._blocks = [(lo, (1 << (hi - lo)) - 1) for lo, hi in zip(bounds, bounds[1:])]
+        self._index: list[dict[int, set[int]]] = [{} for _ in self._blocks]
+        self._data: OrderedDict[int, Any] = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "near_hits": 0, "misses": 0, "evictions": 0}
+
+    def _keys(self, h: int):
+        return ((h >> shift) & mask for shift, mask in self._blocks)
+
+    def get(self, h: int, default: Any = None) -> Any:
+        """The value stored under the closest hash within max_distance of `h`."""
+        with self._lock:
+            if h in self._data:
+                self._data.move_to_end(h)
+                self.stats["hits"] += 1
+                return self._data[h]
+            best, best_distance = None, self.max_distance + 1
+            for table, key in zip(self._index, self._keys(h)):
+                for candidate in table.get(key, ()):
+                    distance = (candidate ^ h).bit_count()
+                    if distance < best_distance:
+                        best, best_distance = candidate, distance
+            if best is None:
+                self.stats["misses"] += 1
+                return default
+            self._data.move_to_end(best)
+            self.stats["hits"] += 1
+            self.stats["near_hits"] += 1
+            return self._data[best]
+
+    def set(self, h: int, value: Any) -> None:
+        with self._lock:
+            if h not in self._data:
+                for table, key in zip(self._index, self._keys(h)):
+                    table.setdefault(key, set()).add(h)
+            self._data[h] = value
+            self._data.move_to_end(h)
+            while len(self._data) > self.max_size:
+                self._remove(self._data.popitem(last=False)[0])
+                self.stats["evictions"] += 1
+
+    def _remove(self, h: int) -> None:
+        for table, key in zip(self._index, self._keys(h)):
+            bucket = table[key]
+            bucket.discard(h)
+            if not bucket:
+                del table[key]
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def snapshot(self) -> dict:
+        return {"name": self.name, "size": len(self._data), **self.stats}
+
+
+CACHES: dict[str, TTLCache | NearDuplicateCache] = {}
+
+
+def create_cache(
+    name: str,
+    ttl: float,
+    max_size: int,
+    backend: str = "memory",
+    sqlite_path: str | None = None,
+    codec=json,
+    stale_while_revalidate: float = 0.0,
+    stale_if_error: float = 0.0,
+) -> TTLCache:
+    """
+    Builds a named cache and registers it in CACHES for stats reporting.
+    `codec` (anything with dumps/loads) serializes values for the SQLite backend.
+    """
+    persistent = None
+    if backend == "sqlite":
+        try:
+            persistent = SQLiteBackend(sqlite_path, namespace=name, max_size=max_size, codec=codec)
+        except (sqlite3.Error, OSError) as e:
+            logger.warning("Could not open cache database %s for '%s', using memory only. Error: %s", sqlite_path, name, e)
+    elif backend != "memory":
+        raise ValueError(f"Unknown cache backend: {backend!r}")
+    cache = CACHES[name] = TTLCache(name, ttl, max_size, persistent, stale_while_revalidate, stale_if_error)
+    return cache
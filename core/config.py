@@ -6,6 +6,12 @@ from pathlib import Path
 # Define the base directory of your project
 BASE_DIR = Path(__file__).resolve().parent.parent
 
+# Writable state (SQLite caches, sessions, the reply queue) lives outside the source tree:
+# $KRISHIMITRA_DATA_DIR, else $XDG_STATE_HOME/krishimitra, else ~/.local/state/krishimitra
+DATA_DIR = os.environ.get("KRISHIMITRA_DATA_DIR") or os.path.join(
+    os.environ.get("XDG_STATE_HOME") or os.path.join(Path.home(), ".local", "state"), "krishimitra"
+)
+
 class Settings(BaseSettings):
     WEATHER_API_KEY: str
     GEMINI_API_KEY: str
@@ -14,9 +20,176 @@ class Settings(BaseSettings):
 
     # Paths
     MODEL_PATH: str = os.path.join(BASE_DIR, 'model', 'saved_model', 'krishi_multicrop_model.keras')
+    TFLITE_MODEL_PATH: str = os.path.join(BASE_DIR, 'model', 'saved_model', 'krishi_multicrop_model.tflite')
+    ONNX_MODEL_PATH: str = os.path.join(BASE_DIR, 'model', 'saved_model', 'krishi_multicrop_model.onnx')
     CLASS_NAMES_PATH: str = os.path.join(BASE_DIR, 'model', 'class_names.json')
     INDIAN_CITIES_PATH: str = os.path.join(BASE_DIR, 'static', 'data.json')
 
+    # Upstream services: timeouts (seconds) and concurrency limits
+    WEATHER_API_URL: str = "http://api.openweathermap.org/data/2.5/weather"
+    WEATHER_TIMEOUT: float = 5.0
+    WEATHER_MAX_CONCURRENCY: int = 20
+    GEMINI_TIMEOUT: float = 20.0
+    GEMINI_MAX_CONCURRENCY: int = 8
+    MEDIA_TIMEOUT: float = 15.0
+    MEDIA_MAX_CONCURRENCY: int = 10
+    TWILIO_API_URL: str = "https://api.twilio.com"
+    TWILIO_API_TIMEOUT: float = 10.0
+    TWILIO_API_MAX_CONCURRENCY: int = 10
+    HTTP_MAX_CONNECTIONS: int = 100
+
+    # Answer unambiguous queries locally before falling back to the Gemini meta-prompt
+    INTENT_FAST_PATH: bool = True
+    # Identical messages (after normalising case, spacing and end punctuation, with the same
+    # recent history) share one Gemini intent call while it is in flight and its result
+    # for INTENT_COALESCE_WINDOW seconds afterwards (0 = in-flight sharing only)
+    INTENT_COALESCE_WINDOW: float = 2.0
+    INTENT_COALESCE_SIZE: int = 2000
+
+    # Upstream resilience (core/resilience.py). After CIRCUIT_BREAKER_FAILURES consecutive
+    # failures an upstream's circuit opens and calls fail fast to cached or fallback replies;
+    # after CIRCUIT_BREAKER_RESET_SECONDS one probe call decides whether it closes (0 = off).
+    # A weather request slower than WEATHER_HEDGE_PERCENTILE of recent ones is hedged
+    # with a second identical request (0 = off)
+    CIRCUIT_BREAKER_FAILURES: int = 5
+    CIRCUIT_BREAKER_RESET_SECONDS: float = 30.0
+    WEATHER_HEDGE_PERCENTILE: float = 95.0
+
+    # Tool response caches (TTL in seconds). CACHE_BACKEND is "memory" or "sqlite".
+    CACHE_BACKEND: str = "memory"
+    CACHE_SQLITE_PATH: str = os.path.join(DATA_DIR, 'tool_cache.sqlite3')
+    WEATHER_CACHE_TTL: int = 600
+    WEATHER_CACHE_SIZE: int = 1024
+    MARKET_CACHE_TTL: int = 1800
+    MARKET_CACHE_SIZE: int = 1024
+    # Expired tool responses are kept as last-known-good: for *_STALE_WHILE_REVALIDATE
+    # seconds after expiry they are served at once while a refresh runs in the background,
+    # and for *_STALE_IF_ERROR seconds they are served (marked as not live) when the
+    # upstream fails or its circuit is open
+    WEATHER_STALE_WHILE_REVALIDATE: int = 300
+    WEATHER_STALE_IF_ERROR: int = 6 * 3600
+    MARKET_STALE_WHILE_REVALIDATE: int = 1800
+    MARKET_STALE_IF_ERROR: int = 24 * 3600
+
+    # Translation cache; languages listed in TRANSLATION_WARM_LANGS are pre-translated at startup
+    TRANSLATION_CACHE_BACKEND: str = "sqlite"
+    TRANSLATION_CACHE_PATH: str = os.path.join(DATA_DIR, 'translations.sqlite3')
+    TRANSLATION_CACHE_TTL: int = 30 * 24 * 3600
+    TRANSLATION_CACHE_SIZE: int = 20000
+    TRANSLATION_WARM_LANGS: list[str] = ["hi", "mr"]
+    TRANSLATION_BATCH_SIZE: int = 25
+
+    # Tool dispatch: one message can ask several questions ("Indore weather and soyabean
+    # bhav in Dewas"); their tools run concurrently, each within its own timeout (seconds)
+    MAX_TOOL_CALLS: int = 4
+    TOOL_TIMEOUTS: dict[str, float] = {"get_weather_forecast": 8.0, "get_market_price": 12.0}
+
+    # Advisory prefetch (core/prefetch.py). Every PREFETCH_INTERVAL seconds, the PREFETCH_TOP_N
+    # most asked-for weather locations and crop/mandi prices are refreshed before their cached
+    # reply expires. These are keys whose count is at least PREFETCH_MIN_SCORE; counts halve
+    # every PREFETCH_HALF_LIFE seconds. Each reply is also pre-translated into every language
+    # used by at least PREFETCH_MIN_LANG_SHARE of its askers. The prefetcher makes at most
+    # PREFETCH_BUDGETS calls per upstream in any rolling hour, per worker process
+    # (an upstream left out gets no prefetch calls). PREFETCH_TOP_N=0 turns it off
+    PREFETCH_INTERVAL: float = 60.0
+    PREFETCH_TOP_N: int = 20
+    PREFETCH_MIN_SCORE: float = 3.0
+    PREFETCH_HALF_LIFE: float = 6 * 3600
+    PREFETCH_MIN_LANG_SHARE: float = 0.2
+    PREFETCH_TRACKED_KEYS: int = 5000
+    PREFETCH_BUDGETS: dict[str, int] = {"weather": 300, "gemini": 150}
+
+    # Pest model runtime: "keras", or "tflite"/"onnx" artifacts made by tools/export_pest_model.py.
+    # INFERENCE_THREADS=0 leaves the thread count to the runtime
+    INFERENCE_BACKEND: str = "keras"
+    INFERENCE_THREADS: int = 0
+
+    # Where the pest model runs: "local" loads it in every worker process; "sidecar" loads it
+    # once in core/inference_server.py, which workers reach over INFERENCE_SOCKET
+    INFERENCE_MODE: str = "local"
+    INFERENCE_SOCKET: str = "/tmp/krishimitra-inference.sock"
+    INFERENCE_SIDECAR_TIMEOUT: float = 30.0
+    INFERENCE_SIDECAR_STARTUP_TIMEOUT: float = 180.0
+
+    # Pest model micro-batching
+    INFERENCE_MAX_BATCH_SIZE: int = 8
+    INFERENCE_MAX_WAIT_MS: float = 5.0
+    INFERENCE_QUEUE_SIZE: int = 64
+    # Longest a photo waits for its prediction before the farmer gets a "busy" reply (seconds)
+    INFERENCE_PREDICT_TIMEOUT: float = 30.0
+
+    # Perceptual-hash cache of pest diagnoses: forwarded or re-sent photos within
+    # DIAGNOSIS_CACHE_MAX_DISTANCE differing bits (of 64) skip inference and vision AI
+    DIAGNOSIS_CACHE_SIZE: int = 5000
+    DIAGNOSIS_CACHE_MAX_DISTANCE: int = 4
+    DIAGNOSIS_HASH: str = "phash"
+
+    # Per-user sessions (reply language + recent messages). SESSION_BACKEND is "sqlite"
+    # (shared by all workers on the host, survives restarts) or "memory" (per process).
+    # History is dropped after SESSION_CONTEXT_TTL seconds of inactivity
+    SESSION_BACKEND: str = "sqlite"
+    SESSION_DB_PATH: str = os.path.join(DATA_DIR, 'sessions.sqlite3')
+    SESSION_TTL: int = 90 * 24 * 3600
+    SESSION_MAX_USERS: int = 1_000_000
+    SESSION_HISTORY_MESSAGES: int = 6
+    SESSION_CONTEXT_TTL: int = 2 * 3600
+
+    # Reply delivery. "sync" answers in the webhook's TwiML response; "async" acknowledges
+    # at once, queues the message (deduplicated by MessageSid) and sends the reply through
+    # the Twilio Messages API from background workers, retrying failures with backoff.
+    # TWILIO_WHATSAPP_NUMBER is the sender; empty means the number the message was sent to
+    REPLY_MODE: str = "sync"
+    REPLY_QUEUE_PATH: str = os.path.join(DATA_DIR, 'reply_jobs.sqlite3')
+    REPLY_WORKERS: int = 8
+    REPLY_MAX_ATTEMPTS: int = 5
+    REPLY_BACKOFF_SECONDS: float = 2.0
+    TWILIO_WHATSAPP_NUMBER: str = ""
+
+    # How heavy resources (pest model, Gemini SDK) are loaded: "background" starts loading
+    # them at startup without blocking it, "eager" blocks startup until they are loaded,
+    # "lazy" loads each one on first use
+    STARTUP_MODE: str = "background"
+    # A resource that fails to load is retried on its next use after RESOURCE_RETRY_SECONDS;
+    # the wait doubles after each further failure, up to RESOURCE_RETRY_MAX_SECONDS
+    RESOURCE_RETRY_SECONDS: float = 30.0
+    RESOURCE_RETRY_MAX_SECONDS: float = 600.0
+
+    # Admission checks on incoming photos (utils/image_admission.py); failures get a
+    # "please resend" reply before any inference or vision call. Brightness is mean luma
+    # (0-255), plant ratio the share of leaf-coloured pixels, sharpness the variance of
+    # the Laplacian on the 224px model input; 0 disables a lower bound
+    IMAGE_MAX_BYTES: int = 8 * 1024 * 1024
+    IMAGE_MIN_SIDE: int = 100
+    IMAGE_MAX_PIXELS: int = 50_000_000
+    IMAGE_MIN_BRIGHTNESS: float = 25.0
+    IMAGE_MAX_BRIGHTNESS: float = 235.0
+    IMAGE_MIN_PLANT_RATIO: float = 0.05
+    IMAGE_MIN_SHARPNESS: float = 10.0
+    # Photos sent to Gemini Vision are downscaled to this longer side and re-encoded as JPEG
+    VISION_MAX_SIDE: int = 1024
+    VISION_JPEG_QUALITY: int = 85
+
+    # Batch diagnosis of survey photos (tools/diagnose_batch.py, POST /diagnose/batch).
+    # The endpoint is off unless BATCH_API_TOKEN is set; callers send it as a Bearer token
+    BATCH_API_TOKEN: str = ""
+    BATCH_SIZE: int = 8
+    BATCH_WORKERS: int = 2
+    BATCH_MAX_IMAGES: int = 2000
+    BATCH_MAX_UPLOAD_MB: int = 200
+    BATCH_MAX_IMAGE_BYTES: int = 20 * 1024 * 1024
+    # Survey photo downloads in URL mode have their own timeout, concurrency limit and
+    # circuit breaker, so dead survey links never hold up farmers' WhatsApp photos
+    BATCH_MEDIA_TIMEOUT: float = 15.0
+    BATCH_MEDIA_MAX_CONCURRENCY: int = 8
+    # URL mode only fetches http(s) URLs whose host resolves to public addresses, connecting
+    # to the address it checked (again on every redirect). If BATCH_URL_ALLOWED_HOSTS is set,
+    # only those hosts and their subdomains are fetched instead
+    BATCH_URL_ALLOWED_HOSTS: list[str] = []
+
+    # Log verbosity (DEBUG, INFO, WARNING, ...). DEBUG also logs each parsed AI action
+    # and outgoing reply, which contain the farmer's messages
+    LOG_LEVEL: str = "INFO"
+
     class Config:
         env_file = os.path.join(BASE_DIR, '.env')
 
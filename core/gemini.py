@@ -0,0 +1,56 @@
+# core/gemini.py
+import asyncio
+import logging
+import threading
+from core.config import settings
+from core.lazy import LazyResource
+
+logger = logging.getLogger(__name__)
+
+TEXT_MODEL = 'gemini-flash-latest'
+VISION_MODEL = 'gemini-pro-vision'
+# Intent parsing: TEXT_MODEL with its own system instruction and output schema (utils/ai_processor.py)
+INTENT_MODEL = 'intent'
+
+def _configure():
+    # The SDK import alone takes a noticeable part of a second, so it is deferred too.
+    import google.generativeai as genai
+    genai.configure(api_key=settings.GEMINI_API_KEY)
+    logger.info("Gemini AI client configured.")
+    return genai
+
+# Configured once for the whole process and shared by every agent.
+client = LazyResource("gemini", _configure)
+
+_models: dict[str, object] = {}
+_models_lock = threading.Lock()
+# Models built with more than a name: key -> (model name, GenerativeModel keyword arguments)
+_configs: dict[str, tuple[str, dict]] = {}
+
+def configure_model(key: str, model_name: str, **options) -> None:
+    """Registers `key` as `model_name` with fixed options (system_instruction, generation_config, ...)."""
+    _configs[key] = (model_name, options)
+
+def get_model(name: str = TEXT_MODEL):
+    """Returns the shared GenerativeModel for `name`, or None if Gemini could not be configured."""
+    model = _models.get(name)
+    if model is None:
+        genai = client.get()
+        if genai is None:
+            return None
+        with _models_lock:
+            model = _models.get(name)
+            if model is None:
+                model_name, options = _configs.get(name, (name, {}))
+                model = _models[name] = genai.GenerativeModel(model_name, **options)
+    return model
+
+async def get_model_async(name: str = TEXT_MODEL):
+    """Like get_model, but does the first-time SDK import and configuration off the event loop."""
+    if name in _models:
+        return _models[name]
+    return await asyncio.to_thread(get_model, name)
+
+def set_model(name: str, model) -> None:
+    """Installs a model object for `name` (used by benchmarks to plug in stubs)."""
+    _models[name] = model
@@ -0,0 +1,135 @@
+# core/http_client.py
+import asyncio
+import concurrent.futures
+import functools
+import threading
+import weakref
+from typing import Any, Callable, Coroutine, TypeVar
+
+import httpx
+from core import resilience
+from core.config import settings
+
+T = TypeVar("T")
+
+
+class Upstream:
+    """
+    Timeout, concurrency limit, circuit breaker and recent latencies for one external
+    service. Calls go through core/resilience.call; `hedge_percentile` (0 = off)
+    is the latency percentile after which an idempotent call is hedged.
+    """
+
+    def __init__(self, name: str, timeout: float, max_concurrency: int, hedge_percentile: float = 0.0):
+        self.name = name
+        self.timeout = timeout
+        self.max_concurrency = max_concurrency
+        self.hedge_percentile = hedge_percentile
+        self.breaker = resilience.CircuitBreaker(
+            name, settings.CIRCUIT_BREAKER_FAILURES, settings.CIRCUIT_BREAKER_RESET_SECONDS
+        )
+        self.latency = resilience.LatencyWindow()
+        self.stats = {"calls": 0, "failures": 0, "timeouts": 0, "hedged": 0, "hedge_wins": 0}
+        UPSTREAMS[name] = self
+        # asyncio primitives are bound to a loop, so keep one semaphore per loop.
+        self._semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = (
+            weakref.WeakKeyDictionary()
+        )
+        self._executor: concurrent.futures.ThreadPoolExecutor | None = None
+        self._executor_lock = threading.Lock()
+
+    def limit(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        sem = self._semaphores.get(loop)
+        if sem is None:
+            sem = self._semaphores[loop] = asyncio.Semaphore(self.max_concurrency)
+        return sem
+
+    def executor(self) -> concurrent.futures.ThreadPoolExecutor:
+        """
+        Threads for this upstream's blocking SDK calls, at most max_concurrency of them
+        across every event loop. A thread stays busy until its call really returns,
+        even after the awaiting coroutine has timed out.
+        """
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = concurrent.futures.ThreadPoolExecutor(
+                    max_workers=self.max_concurrency, thread_name_prefix=f"{self.name}-call"
+                )
+            return self._executor
+
+
+UPSTREAMS: dict[str, Upstream] = {}
+
+WEATHER = Upstream("weather", settings.WEATHER_TIMEOUT, settings.WEATHER_MAX_CONCURRENCY, settings.WEATHER_HEDGE_PERCENTILE)
+GEMINI = Upstream("gemini", settings.GEMINI_TIMEOUT, settings.GEMINI_MAX_CONCURRENCY)
+TWILIO_MEDIA = Upstream("twilio_media", settings.MEDIA_TIMEOUT, settings.MEDIA_MAX_CONCURRENCY)
+TWILIO_API = Upstream("twilio_api", settings.TWILIO_API_TIMEOUT, settings.TWILIO_API_MAX_CONCURRENCY)
+BATCH_MEDIA = Upstream("batch_media", settings.BATCH_MEDIA_TIMEOUT, settings.BATCH_MEDIA_MAX_CONCURRENCY)
+
+
+# --- Shared pooled client (one per event loop) ---
+_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = weakref.WeakKeyDictionary()
+
+
+def get_client() -> httpx.AsyncClient:
+    """Returns the pooled AsyncClient for the running event loop, creating it on first use."""
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None or client.is_closed:
+        client = _clients[loop] = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=settings.HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.HTTP_MAX_CONNECTIONS,
+            ),
+            follow_redirects=True,
+        )
+    return client
+
+
+async def close_client() -> None:
+    """Closes the client bound to the running loop (call from app shutdown)."""
+    client = _clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
+
+
+async def run_blocking(upstream: Upstream, fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """
+    Runs a blocking SDK call (e.g. Gemini generate_content) on the upstream's own
+    thread pool, bounded by its concurrency limit, timeout and circuit breaker.
+    A call that times out keeps its thread until the SDK returns, so slow calls
+    cannot pile up beyond max_concurrency threads. A call still queued for a thread
+    when it times out never runs.
+    """
+    if upstream is GEMINI:
+        # Let the SDK give up too, instead of holding the thread after we have stopped waiting.
+        kwargs.setdefault("request_options", {"timeout": upstream.timeout})
+    call = functools.partial(fn, *args, **kwargs)
+    return await resilience.call(upstream, lambda: asyncio.wrap_future(upstream.executor().submit(call)))
+
+
+# --- Sync bridge ---
+# The sync tool functions are thin wrappers that run their async counterpart on a
+# long-lived background loop, so they share that loop's pooled client.
+_bridge_loop: asyncio.AbstractEventLoop | None = None
+_bridge_lock = threading.Lock()
+
+
+def _get_bridge_loop() -> asyncio.AbstractEventLoop:
+    global _bridge_loop
+    with _bridge_lock:
+        if _bridge_loop is None:
+            _bridge_loop = asyncio.new_event_loop()
+            threading.Thread(target=_bridge_loop.run_forever, name="sync-bridge", daemon=True).start()
+    return _bridge_loop
+
+
+def run_sync(coro: Coroutine[Any, Any, T]) -> T:
+    """Runs `coro` to completion from synchronous code and returns its result."""
+    return asyncio.run_coroutine_threadsafe(coro, _get_bridge_loop()).result()
+
+
+def submit_async(coro: Coroutine[Any, Any, T]) -> "concurrent.futures.Future[T]":
+    """Starts `coro` on the bridge loop from synchronous code without waiting for it."""
+    return asyncio.run_coroutine_threadsafe(coro, _get_bridge_loop())
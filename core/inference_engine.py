@@ -0,0 +1,178 @@
+# core/inference_engine.py
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class EngineOverloadedError(RuntimeError):
+    """Raised when the request queue is full and a new image cannot be accepted."""
+
+
+class EngineStoppedError(RuntimeError):
+    """Set on requests still queued when the engine is stopped."""
+
+
+class _Request:
+    __slots__ = ("image", "future", "enqueued_at")
+
+    def __init__(self, image: np.ndarray, future: Future):
+        self.image = image
+        self.future = future
+        self.enqueued_at = time.perf_counter()
+
+
+class MicroBatchEngine:
+    """
+    Collects preprocessed images from concurrent callers into dynamic
+    micro-batches and runs them through `predict_fn` on a dedicated worker thread.
+
+    A batch is dispatched as soon as it reaches `max_batch_size` or the oldest
+    waiting image has waited `max_wait_ms`, whichever comes first. Every caller
+    gets its own Future resolving to that image's row of the prediction output.
+    If the worker thread dies, the next `submit` restarts it.
+    """
+
+    def __init__(
+        self,
+        predict_fn: Callable[[np.ndarray], np.ndarray],
+        input_shape: tuple[int, ...],
+        max_batch_size: int = 8,
+        max_wait_ms: float = 5.0,
+        max_queue_size: int = 64,
+        name: str = "inference-engine",
+    ):
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be at least 1")
+        self.predict_fn = predict_fn
+        self.input_shape = tuple(input_shape)
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.name = name
+
+        self._queue: queue.Queue[_Request] = queue.Queue(maxsize=max_queue_size)
+        # Preallocated batch buffer; reused for every dispatch.
+        self._batch = np.empty((max_batch_size, *self.input_shape), dtype=np.float32)
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+        self.stats = {"batches": 0, "images": 0, "rejected": 0, "errors": 0, "restarts": 0}
+
+    # --- Lifecycle ---
+    def start(self) -> "MicroBatchEngine":
+        if self._thread and self._thread.is_alive():
+            return self
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout: float | None = 5.0) -> None:
+        """Stops the worker; requests still queued fail with EngineStoppedError."""
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+        error = EngineStoppedError(f"{self.name} was stopped")
+        while True:
+            try:
+                req = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if req.future.set_running_or_notify_cancel():
+                req.future.set_exception(error)
+
+    @property
+    def running(self) -> bool:
+        return bool(self._thread and self._thread.is_alive())
+
+    # --- Client API ---
+    def submit(self, image: np.ndarray) -> Future:
+        """
+        Queues a single preprocessed image of shape `input_shape` (a leading
+        batch axis of 1 is accepted and dropped). Raises EngineOverloadedError
+        instead of blocking when the queue is full.
+        """
+        if image.ndim == len(self.input_shape) + 1 and image.shape[0] == 1:
+            image = image[0]
+        if image.shape != self.input_shape:
+            raise ValueError(f"Expected image of shape {self.input_shape}, got {image.shape}")
+        if self._stop.is_set():
+            raise EngineStoppedError(f"{self.name} is stopped")
+        if self._thread is not None and not self._thread.is_alive():
+            logger.error("%s worker thread died; restarting it", self.name)
+            self.stats["restarts"] += 1
+            self.start()
+
+        future: Future = Future()
+        try:
+            self._queue.put_nowait(_Request(image, future))
+        except queue.Full:
+            self.stats["rejected"] += 1
+            raise EngineOverloadedError(f"{self.name} queue is full ({self._queue.maxsize} pending)")
+        return future
+
+    def predict(self, image: np.ndarray, timeout: float | None = None) -> np.ndarray:
+        """
+        Blocking helper: submits one image and waits for its prediction row. Raises
+        TimeoutError after `timeout` seconds, and the image is then dropped if not yet batched.
+        """
+        future = self.submit(image)
+        try:
+            return future.result(timeout)
+        except TimeoutError:
+            future.cancel()
+            raise
+
+    # --- Worker ---
+    def _collect(self, first: _Request) -> list[_Request]:
+        batch = [first]
+        deadline = first.enqueued_at + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                if remaining <= 0:
+                    batch.append(self._queue.get_nowait())
+                else:
+                    batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                first = self._queue.get(timeout=0.1)
+            except queue.Empty:
+                continue
+
+            requests = [r for r in self._collect(first) if r.future.set_running_or_notify_cancel()]
+            if not requests:
+                continue
+
+            n = len(requests)
+            try:
+                for i, req in enumerate(requests):
+                    self._batch[i] = req.image
+                outputs = np.asarray(self.predict_fn(self._batch[:n]))
+                if outputs.ndim < 1 or outputs.shape[0] != n:
+                    raise ValueError(f"{self.name}: model returned shape {outputs.shape} for a batch of {n}")
+                rows = [outputs[i].copy() for i in range(n)]
+            except Exception as e:
+                # Any failure fails the whole batch, so no caller is left waiting.
+                logger.error("%s batch of %d failed: %r", self.name, n, e)
+                self.stats["errors"] += 1
+                for req in requests:
+                    req.future.set_exception(e)
+                continue
+
+            self.stats["batches"] += 1
+            self.stats["images"] += n
+            for req, row in zip(requests, rows):
+                req.future.set_result(row)
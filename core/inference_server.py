@@ -0,0 +1,203 @@
+# core/inference_server.py
+"""
+Inference sidecar: one process holds the pest model and its MicroBatchEngine,
+and any number of webhook workers send it preprocessed images over a Unix
+socket. Workers then never import TensorFlow, and images from all of them are
+batched together.
+
+Wire format (all integers big-endian):
+  request   u32 length, then `length` bytes of uint8 HxWx3 pixels
+  response  u8 status, u32 length, then float32 probabilities (status OK)
+            or a UTF-8 error message (status BUSY / ERROR)
+
+Pixels travel as uint8 because the model input is the raw 0-255 image: it is
+exact and a quarter of the float32 size (150 KB per 224x224 image).
+
+    python -m core.inference_server               # one sidecar
+    python -m core.inference_server --supervise   # restarted whenever it exits (gunicorn.conf.py)
+"""
+import argparse
+import asyncio
+import logging
+import os
+import signal
+import socket
+import struct
+import subprocess
+import sys
+import threading
+import time
+
+import numpy as np
+
+from core.inference_engine import EngineOverloadedError, MicroBatchEngine
+
+_REQUEST = struct.Struct("!I")
+_RESPONSE = struct.Struct("!BI")
+OK, BUSY, ERROR = 0, 1, 2
+logger = logging.getLogger(__name__)
+
+
+class InferenceServer:
+    """Serves `engine` on a Unix socket; each connection handles one request at a time."""
+
+    def __init__(self, engine: MicroBatchEngine, path: str):
+        self.engine = engine
+        self.path = path
+        self._frame_bytes = int(np.prod(engine.input_shape))
+
+    async def serve_forever(self) -> None:
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        server = await asyncio.start_unix_server(self._handle, path=self.path)
+        os.chmod(self.path, 0o660)
+        logger.info("Inference sidecar listening on %s", self.path)
+        async with server:
+            await server.serve_forever()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                (length,) = _REQUEST.unpack(await reader.readexactly(_REQUEST.size))
+                payload = await reader.readexactly(length)
+                status, body = await self._predict(payload)
+                writer.write(_RESPONSE.pack(status, len(body)) + body)
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def _predict(self, payload: bytes) -> tuple[int, bytes]:
+        if len(payload) != self._frame_bytes:
+            return ERROR, f"expected {self._frame_bytes} bytes, got {len(payload)}".encode()
+        image = np.frombuffer(payload, dtype=np.uint8).reshape(self.engine.input_shape).astype(np.float32)
+        try:
+            probabilities = await asyncio.wrap_future(self.engine.submit(image))
+        except EngineOverloadedError as e:
+            return BUSY, str(e).encode()
+        except Exception as e:
+            return ERROR, repr(e).encode()
+        return OK, np.asarray(probabilities, dtype=np.float32).tobytes()
+
+
+class InferenceClient:
+    """
+    Worker-side stand-in for MicroBatchEngine: `predict(image)` ships the image
+    to the sidecar and blocks for its probabilities, for at most its `timeout`
+    (or the client's default). Each thread keeps its own connection, so concurrent
+    callers do not serialize on one socket.
+    """
+
+    def __init__(self, path: str, timeout: float = 30.0):
+        self.path = path
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connect(self) -> socket.socket:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        sock.connect(self.path)
+        return sock
+
+    def wait_until_available(self, timeout: float) -> "InferenceClient":
+        """Blocks until the sidecar accepts connections (it may still be loading the model)."""
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                self._connect().close()
+                return self
+            except OSError:
+                if time.monotonic() > deadline:
+                    raise
+                time.sleep(0.2)
+
+    def predict(self, image: np.ndarray, timeout: float | None = None) -> np.ndarray:
+        """Raises TimeoutError if the sidecar has not answered within `timeout` seconds."""
+        pixels = np.ascontiguousarray(image, dtype=np.uint8).tobytes()
+        sock = getattr(self._local, "sock", None)
+        try:
+            if sock is None:
+                sock = self._local.sock = self._connect()
+            sock.settimeout(timeout or self.timeout)
+            sock.sendall(_REQUEST.pack(len(pixels)) + pixels)
+            status, length = _RESPONSE.unpack(_recv_exactly(sock, _RESPONSE.size))
+            body = _recv_exactly(sock, length)
+        except OSError:
+            # Drop the connection so the next call reconnects (e.g. after a sidecar restart);
+            # after a timeout its late reply would otherwise be read as the next call's.
+            self._local.sock = None
+            if sock is not None:
+                sock.close()
+            raise
+        if status == BUSY:
+            raise EngineOverloadedError(body.decode())
+        if status != OK:
+            raise RuntimeError(f"Inference sidecar error: {body.decode()}")
+        return np.frombuffer(body, dtype=np.float32)
+
+
+def _recv_exactly(sock: socket.socket, n: int) -> bytes:
+    buf = bytearray(n)
+    view = memoryview(buf)
+    while view:
+        received = sock.recv_into(view)
+        if not received:
+            raise ConnectionError("inference sidecar closed the connection")
+        view = view[received:]
+    return bytes(buf)
+
+
+def supervise(max_backoff: float = 60.0) -> None:
+    """
+    Runs the sidecar in a child process and starts a new one whenever it exits, waiting
+    1 s, then twice as long after each quick failure (up to `max_backoff`). SIGTERM or
+    SIGINT stops the child and returns.
+    """
+    stopping = False
+    child: subprocess.Popen | None = None
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        if child is not None and child.poll() is None:
+            child.terminate()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    delay = 1.0
+    while not stopping:
+        started = time.monotonic()
+        child = subprocess.Popen([sys.executable, "-m", "core.inference_server"])
+        code = child.wait()
+        if stopping:
+            break
+        # A sidecar that ran for a while crashed once; one that keeps dying at startup backs off.
+        if time.monotonic() - started > max_backoff:
+            delay = 1.0
+        logger.error("Inference sidecar exited with code %s; restarting in %.0fs", code, delay)
+        until = time.monotonic() + delay
+        while not stopping and time.monotonic() < until:
+            time.sleep(0.2)
+        delay = min(delay * 2, max_backoff)
+
+
+def main():
+    from core.log import setup_logging
+
+    parser = argparse.ArgumentParser(description="Pest model inference sidecar.")
+    parser.add_argument("--supervise", action="store_true", help="restart the sidecar whenever it exits")
+    args = parser.parse_args()
+    setup_logging()
+    if args.supervise:
+        supervise()
+        return
+
+    from agents.pest_detection_agent import build_local_engine
+    from core.config import settings
+
+    asyncio.run(InferenceServer(build_local_engine(), settings.INFERENCE_SOCKET).serve_forever())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,210 @@
+# core/job_queue.py
+import asyncio
+import json
+import logging
+import os
+import random
+import sqlite3
+import threading
+import time
+from typing import Any, Awaitable, Callable
+
+logger = logging.getLogger(__name__)
+
+
+class PermanentJobError(Exception):
+    """Raised by a job handler when retrying cannot help (e.g. the recipient number is invalid)."""
+
+
+class JobQueue:
+    """
+    Persistent job queue in a SQLite database (WAL), shared by every worker
+    process on the host and surviving restarts.
+
+    Job ids are caller-chosen (e.g. Twilio's MessageSid), so enqueueing the same
+    id twice is a no-op: that is the deduplication for webhook retries. A claimed
+    job is leased for `lease_seconds`; if its worker dies, the lease runs out and
+    another worker picks it up. Finished jobs are kept for `retention` seconds so
+    late duplicates are still recognised.
+
+    Every method blocks on SQLite (up to `busy_timeout` seconds while another
+    process holds the write lock); call them from a thread, not the event loop.
+    """
+
+    def __init__(self, path: str, lease_seconds: float = 120.0, retention: float = 86400.0, busy_timeout: float = 5.0):
+        self.lease_seconds = lease_seconds
+        self.retention = retention
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=busy_timeout)
+        self._conn.execute(f"PRAGMA busy_timeout={int(busy_timeout * 1000)}")
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id TEXT PRIMARY KEY, payload TEXT NOT NULL, result TEXT,"
+            " status TEXT NOT NULL, attempts INTEGER NOT NULL DEFAULT 0,"
+            " run_at REAL NOT NULL, created_at REAL NOT NULL, finished_at REAL, last_error TEXT)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_due ON jobs (status, run_at)")
+        self._lock = threading.Lock()
+        self.stats = {"enqueued": 0, "duplicates": 0, "completed": 0, "retried": 0, "failed": 0}
+
+    def enqueue(self, job_id: str, payload: dict) -> bool:
+        """Adds a job; returns False if a job with this id was already queued."""
+        now = time.time()
+        with self._lock:
+            added = self._conn.execute(
+                "INSERT OR IGNORE INTO jobs (id, payload, status, run_at, created_at) VALUES (?, ?, 'pending', ?, ?)",
+                (job_id, json.dumps(payload, ensure_ascii=False), now, now),
+            ).rowcount == 1
+        self.stats["enqueued" if added else "duplicates"] += 1
+        return added
+
+    def claim(self) -> dict | None:
+        """Leases the next due job (pending, or running with an expired lease), if any."""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "UPDATE jobs SET status = 'running', attempts = attempts + 1, run_at = ?"
+                " WHERE id = (SELECT id FROM jobs WHERE status IN ('pending', 'running') AND run_at <= ?"
+                "             ORDER BY run_at LIMIT 1)"
+                " RETURNING id, payload, result, attempts, created_at",
+                (now + self.lease_seconds, now),
+            ).fetchone()
+        if row is None:
+            return None
+        return {"id": row[0], "payload": json.loads(row[1]), "result": row[2], "attempts": row[3], "created_at": row[4]}
+
+    def save_result(self, job_id: str, result: str) -> None:
+        """Stores an intermediate result so a retry can skip the work already done."""
+        with self._lock:
+            self._conn.execute("UPDATE jobs SET result = ? WHERE id = ?", (result, job_id))
+
+    def complete(self, job_id: str) -> None:
+        self._finish(job_id, "done", None)
+        self.stats["completed"] += 1
+
+    def fail(self, job_id: str, error: str) -> None:
+        self._finish(job_id, "failed", error)
+        self.stats["failed"] += 1
+
+    def retry(self, job_id: str, error: str, delay: float) -> None:
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = 'pending', run_at = ?, last_error = ? WHERE id = ?",
+                (time.time() + delay, error, job_id),
+            )
+        self.stats["retried"] += 1
+
+    def _finish(self, job_id: str, status: str, error: str | None) -> None:
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, finished_at = ?, last_error = ? WHERE id = ?",
+                (status, now, error, job_id),
+            )
+            self._conn.execute(
+                "DELETE FROM jobs WHERE status IN ('done', 'failed') AND finished_at < ?", (now - self.retention,)
+            )
+
+    def counts(self) -> dict[str, int]:
+        with self._lock:
+            return dict(self._conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+
+    def snapshot(self) -> dict:
+        return {**self.counts(), **self.stats}
+
+
+class JobWorkerPool:
+    """
+    `concurrency` asyncio tasks that claim jobs and run `handler(job)`. Failures
+    are retried with exponential backoff and jitter up to `max_attempts`;
+    PermanentJobError fails the job at once. Workers sleep up to `poll_interval`
+    between empty polls, or wake immediately when `notify()` is called.
+
+    Queue calls run in threads so a busy database never stalls the event loop. If
+    one fails (e.g. "database is locked"), the worker logs it and backs off for
+    `error_backoff` seconds instead of dying; a job whose outcome could not be
+    recorded is picked up again when its lease runs out.
+    """
+
+    def __init__(
+        self,
+        queue: JobQueue,
+        handler: Callable[[dict], Awaitable[Any]],
+        concurrency: int = 4,
+        max_attempts: int = 5,
+        backoff_base: float = 2.0,
+        backoff_max: float = 300.0,
+        poll_interval: float = 0.5,
+        error_backoff: float = 1.0,
+    ):
+        self.queue = queue
+        self.handler = handler
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.poll_interval = poll_interval
+        self.error_backoff = error_backoff
+        self._tasks: list[asyncio.Task] = []
+        self._wakeup: asyncio.Event | None = None
+
+    def start(self) -> None:
+        if self._tasks:
+            return
+        self._wakeup = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._run(), name=f"job-worker-{i}") for i in range(self.concurrency)]
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def notify(self) -> None:
+        """Wakes an idle worker (call after enqueueing from the same process)."""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def backoff(self, attempts: int) -> float:
+        delay = min(self.backoff_max, self.backoff_base * 2 ** (attempts - 1))
+        return delay * random.uniform(0.5, 1.0)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                job = await asyncio.to_thread(self.queue.claim)
+                if job is None:
+                    self._wakeup.clear()
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+                await self._process(job)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Job worker error; backing off %.1fs", self.error_backoff)
+                await asyncio.sleep(self.error_backoff * random.uniform(0.5, 1.5))
+
+    async def _process(self, job: dict) -> None:
+        try:
+            await self.handler(job)
+        except asyncio.CancelledError:
+            raise
+        except PermanentJobError as e:
+            logger.error("Job %s failed permanently: %r", job["id"], e)
+            await asyncio.to_thread(self.queue.fail, job["id"], repr(e))
+            return
+        except Exception as e:
+            if job["attempts"] >= self.max_attempts:
+                logger.error("Job %s failed after %d attempts: %r", job["id"], job["attempts"], e)
+                await asyncio.to_thread(self.queue.fail, job["id"], repr(e))
+            else:
+                delay = self.backoff(job["attempts"])
+                logger.warning("Job %s attempt %d failed (%r); retrying in %.1fs", job["id"], job["attempts"], e, delay)
+                await asyncio.to_thread(self.queue.retry, job["id"], repr(e), delay)
+            return
+        await asyncio.to_thread(self.queue.complete, job["id"])
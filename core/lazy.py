@@ -0,0 +1,116 @@
+# core/lazy.py
+import logging
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable
+
+from core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class LazyResource:
+    """
+    A heavy subsystem (ML model, NLP pipeline, API client) that is loaded on first
+    use or on a background thread, and reports its load state for readiness checks.
+    A failed load is retried on the next use once `retry_seconds` have passed; the
+    wait doubles after each further failure, up to RESOURCE_RETRY_MAX_SECONDS.
+    """
+
+    PENDING, LOADING, READY, FAILED = "pending", "loading", "ready", "failed"
+
+    def __init__(self, name: str, loader: Callable[[], Any], required: bool = True, retry_seconds: float | None = None):
+        self.name = name
+        self.loader = loader
+        self.required = required
+        self.retry_seconds = settings.RESOURCE_RETRY_SECONDS if retry_seconds is None else retry_seconds
+        self.state = self.PENDING
+        self.value: Any = None
+        self.error: str | None = None
+        self.load_seconds: float | None = None
+        self.attempts = 0
+        self.failures = 0
+        self.last_attempt: float | None = None
+        self._retry_at = 0.0
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+        RESOURCES[name] = self
+
+    def _due(self) -> bool:
+        return self.state != self.FAILED or time.monotonic() >= self._retry_at
+
+    def get(self) -> Any:
+        """
+        Returns the loaded value, loading it on this thread if nobody has yet (or retrying
+        a failed load whose backoff has passed). None if loading failed.
+        """
+        if self.state == self.READY or not self._due():
+            return self.value
+        with self._lock:
+            if self.state != self.READY and self._due():
+                self._load()
+        return self.value
+
+    def _load(self) -> None:
+        self.state = self.LOADING
+        self.attempts += 1
+        self.last_attempt = time.time()
+        start = time.perf_counter()
+        try:
+            self.value = self.loader()
+            self.state = self.READY
+            self.error = None
+            self.failures = 0
+        except Exception as e:
+            self.value = None
+            self.error = repr(e)
+            self.state = self.FAILED
+            self.failures += 1
+            backoff = min(self.retry_seconds * 2 ** (self.failures - 1), settings.RESOURCE_RETRY_MAX_SECONDS)
+            self._retry_at = time.monotonic() + backoff
+            logger.critical("Failed to load %s (attempt %d, retrying after %.0fs): %s", self.name, self.attempts, backoff, e)
+        finally:
+            self.load_seconds = time.perf_counter() - start
+            self._done.set()
+
+    def load_in_background(self) -> None:
+        if self.state == self.PENDING or (self.state == self.FAILED and self._due()):
+            threading.Thread(target=self.get, name=f"load-{self.name}", daemon=True).start()
+
+    def wait(self, timeout: float | None = None) -> bool:
+        return self._done.wait(timeout)
+
+    @property
+    def ready(self) -> bool:
+        return self.state == self.READY
+
+    def status(self) -> dict:
+        return {
+            "state": self.state,
+            "required": self.required,
+            "load_seconds": None if self.load_seconds is None else round(self.load_seconds, 3),
+            "error": self.error,
+            "attempts": self.attempts,
+            "last_attempt": None if self.last_attempt is None else datetime.fromtimestamp(self.last_attempt, timezone.utc).isoformat(timespec="seconds"),
+            "retry_in": round(max(0.0, self._retry_at - time.monotonic()), 1) if self.state == self.FAILED else None,
+        }
+
+
+RESOURCES: dict[str, LazyResource] = {}
+
+
+def load_all(background: bool = True, required_only: bool = True) -> None:
+    for resource in RESOURCES.values():
+        if required_only and not resource.required:
+            continue
+        if background:
+            resource.load_in_background()
+        else:
+            resource.get()
+
+
+def readiness() -> tuple[bool, dict]:
+    """True when every required resource is loaded, plus per-resource status."""
+    ready = all(r.ready for r in RESOURCES.values() if r.required)
+    return ready, {name: r.status() for name, r in RESOURCES.items()}
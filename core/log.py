@@ -0,0 +1,16 @@
+# core/log.py
+import logging
+
+from core.config import settings
+
+LOG_FORMAT = "%(asctime)s %(levelname)s %(name)s: %(message)s"
+
+
+def setup_logging(level: str | None = None) -> None:
+    """Configures the root logger at LOG_LEVEL (uvicorn/gunicorn keep their own loggers)."""
+    level = (level or settings.LOG_LEVEL).upper()
+    logging.basicConfig(level=level, format=LOG_FORMAT)
+    logging.getLogger().setLevel(level)
+    # httpx logs every upstream request at INFO; only show those at DEBUG.
+    if logging.getLogger().level > logging.DEBUG:
+        logging.getLogger("httpx").setLevel(logging.WARNING)
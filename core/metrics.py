@@ -0,0 +1,181 @@
+# core/metrics.py
+"""
+In-process counters and latency histograms, exposed in the Prometheus text
+format by GET /metrics (main.py).
+
+Recording a sample is a dict lookup and a few additions under a lock, so timers
+can stay on every request. Values are per process: with several gunicorn
+workers, Prometheus scrapes each one (or sums them) as usual.
+"""
+import bisect
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Iterable, Iterator
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Seconds. Covers cache hits (~ms) up to Gemini vision calls and the 15 s Twilio timeout.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 15.0, 30.0)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: tuple[str, ...], values: tuple, extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """A monotonically increasing count, optionally split by label values."""
+
+    type = "counter"
+
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = labels
+        self._values: dict[tuple, float] = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels: str) -> float:
+        return self._values.get(labels, 0)
+
+    def samples(self) -> Iterator[str]:
+        with self._lock:
+            items = list(self._values.items())
+        for labels, value in items:
+            yield f"{self.name}{_labels(self.labelnames, labels)} {_number(value)}"
+
+
+class Histogram:
+    """
+    Observations counted into fixed buckets (plus sum and count), optionally split
+    by label values. `time(*labels)` records how long its `with` block took.
+    """
+
+    type = "histogram"
+
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = (), buckets: tuple[float, ...] = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = labels
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [per-bucket counts (last one is +Inf), sum, count]
+        self._values: dict[tuple, list] = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def observe(self, value: float, *labels: str) -> None:
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                entry = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][i] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    @contextmanager
+    def time(self, *labels: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *labels)
+
+    def count(self, *labels: str) -> int:
+        entry = self._values.get(labels)
+        return entry[2] if entry else 0
+
+    def samples(self) -> Iterator[str]:
+        with self._lock:
+            items = [(labels, (list(e[0]), e[1], e[2])) for labels, e in self._values.items()]
+        for labels, (counts, total, count) in items:
+            cumulative = 0
+            for bound, n in zip((*self.buckets, math.inf), counts):
+                cumulative += n
+                le = f'le="{_number(bound)}"'
+                yield f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}"
+            yield f"{self.name}_sum{_labels(self.labelnames, labels)} {_number(total)}"
+            yield f"{self.name}_count{_labels(self.labelnames, labels)} {count}"
+
+
+class Family:
+    """Samples computed at scrape time (e.g. from a component's stats dict)."""
+
+    def __init__(self, name: str, type: str, help: str, labels: tuple[str, ...] = ()):
+        self.name = name
+        self.type = type
+        self.help = help
+        self.labelnames = labels
+        self._samples: list[tuple[tuple, float]] = []
+
+    def add(self, value: float, *labels: str) -> "Family":
+        self._samples.append((labels, value))
+        return self
+
+    def samples(self) -> Iterator[str]:
+        for labels, value in self._samples:
+            yield f"{self.name}{_labels(self.labelnames, labels)} {_number(value)}"
+
+
+REGISTRY: list[Counter | Histogram] = []
+COLLECTORS: list[Callable[[], Iterable[Family]]] = []
+
+
+def register_collector(collector: Callable[[], Iterable[Family]]) -> None:
+    """Adds a callback that returns metric families to be rendered on every scrape."""
+    COLLECTORS.append(collector)
+
+
+def render() -> str:
+    """Every registered metric and collector in the Prometheus text exposition format."""
+    lines = []
+    families = list(REGISTRY)
+    for collector in COLLECTORS:
+        families.extend(collector())
+    for metric in families:
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.type}")
+        lines.extend(metric.samples())
+    return "\n".join(lines) + "\n"
+
+
+# --- Request pipeline metrics ---
+WEBHOOK_SECONDS = Histogram(
+    "krishimitra_webhook_seconds", "Time until the Twilio webhook answered.", ("reply_mode",)
+)
+REPLY_SECONDS = Histogram(
+    "krishimitra_reply_seconds", "Time to work out the reply to one incoming message.", ("kind",)
+)
+STAGE_SECONDS = Histogram(
+    "krishimitra_stage_seconds",
+    "Time spent in each pipeline stage (intent_parse, translation, image_download, "
+    "preprocessing, admission, model_predict, vision_fallback, twiml_render).",
+    ("stage",),
+)
+TOOL_SECONDS = Histogram("krishimitra_tool_seconds", "Time spent running each tool.", ("tool",))
+DIAGNOSES = Counter(
+    "krishimitra_diagnoses_total", "Photo diagnoses by where the answer came from.", ("source",)
+)
+IMAGES_REJECTED = Counter(
+    "krishimitra_images_rejected_total", "Photos answered with a resend request, by reason.", ("reason",)
+)
+ERRORS = Counter("krishimitra_errors_total", "Failures handled in each pipeline stage.", ("stage",))
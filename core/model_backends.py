@@ -0,0 +1,132 @@
+# core/model_backends.py
+"""
+Interchangeable CPU runtimes for the pest classifier. Every backend exposes
+`predict_on_batch(batch) -> probabilities` over float32 NHWC input in the 0-255
+range, so the MicroBatchEngine does not care which one it is driving.
+
+Runtimes are imported when a backend is constructed: the TFLite and ONNX
+backends never import Keras, which is what keeps their load time and memory low.
+"""
+import os
+from typing import Callable
+
+import numpy as np
+
+BACKENDS = ("keras", "tflite", "onnx")
+
+
+class KerasBackend:
+    """The full Keras model, rebuilt from its architecture and weight file."""
+
+    name = "keras"
+
+    def __init__(self, build_fn: Callable[[], object], weights_path: str):
+        self.model = build_fn()
+        self.model.load_weights(weights_path)
+
+    def predict_on_batch(self, batch: np.ndarray) -> np.ndarray:
+        return np.asarray(self.model.predict_on_batch(batch))
+
+
+class TFLiteBackend:
+    """
+    A .tflite flatbuffer run through the TFLite interpreter (XNNPACK on CPU).
+    Handles float, float16 and int8-weight models, and quantizes/dequantizes
+    the input and output tensors of fully integer models.
+    """
+
+    name = "tflite"
+
+    def __init__(self, path: str, num_threads: int | None = None):
+        self.interpreter = _make_interpreter(model_path=path, num_threads=num_threads or None)
+        self._input = self.interpreter.get_input_details()[0]
+        self._output = self.interpreter.get_output_details()[0]
+        self._batch_size = 0
+
+    def _resize(self, n: int) -> None:
+        # Reallocating is cheap next to an invoke, and batch sizes cluster at 1 and the max.
+        if n != self._batch_size:
+            self.interpreter.resize_tensor_input(self._input["index"], [n, *self._input["shape"][1:]])
+            self.interpreter.allocate_tensors()
+            self._batch_size = n
+
+    def predict_on_batch(self, batch: np.ndarray) -> np.ndarray:
+        self._resize(len(batch))
+        dtype = self._input["dtype"]
+        if dtype != np.float32:
+            scale, zero_point = self._input["quantization"]
+            batch = np.clip(np.round(batch / scale + zero_point), *_int_range(dtype)).astype(dtype)
+        self.interpreter.set_tensor(self._input["index"], batch)
+        self.interpreter.invoke()
+        out = self.interpreter.get_tensor(self._output["index"])
+        if self._output["dtype"] != np.float32:
+            scale, zero_point = self._output["quantization"]
+            out = (out.astype(np.float32) - zero_point) * scale
+        return out
+
+
+class OnnxBackend:
+    """An ONNX export run through onnxruntime's CPU provider."""
+
+    name = "onnx"
+
+    def __init__(self, path: str, num_threads: int | None = None):
+        try:
+            import onnxruntime as ort
+        except ImportError as e:
+            raise ImportError("INFERENCE_BACKEND=onnx needs onnxruntime: pip install -r requirements-onnx.txt") from e
+
+        options = ort.SessionOptions()
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        self.session = ort.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+        self._input_name = self.session.get_inputs()[0].name
+
+    def predict_on_batch(self, batch: np.ndarray) -> np.ndarray:
+        return self.session.run(None, {self._input_name: batch})[0]
+
+
+def _make_interpreter(**kwargs):
+    """The standalone LiteRT/tflite-runtime interpreter if installed, else the one bundled with TensorFlow."""
+    try:
+        from ai_edge_litert.interpreter import Interpreter as _Interpreter
+    except ImportError:
+        try:
+            from tflite_runtime.interpreter import Interpreter as _Interpreter
+        except ImportError:
+            import tensorflow as tf
+            _Interpreter = tf.lite.Interpreter
+    return _Interpreter(**kwargs)
+
+
+def _int_range(dtype) -> tuple[int, int]:
+    info = np.iinfo(dtype)
+    return info.min, info.max
+
+
+def load_backend(
+    name: str,
+    *,
+    build_fn: Callable[[], object],
+    keras_path: str,
+    tflite_path: str,
+    onnx_path: str,
+    num_threads: int | None = None,
+):
+    """Constructs the backend selected by `name` (one of BACKENDS)."""
+    if name == "keras":
+        return KerasBackend(build_fn, keras_path)
+    if name == "tflite":
+        _require(tflite_path, "tflite")
+        return TFLiteBackend(tflite_path, num_threads)
+    if name == "onnx":
+        _require(onnx_path, "onnx")
+        return OnnxBackend(onnx_path, num_threads)
+    raise ValueError(f"Unknown inference backend {name!r}; expected one of {', '.join(BACKENDS)}")
+
+
+def _require(path: str, fmt: str) -> None:
+    if not os.path.exists(path):
+        raise FileNotFoundError(
+            f"{path} not found; create it with `python -m tools.export_pest_model --format {fmt}`"
+        )
@@ -0,0 +1,254 @@
+# core/prefetch.py
+"""
+Proactive refresh of popular tool replies. core/router records every weather and
+market price question in `demand`. A background Prefetcher then keeps the most
+asked-for replies fresh in their caches and pre-translated, so the first farmer to
+ask after an entry would have expired is still answered from memory.
+"""
+import asyncio
+import logging
+import threading
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable
+
+from core.cache import TTLCache
+from core.config import settings
+from core.http_client import GEMINI, Upstream
+from utils.translation import is_translated, translate_async
+
+logger = logging.getLogger(__name__)
+
+
+class DemandTracker:
+    """
+    How often each (kind, key) is asked for, as a count that halves every `half_life`
+    seconds, plus the same decayed count per asker language and the fetch arguments
+    of the latest request (the names as the farmer wrote them, which the normalized
+    key has lost). At most `max_keys` keys are tracked; the least asked-for are dropped first.
+    """
+
+    def __init__(self, half_life: float, max_keys: int):
+        self.half_life = half_life
+        self.max_keys = max_keys
+        # (kind, key) -> [score, updated_at, {lang_code: score}, fetch args]
+        self._entries: dict[tuple[str, str], list] = {}
+        self._lock = threading.Lock()
+
+    def _decay(self, entry: list, now: float) -> None:
+        factor = 0.5 ** ((now - entry[1]) / self.half_life)
+        entry[0] *= factor
+        entry[1] = now
+        for lang in entry[2]:
+            entry[2][lang] *= factor
+
+    def record(self, kind: str, key: str, lang_code: str | None = None, args: tuple = ()) -> None:
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get((kind, key))
+            if entry is None:
+                if len(self._entries) >= self.max_keys:
+                    self._prune(now)
+                entry = self._entries[(kind, key)] = [0.0, now, {}, args]
+            self._decay(entry, now)
+            entry[0] += 1
+            entry[3] = args
+            if lang_code:
+                entry[2][lang_code] = entry[2].get(lang_code, 0.0) + 1
+
+    def _prune(self, now: float) -> None:
+        """Drops the least asked-for tenth of the keys."""
+        for entry in self._entries.values():
+            self._decay(entry, now)
+        ranked = sorted(self._entries, key=lambda k: self._entries[k][0])
+        for k in ranked[:max(1, len(ranked) // 10)]:
+            del self._entries[k]
+
+    def top(
+        self, kind: str, n: int, min_score: float = 0.0, min_lang_share: float = 0.0
+    ) -> list[tuple[str, float, list[str], tuple]]:
+        """
+        The `n` most asked-for keys of `kind` scoring at least `min_score`, as (key, score,
+        languages used by at least `min_lang_share` of its askers, fetch args), most asked first.
+        """
+        now = time.time()
+        with self._lock:
+            entries = [(k, e) for (kd, k), e in self._entries.items() if kd == kind]
+            for _, entry in entries:
+                self._decay(entry, now)
+            entries.sort(key=lambda item: item[1][0], reverse=True)
+            result = []
+            for key, (score, _, langs, args) in entries[:n]:
+                if score < min_score:
+                    break
+                total = sum(langs.values())
+                common = sorted((l for l, s in langs.items() if s >= min_lang_share * total), key=langs.get, reverse=True)
+                result.append((key, score, common, args))
+            return result
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class RefreshBudget:
+    """Allows at most `calls_per_hour` calls in any rolling hour (0 allows none)."""
+
+    WINDOW = 3600.0
+
+    def __init__(self, calls_per_hour: int):
+        self.calls_per_hour = calls_per_hour
+        self._calls: deque[float] = deque()
+
+    def remaining(self) -> int:
+        cutoff = time.monotonic() - self.WINDOW
+        while self._calls and self._calls[0] <= cutoff:
+            self._calls.popleft()
+        return max(0, self.calls_per_hour - len(self._calls))
+
+    def try_spend(self) -> bool:
+        if self.remaining() == 0:
+            return False
+        self._calls.append(time.monotonic())
+        return True
+
+
+class Refresher:
+    """How to refresh one kind of reply: the cache it lives in, how to fetch it, and the upstream that costs."""
+
+    def __init__(self, cache: TTLCache, fetch: Callable[..., Awaitable[Any]], upstream: Upstream):
+        self.cache = cache
+        self.fetch = fetch
+        self.upstream = upstream
+
+
+class Prefetcher:
+    """
+    Background task that, every `interval` seconds, walks the `top_n` most asked-for
+    keys of each registered kind, most popular first. A key whose cached reply is
+    missing or would expire before the next pass is refreshed. Its reply is then
+    pre-translated into the askers' common languages.
+
+    Every upstream call is charged to that upstream's RefreshBudget, including
+    translations, which go to Gemini. Once a budget is spent, the remaining keys
+    wait for a later pass. An upstream whose circuit breaker is not closed is
+    skipped. Keys are refreshed one at a time, so prefetching never competes
+    with farmers' own requests for more than one connection per upstream.
+    """
+
+    def __init__(
+        self,
+        tracker: DemandTracker,
+        interval: float,
+        top_n: int,
+        budgets: dict[str, int],
+        min_score: float = 0.0,
+        min_lang_share: float = 0.0,
+    ):
+        self.tracker = tracker
+        self.interval = interval
+        self.top_n = top_n
+        self.min_score = min_score
+        self.min_lang_share = min_lang_share
+        self.budgets = {name: RefreshBudget(calls) for name, calls in budgets.items()}
+        self.refreshers: dict[str, Refresher] = {}
+        # (kind, key) -> when its last refresh failed; not retried until its cache TTL has passed
+        self._failed: dict[tuple[str, str], float] = {}
+        self._task: asyncio.Task | None = None
+        self.stats = {"passes": 0, "refreshed": 0, "fresh": 0, "translated": 0, "failed": 0, "over_budget": 0}
+
+    def register(self, cache: TTLCache, fetch: Callable[..., Awaitable[Any]], upstream: Upstream) -> None:
+        """
+        Keeps the popular keys of `cache` fresh with `fetch(*args)`, called with the args
+        last recorded for the key; demand is recorded under the cache's name.
+        """
+        self.refreshers[cache.name] = Refresher(cache, fetch, upstream)
+
+    def _spend(self, upstream: Upstream) -> bool:
+        budget = self.budgets.get(upstream.name)
+        if budget is None or not budget.try_spend():
+            self.stats["over_budget"] += 1
+            return False
+        return True
+
+    def start(self) -> None:
+        if self._task is None and self.top_n > 0:
+            self._task = asyncio.create_task(self._run(), name="prefetch")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Prefetch pass failed")
+            await asyncio.sleep(self.interval)
+
+    async def run_once(self) -> None:
+        """One pass over the popular keys of every registered kind."""
+        self._prune_failed(time.time())
+        for kind, refresher in self.refreshers.items():
+            for key, _, langs, args in self.tracker.top(kind, self.top_n, self.min_score, self.min_lang_share):
+                if refresher.upstream.breaker.state != refresher.upstream.breaker.CLOSED:
+                    break
+                await self._prefetch(kind, key, langs, args, refresher)
+        self.stats["passes"] += 1
+
+    def _prune_failed(self, now: float) -> None:
+        """
+        Forgets failures whose TTL has passed; they no longer hold their key back. Every
+        failure costs a budgeted call, so at most one TTL's worth of calls stays recorded.
+        """
+        for (kind, key), failed_at in list(self._failed.items()):
+            refresher = self.refreshers.get(kind)
+            if refresher is None or now >= failed_at + refresher.cache.ttl:
+                del self._failed[(kind, key)]
+
+    async def _prefetch(self, kind: str, key: str, langs: list[str], args: tuple, refresher: Refresher) -> None:
+        cache = refresher.cache
+        now = time.time()
+        entry = await cache.peek_async(key)
+        # Refreshed while it would still be fresh at the end of the next pass.
+        if entry is not None and entry[0] > now + 2 * self.interval:
+            value = entry[1]
+            self.stats["fresh"] += 1
+        else:
+            failed_at = self._failed.get((kind, key))
+            if failed_at is not None and now < failed_at + cache.ttl:
+                return
+            if not self._spend(refresher.upstream):
+                return
+            try:
+                value = await cache.refresh(key, lambda: refresher.fetch(*args))
+            except Exception as e:
+                logger.info("Prefetch of %s %r failed: %r", kind, key, e)
+                self._failed[(kind, key)] = now
+                self.stats["failed"] += 1
+                return
+            self._failed.pop((kind, key), None)
+            self.stats["refreshed"] += 1
+
+        for lang_code in langs:
+            if await is_translated(value, lang_code):
+                continue
+            if not self._spend(GEMINI):
+                return
+            await translate_async(value, lang_code)
+            self.stats["translated"] += 1
+
+    def snapshot(self) -> dict:
+        remaining = {f"budget_{name}": budget.remaining() for name, budget in self.budgets.items()}
+        return {"tracked": len(self.tracker), **self.stats, **remaining}
+
+
+demand = DemandTracker(settings.PREFETCH_HALF_LIFE, settings.PREFETCH_TRACKED_KEYS)
+prefetcher = Prefetcher(
+    demand, settings.PREFETCH_INTERVAL, settings.PREFETCH_TOP_N, settings.PREFETCH_BUDGETS,
+    settings.PREFETCH_MIN_SCORE, settings.PREFETCH_MIN_LANG_SHARE,
+)
@@ -0,0 +1,187 @@
+# core/resilience.py
+"""
+Resilience for upstream calls (OpenWeatherMap, Gemini, Twilio): an overall
+timeout, a per-upstream circuit breaker and optional hedged requests.
+
+Every upstream (core/http_client.Upstream) carries a CircuitBreaker and a window
+of recent latencies. `call(upstream, attempt)` runs `attempt()` under the
+upstream's concurrency limit and timeout. While the circuit is open it fails
+fast with CircuitOpenError, so callers go straight to their cached or templated
+fallback instead of queueing behind a dead service.
+"""
+import asyncio
+import math
+import threading
+import time
+from collections import deque
+from typing import Awaitable, Callable, TypeVar
+
+import httpx
+
+T = TypeVar("T")
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling an upstream whose circuit is open."""
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive failures; after `reset_timeout`
+    seconds one probe call is let through, and its outcome closes the circuit or
+    opens it again. A threshold of 0 disables the breaker.
+    """
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+        self.stats = {"opened": 0, "rejected": 0}
+
+    def allow(self) -> bool:
+        if self.state == self.CLOSED:
+            return True
+        with self._lock:
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state, self._probing = self.HALF_OPEN, False
+            if self.state == self.HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+            if self.state == self.CLOSED:
+                return True
+        self.stats["rejected"] += 1
+        return False
+
+    def record_success(self) -> None:
+        if self.state == self.CLOSED and not self.failures:
+            return
+        with self._lock:
+            self.state, self.failures, self._probing = self.CLOSED, 0, False
+
+    def release(self) -> None:
+        """Gives back a half-open probe slot whose call was abandoned without an outcome."""
+        with self._lock:
+            self._probing = False
+
+    def record_failure(self) -> None:
+        if not self.failure_threshold:
+            return
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or (self.state == self.CLOSED and self.failures >= self.failure_threshold):
+                self.state, self.opened_at, self._probing = self.OPEN, time.monotonic(), False
+                self.stats["opened"] += 1
+
+
+class LatencyWindow:
+    """The last `size` latencies of successful calls, with a cached percentile."""
+
+    def __init__(self, size: int = 256, min_samples: int = 20):
+        self.min_samples = min_samples
+        self._samples: deque[float] = deque(maxlen=size)
+        self._cache: dict[float, float] = {}
+        self._since_sort = 0
+
+    def add(self, seconds: float) -> None:
+        self._samples.append(seconds)
+        self._since_sort += 1
+        # Re-sorting on every sample is wasted work; percentiles move slowly.
+        if self._since_sort >= 16:
+            self._cache.clear()
+            self._since_sort = 0
+
+    def percentile(self, pct: float) -> float | None:
+        """Nearest-rank percentile, or None until `min_samples` calls have been seen."""
+        if len(self._samples) < self.min_samples:
+            return None
+        value = self._cache.get(pct)
+        if value is None:
+            ordered = sorted(self._samples)
+            k = max(0, min(len(ordered) - 1, math.ceil(pct / 100.0 * len(ordered)) - 1))
+            value = self._cache[pct] = ordered[k]
+        return value
+
+
+def is_failure(e: BaseException) -> bool:
+    """Whether an error says the upstream is unhealthy (a 4xx answer such as "city not found" does not)."""
+    if isinstance(e, httpx.HTTPStatusError):
+        return e.response.status_code >= 500 or e.response.status_code == 429
+    return isinstance(e, Exception)
+
+
+async def _hedged(attempt: Callable[[], Awaitable[T]], delay: float, stats: dict) -> T:
+    """
+    Runs `attempt()`; if it has not finished after `delay` seconds, starts a second
+    identical attempt and returns whichever succeeds first.
+    """
+    tasks = [asyncio.ensure_future(attempt())]
+    try:
+        done, _ = await asyncio.wait(tasks, timeout=delay)
+        if done:
+            return tasks[0].result()
+        stats["hedged"] += 1
+        tasks.append(asyncio.ensure_future(attempt()))
+        pending = set(tasks)
+        error: BaseException | None = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    if task is tasks[1]:
+                        stats["hedge_wins"] += 1
+                    return task.result()
+                error = task.exception()
+        raise error
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+async def call(upstream, attempt: Callable[[], Awaitable[T]], hedge: bool = False) -> T:
+    """
+    Runs `attempt()` against `upstream` with its concurrency limit, overall timeout
+    and circuit breaker. With `hedge` (idempotent calls only) and a hedge percentile
+    configured, a slow attempt is raced against a second one.
+    Raises CircuitOpenError without calling while the circuit is open.
+    """
+    breaker: CircuitBreaker = upstream.breaker
+    if not breaker.allow():
+        raise CircuitOpenError(f"{upstream.name} circuit is open")
+
+    async def limited() -> T:
+        async with upstream.limit():
+            started = time.perf_counter()
+            result = await attempt()
+            upstream.latency.add(time.perf_counter() - started)
+            return result
+
+    delay = upstream.latency.percentile(upstream.hedge_percentile) if hedge and upstream.hedge_percentile else None
+    upstream.stats["calls"] += 1
+    try:
+        if delay is None:
+            result = await asyncio.wait_for(limited(), upstream.timeout)
+        else:
+            result = await asyncio.wait_for(_hedged(limited, delay, upstream.stats), upstream.timeout)
+    except asyncio.CancelledError:
+        # Cancelled by the caller (e.g. a tool timeout): says nothing about the upstream.
+        breaker.release()
+        raise
+    except Exception as e:
+        if isinstance(e, asyncio.TimeoutError):
+            upstream.stats["timeouts"] += 1
+        if is_failure(e):
+            upstream.stats["failures"] += 1
+            breaker.record_failure()
+        else:
+            breaker.record_success()
+        raise
+    breaker.record_success()
+    return result
+
@@ -1,14 +1,188 @@
 # core/router.py
+import asyncio
+import json
+import logging
+import time
 
 from agents import market_price_agent, weather_agent
+from core.cache import create_cache
+from core.config import settings
+from core.http_client import GEMINI, WEATHER, run_sync
+from core.metrics import ERRORS, TOOL_SECONDS
+from core.prefetch import demand, prefetcher
+from utils.normalize import normalize_city, normalize_commodity
+from utils.templates import TextCodec, register_static_text
+
+logger = logging.getLogger(__name__)
 
 # This file is now a simple collection of tools that can be called.
 # The routing logic has been moved to the AI prompt.
 
+# Responses are cached per normalized (alias-resolved, case-folded) key so that
+# "Indore", "indore" and "INDORE" share one upstream call. Errors are never cached.
+# Expired entries stay around as last-known-good replies for upstream outages.
+weather_cache = create_cache(
+    "weather", settings.WEATHER_CACHE_TTL, settings.WEATHER_CACHE_SIZE,
+    backend=settings.CACHE_BACKEND, sqlite_path=settings.CACHE_SQLITE_PATH, codec=TextCodec,
+    stale_while_revalidate=settings.WEATHER_STALE_WHILE_REVALIDATE,
+    stale_if_error=settings.WEATHER_STALE_IF_ERROR,
+)
+market_price_cache = create_cache(
+    "market_price", settings.MARKET_CACHE_TTL, settings.MARKET_CACHE_SIZE,
+    backend=settings.CACHE_BACKEND, sqlite_path=settings.CACHE_SQLITE_PATH,
+    stale_while_revalidate=settings.MARKET_STALE_WHILE_REVALIDATE,
+    stale_if_error=settings.MARKET_STALE_IF_ERROR,
+)
+
+STALE_WEATHER_NOTE = "⚠️ Live weather is unavailable right now. This is the latest report we have:"
+STALE_PRICE_NOTE = "⚠️ Live prices are unavailable right now. This is the latest price we have:"
+register_static_text(STALE_WEATHER_NOTE, STALE_PRICE_NOTE)
+
+def _with_note(note: str):
+    return lambda reply: f"{note}\n\n{reply}"
+
+def _weather_key(location: str | None) -> str:
+    return normalize_city(location)
+
+def _display_name(text: str) -> str:
+    """The user's own spelling, tidied: what the upstream is asked for and the reply shows."""
+    return " ".join(text.split())
+
+def _price_key(commodity: str | None, location: str | None) -> str:
+    return f"{normalize_commodity(commodity)}|{normalize_city(location or 'Khargone')}"
+
+# Popular keys are refreshed ahead of expiry by core/prefetch.py, within its upstream budgets,
+# with the same fetch (and the latest asker's spelling) as the tools below.
+prefetcher.register(weather_cache, weather_agent.fetch_weather_report, WEATHER)
+prefetcher.register(market_price_cache, market_price_agent.fetch_market_price, GEMINI)
+
+async def get_market_price_async(query: str, location: str = 'Khargone') -> str:
+    """Tool to get market price."""
+    location = location or 'Khargone'
+    problem = market_price_agent.check_request(query)
+    if problem:
+        return problem
+
+    # Normalization only decides cache identity; the fetch uses the names the farmer used.
+    key = _price_key(query, location)
+    commodity, city = _display_name(query), _display_name(location)
+    try:
+        return await market_price_cache.get_or_fetch(
+            key, lambda: market_price_agent.fetch_market_price(commodity, city), on_stale=_with_note(STALE_PRICE_NOTE)
+        )
+    except Exception as e:
+        return market_price_agent.market_price_error_message(query, location, e)
+
+async def get_weather_forecast_async(location: str) -> str:
+    """Tool to get weather forecast."""
+    key = _weather_key(location)
+    if not key:
+        return await weather_agent.get_weather_forecast_async(location)
+    # "Prayagraj" and "prayagraj" share a cache entry, but OpenWeatherMap is asked for
+    # (and the report is headed with) the name the farmer used, not the alias target.
+    city = _display_name(location)
+    try:
+        return await weather_cache.get_or_fetch(
+            key, lambda: weather_agent.fetch_weather_report(city), on_stale=_with_note(STALE_WEATHER_NOTE)
+        )
+    except Exception as e:
+        return weather_agent.weather_error_message(location, e)
+
 def get_market_price(query: str, location: str = 'Khargone') -> str:
     """Tool to get market price."""
-    return market_price_agent.get_market_price(query, location)
+    return run_sync(get_market_price_async(query, location))
 
 def get_weather_forecast(location: str) -> str:
     """Tool to get weather forecast."""
-    return weather_agent.get_weather_forecast(location)
\ No newline at end of file
+    return run_sync(get_weather_forecast_async(location))
+
+
+# --- Dispatch of the tool calls parsed from a message ---
+PHOTO_PROMPT = "Okay, please send me a clear photo of the plant's leaf."
+UNKNOWN_TOOL_REPLY = "I'm not sure how to handle that yet. Can you try rephrasing?"
+TOOL_FAILED_REPLY = "Sorry, something went wrong while looking that up. Please try again."
+TIMEOUT_REPLIES = {
+    "get_weather_forecast": "Sorry, the weather service is taking too long right now. Please ask again in a minute.",
+    "get_market_price": "Sorry, the market price service is taking too long right now. Please ask again in a minute.",
+}
+register_static_text(PHOTO_PROMPT, UNKNOWN_TOOL_REPLY, TOOL_FAILED_REPLY, *TIMEOUT_REPLIES.values())
+
+async def _diagnose_plant_disease_async() -> str:
+    # The diagnosis itself needs a photo, which arrives as a separate message.
+    return PHOTO_PROMPT
+
+TOOLS = {
+    "get_weather_forecast": lambda params: get_weather_forecast_async(params.get("location")),
+    "get_market_price": lambda params: get_market_price_async(params.get("commodity"), params.get("location")),
+    "diagnose_plant_disease": lambda params: _diagnose_plant_disease_async(),
+}
+
+# The cache (by name), key and fetch arguments each tool call asks for, counted towards
+# what gets prefetched. An empty key is not counted.
+def _weather_demand(params: dict) -> tuple[str, str, tuple]:
+    location = params.get("location")
+    return "weather", _weather_key(location), (_display_name(location or ""),)
+
+def _price_demand(params: dict) -> tuple[str, str, tuple]:
+    commodity, location = params.get("commodity"), params.get("location") or 'Khargone'
+    if not commodity:
+        return "market_price", "", ()
+    return "market_price", _price_key(commodity, location), (_display_name(commodity), _display_name(location))
+
+DEMAND_KEYS = {
+    "get_weather_forecast": _weather_demand,
+    "get_market_price": _price_demand,
+}
+
+def tool_calls(action: dict) -> list[dict]:
+    """
+    The tool calls in a parsed action, from either its `call_tools` list or a single
+    `call_tool`. Repeated calls are dropped and at most MAX_TOOL_CALLS are kept.
+    """
+    calls = action.get("call_tools")
+    if not isinstance(calls, list):
+        calls = [action.get("call_tool")]
+    unique, seen = [], set()
+    for call in calls:
+        if not isinstance(call, dict):
+            continue
+        key = (call.get("tool_name"), json.dumps(call.get("parameters") or {}, sort_keys=True))
+        if key not in seen:
+            seen.add(key)
+            unique.append(call)
+    return unique[:settings.MAX_TOOL_CALLS]
+
+async def run_tool(tool_name: str, params: dict | None, lang_code: str | None = None) -> str:
+    """
+    Runs one tool call within its TOOL_TIMEOUTS budget; timeouts and failures become
+    reply text. The call (and the asker's `lang_code`) counts towards prefetch demand.
+    """
+    tool = TOOLS.get(tool_name)
+    if tool is None:
+        return UNKNOWN_TOOL_REPLY
+    if tool_name in DEMAND_KEYS:
+        kind, key, args = DEMAND_KEYS[tool_name](params or {})
+        if key:
+            demand.record(kind, key, lang_code, args)
+    started = time.perf_counter()
+    try:
+        return await asyncio.wait_for(tool(params or {}), settings.TOOL_TIMEOUTS.get(tool_name))
+    except asyncio.TimeoutError:
+        logger.warning("Tool %s timed out", tool_name)
+        ERRORS.inc("tool_timeout")
+        return TIMEOUT_REPLIES.get(tool_name, TOOL_FAILED_REPLY)
+    except Exception:
+        logger.exception("Tool %s failed", tool_name)
+        ERRORS.inc("tool")
+        return TOOL_FAILED_REPLY
+    finally:
+        TOOL_SECONDS.observe(time.perf_counter() - started, tool_name)
+
+async def run_tools(calls: list[dict]) -> list[str]:
+    """
+    Runs tool calls concurrently and returns their replies in call order, so a
+    multi-question message takes as long as its slowest tool, not the sum.
+    """
+    # The whole reply is translated into the first call's language (see api/webhook_router.py).
+    lang_code = calls[0].get("lang_code") if calls else None
+    return list(await asyncio.gather(*(run_tool(c.get("tool_name"), c.get("parameters"), lang_code) for c in calls)))
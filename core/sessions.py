@@ -0,0 +1,226 @@
+# core/sessions.py
+import json
+import logging
+import os
+import sqlite3
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+_NO_HISTORY: tuple = ()
+logger = logging.getLogger(__name__)
+
+
+class Session:
+    """
+    Per-user state: preferred reply language and the last few messages.
+    `history` is a tuple of (role, text) pairs, oldest first, role being "user" or "assistant".
+    """
+
+    __slots__ = ("user_id", "lang_code", "history", "updated_at")
+
+    def __init__(self, user_id: str, lang_code: str = "en", history: tuple = _NO_HISTORY, updated_at: float = 0.0):
+        self.user_id = user_id
+        self.lang_code = lang_code
+        self.history = history
+        self.updated_at = updated_at
+
+    def __repr__(self) -> str:
+        return f"Session({self.user_id!r}, lang_code={self.lang_code!r}, history={len(self.history)} messages)"
+
+
+class _SessionPolicy:
+    """Expiry and history rules shared by both stores."""
+
+    def __init__(self, ttl: float, max_size: int, history_messages: int, context_ttl: float, message_chars: int):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.history_messages = history_messages
+        self.context_ttl = context_ttl
+        self.message_chars = message_chars
+        self.stats = {"hits": 0, "misses": 0, "expired": 0, "evictions": 0, "writes": 0}
+
+    def _apply(self, session: Session, now: float, lang_code: str | None, messages: tuple) -> None:
+        if now - session.updated_at > self.context_ttl:
+            # A conversation idle this long is over; only the language preference carries on.
+            session.history = _NO_HISTORY
+        if lang_code:
+            session.lang_code = sys.intern(lang_code)
+        if messages and self.history_messages:
+            new = tuple((role, text[:self.message_chars]) for role, text in messages if text)
+            session.history = (session.history + new)[-self.history_messages:]
+        session.updated_at = now
+
+    def _fresh_history(self, session: Session, now: float) -> Session:
+        if session.history and now - session.updated_at > self.context_ttl:
+            session.history = _NO_HISTORY
+        return session
+
+
+class MemorySessionStore(_SessionPolicy):
+    """
+    In-process sessions: compact __slots__ records in an LRU ordered by last
+    activity, so expired sessions are always at the front and are dropped there
+    as new ones arrive. Not shared between worker processes.
+    """
+
+    def __init__(self, ttl: float, max_size: int, history_messages: int = 8,
+                 context_ttl: float = 7200, message_chars: int = 280):
+        super().__init__(ttl, max_size, history_messages, context_ttl, message_chars)
+        self._data: OrderedDict[str, Session] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id: str) -> Session | None:
+        now = time.time()
+        with self._lock:
+            session = self._data.get(user_id)
+            if session is None:
+                self.stats["misses"] += 1
+                return None
+            if now - session.updated_at > self.ttl:
+                del self._data[user_id]
+                self.stats["expired"] += 1
+                self.stats["misses"] += 1
+                return None
+            self.stats["hits"] += 1
+            return self._fresh_history(session, now)
+
+    def update(self, user_id: str, lang_code: str | None = None, messages: tuple = ()) -> Session:
+        """Records activity for `user_id`: an optional new language and (role, text) messages to append."""
+        now = time.time()
+        with self._lock:
+            session = self._data.get(user_id)
+            if session is None or now - session.updated_at > self.ttl:
+                session = self._data[user_id] = Session(sys.intern(user_id))
+            self._apply(session, now, lang_code, messages)
+            self._data.move_to_end(user_id)
+            self.stats["writes"] += 1
+            self._prune(now)
+        return session
+
+    def _prune(self, now: float) -> None:
+        while self._data:
+            oldest = next(iter(self._data.values()))
+            if now - oldest.updated_at > self.ttl:
+                self.stats["expired"] += 1
+            elif len(self._data) > self.max_size:
+                self.stats["evictions"] += 1
+            else:
+                break
+            self._data.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def snapshot(self) -> dict:
+        return {"backend": "memory", "size": len(self._data), **self.stats}
+
+
+class SQLiteSessionStore(_SessionPolicy):
+    """
+    Sessions in a SQLite database in WAL mode, so every worker process on the host
+    shares them and they survive restarts. Expired and over-cap rows are swept
+    every `sweep_every` writes rather than on each request. Calls can wait up to 5 s
+    for another process's write lock, so async code runs them in a thread.
+    """
+
+    def __init__(self, path: str, ttl: float, max_size: int, history_messages: int = 8,
+                 context_ttl: float = 7200, message_chars: int = 280, sweep_every: int = 500):
+        super().__init__(ttl, max_size, history_messages, context_ttl, message_chars)
+        self.sweep_every = sweep_every
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=5.0)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            " user_id TEXT PRIMARY KEY, lang_code TEXT NOT NULL, history TEXT NOT NULL, updated_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS sessions_updated_at ON sessions (updated_at)")
+        self._lock = threading.Lock()
+
+    def _load(self, user_id: str) -> Session | None:
+        row = self._conn.execute(
+            "SELECT lang_code, history, updated_at FROM sessions WHERE user_id = ?", (user_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        history = tuple(tuple(m) for m in json.loads(row[1])) if row[1] != "[]" else _NO_HISTORY
+        return Session(user_id, row[0], history, row[2])
+
+    def get(self, user_id: str) -> Session | None:
+        now = time.time()
+        with self._lock:
+            session = self._load(user_id)
+        if session is not None and now - session.updated_at > self.ttl:
+            self.stats["expired"] += 1
+            session = None
+        if session is None:
+            self.stats["misses"] += 1
+            return None
+        self.stats["hits"] += 1
+        return self._fresh_history(session, now)
+
+    def update(self, user_id: str, lang_code: str | None = None, messages: tuple = ()) -> Session:
+        """Records activity for `user_id`: an optional new language and (role, text) messages to append."""
+        now = time.time()
+        with self._lock:
+            # BEGIN IMMEDIATE takes the write lock up front, so two workers updating
+            # the same user cannot interleave their read-modify-write.
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                session = self._load(user_id)
+                if session is None or now - session.updated_at > self.ttl:
+                    session = Session(user_id)
+                self._apply(session, now, lang_code, messages)
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO sessions (user_id, lang_code, history, updated_at) VALUES (?, ?, ?, ?)",
+                    (user_id, session.lang_code, json.dumps(session.history, ensure_ascii=False), now),
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self.stats["writes"] += 1
+            if self.stats["writes"] % self.sweep_every == 0:
+                self._sweep(now)
+        return session
+
+    def _sweep(self, now: float) -> None:
+        self.stats["expired"] += self._conn.execute(
+            "DELETE FROM sessions WHERE updated_at < ?", (now - self.ttl,)
+        ).rowcount
+        self.stats["evictions"] += max(self._conn.execute(
+            "DELETE FROM sessions WHERE user_id IN ("
+            " SELECT user_id FROM sessions ORDER BY updated_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_size,),
+        ).rowcount, 0)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+
+    def snapshot(self) -> dict:
+        return {"backend": "sqlite", "size": len(self), **self.stats}
+
+
+def create_session_store(
+    backend: str,
+    ttl: float,
+    max_size: int,
+    sqlite_path: str | None = None,
+    history_messages: int = 8,
+    context_ttl: float = 7200,
+    message_chars: int = 280,
+) -> MemorySessionStore | SQLiteSessionStore:
+    """Builds the configured session store, falling back to memory if the database cannot be opened."""
+    options = dict(history_messages=history_messages, context_ttl=context_ttl, message_chars=message_chars)
+    if backend == "sqlite":
+        try:
+            return SQLiteSessionStore(sqlite_path, ttl, max_size, **options)
+        except (sqlite3.Error, OSError) as e:
+            logger.warning("Could not open session database %s, using in-memory sessions. Error: %s", sqlite_path, e)
+    elif backend != "memory":
+        raise ValueError(f"Unknown session backend: {backend!r}")
+    return MemorySessionStore(ttl, max_size, **options)
@@ -0,0 +1,26 @@
+# core/twilio_api.py
+from core.config import settings
+from core.http_client import TWILIO_API, get_client
+from core.resilience import call
+
+async def send_message(to: str, body: str, from_: str) -> str:
+    """
+    Sends a WhatsApp/SMS message through the Twilio Messages REST API and returns
+    its sid. Raises httpx.HTTPStatusError on a non-2xx response, and CircuitOpenError
+    while Twilio is failing (the job queue retries both with backoff).
+    """
+    url = f"{settings.TWILIO_API_URL}/2010-04-01/Accounts/{settings.TWILIO_ACCOUNT_SID}/Messages.json"
+
+    async def attempt():
+        response = await get_client().post(
+            url,
+            data={"To": to, "From": from_, "Body": body},
+            auth=(settings.TWILIO_ACCOUNT_SID, settings.TWILIO_AUTH_TOKEN),
+            timeout=TWILIO_API.timeout,
+        )
+        response.raise_for_status()
+        return response
+
+    # Never hedged: a second POST would send the message twice.
+    response = await call(TWILIO_API, attempt)
+    return response.json().get("sid", "")
@@ -0,0 +1,32 @@
+# gunicorn.conf.py
+# Production server settings. One worker by default (free tiers); to use more cores set
+# WEB_CONCURRENCY=N together with INFERENCE_MODE=sidecar, so the pest model is loaded once
+# in a sidecar process instead of once per worker.
+import os
+import subprocess
+import sys
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '7860')}"
+workers = int(os.environ.get("WEB_CONCURRENCY", "1"))
+worker_class = "uvicorn.workers.UvicornWorker"
+
+_sidecar = None
+
+def on_starting(server):
+    """
+    Starts the inference sidecar before any worker forks (sidecar mode only), under a
+    supervisor that restarts it if it dies; workers reconnect on their next photo.
+    """
+    global _sidecar
+    from core.config import settings
+
+    if settings.INFERENCE_MODE == "sidecar":
+        _sidecar = subprocess.Popen([sys.executable, "-m", "core.inference_server", "--supervise"])
+        server.log.info("Started inference sidecar supervisor (pid %s) on %s", _sidecar.pid, settings.INFERENCE_SOCKET)
+    elif workers > 1:
+        server.log.warning("%s workers in local inference mode: every worker loads its own model", workers)
+
+def on_exit(server):
+    if _sidecar is not None:
+        _sidecar.terminate()
+        _sidecar.wait(10)
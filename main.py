@@ -1,54 +1,165 @@
-import numpy as np
+import asyncio
+import logging
+from core.log import setup_logging
+
+setup_logging()
+
 from fastapi import FastAPI, Request
-from api import webhook_router
-from utils.ai_processor import handle_query_with_ai
-from agents.pest_detection_agent import model as pest_model
+from fastapi.responses import JSONResponse, Response
+from api import diagnose_router, webhook_router
+from agents.pest_detection_agent import pest_model
+from core import http_client, lazy, metrics
+from core.prefetch import prefetcher
+from core.cache import CACHES
+from core.config import settings
+from utils.translation import warm_translations
 from typing import Any
 
+logger = logging.getLogger(__name__)
+
 app = FastAPI(
     title="KrishiMitra AI Backend",
     description="Backend service for the KrishiMitra WhatsApp Chatbot.",
     version="2.1.0"
 )
 
-# --- Application Startup Event for Warm-Up ---
+# --- Application Startup: load heavy resources without blocking health checks ---
 @app.on_event("startup")
-def warmup_models():
+def load_resources():
     """
-    Runs when the application starts to initialize models and prevent 
-    cold-start timeouts on the first user request.
+    Starts loading the pest model and the Gemini client according to STARTUP_MODE.
+    In the default "background" mode the app answers "/" immediately and "/ready"
+    turns 200 once every required resource has loaded.
     """
-    print("🚀 Starting model warm-up...")
-    
-    # 1. Warm up the Gemini AI model
-    try:
-        print("   - Warming up Gemini AI...")
-        handle_query_with_ai("Hello")
-        print("   ✅ Gemini AI is warm.")
-    except Exception as e:
-        print(f"   ⚠️ Could not warm up Gemini AI: {e}")
+    mode = settings.STARTUP_MODE
+    logger.info("Pest model inference mode: %s", settings.INFERENCE_MODE)
+    if mode == "eager":
+        logger.info("Loading models before accepting traffic...")
+        lazy.load_all(background=False)
+        logger.info("Models loaded. Application is ready.")
+    elif mode == "background":
+        logger.info("Loading models in the background...")
+        lazy.load_all(background=True)
+    else:
+        logger.info("Models will load on first use.")
 
-    # 2. Warm up the Pest Detection (TensorFlow) model
-    try:
-        if pest_model:
-            print("   - Warming up Pest Detection model...")
-            dummy_image = np.zeros((1, 224, 224, 3), dtype=np.float32)
-            pest_model.predict(dummy_image, verbose=0)
-            print("   ✅ Pest Detection model is warm.")
-        else:
-            print("   ⚠️ Pest Detection model not found, skipping warm-up.")
-    except Exception as e:
-        print(f"   ⚠️ Could not warm up Pest Detection model: {e}")
-        
-    print("✅ Warm-up complete. Application is ready.")
+_background_tasks: set[asyncio.Task] = set()
+
+@app.on_event("startup")
+async def warm_translation_cache():
+    """Pre-translates static replies in the background so startup is not delayed."""
+    task = asyncio.create_task(warm_translations(settings.TRANSLATION_WARM_LANGS))
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+@app.on_event("startup")
+async def start_reply_workers():
+    """In REPLY_MODE=async, starts the workers that process queued messages and send replies."""
+    if webhook_router.reply_workers is not None:
+        webhook_router.reply_workers.start()
+        logger.info("Async reply mode: %d reply workers started.", settings.REPLY_WORKERS)
+
+@app.on_event("startup")
+async def start_prefetcher():
+    """Starts refreshing the most asked-for weather reports and prices ahead of expiry (PREFETCH_TOP_N=0 = off)."""
+    prefetcher.start()
+
+@app.on_event("shutdown")
+async def stop_prefetcher():
+    await prefetcher.stop()
+
+@app.on_event("shutdown")
+async def stop_reply_workers():
+    if webhook_router.reply_workers is not None:
+        await webhook_router.reply_workers.stop()
+
+@app.on_event("shutdown")
+async def close_http_client():
+    await http_client.close_client()
 
 # Include the main webhook router
 app.include_router(webhook_router.router, prefix="/twilio", tags=["Twilio Webhook"])
+app.include_router(diagnose_router.router, prefix="/diagnose", tags=["Batch Diagnosis"])
 
 @app.get("/", tags=["Health Check"])
 def read_root():
     return {"status": "ok", "message": "KrishiMitra Backend is running!"}
 
+@app.get("/ready", tags=["Health Check"])
+def read_ready():
+    """200 once every required model is loaded, 503 (with per-resource load state) until then."""
+    ready, resources = lazy.readiness()
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={
+            "status": "ready" if ready else "loading",
+            "inference_mode": settings.INFERENCE_MODE,
+            "resources": resources,
+        },
+    )
+
+# --- Metrics: pipeline timers (core/metrics.py) plus the stats components already keep ---
+def _component_metrics() -> list[metrics.Family]:
+    cache_events = metrics.Family("krishimitra_cache_events_total", "counter", "Cache lookups and evictions.", ("cache", "event"))
+    cache_entries = metrics.Family("krishimitra_cache_entries", "gauge", "Entries held in memory.", ("cache",))
+    for name, cache in CACHES.items():
+        for key, value in cache.snapshot().items():
+            if key == "size":
+                cache_entries.add(value, name)
+            elif isinstance(value, (int, float)):
+                cache_events.add(value, name, key)
+
+    session_events = metrics.Family("krishimitra_session_events_total", "counter", "Session store operations.", ("event",))
+    session_count = metrics.Family("krishimitra_sessions", "gauge", "Sessions currently stored.")
+    for key, value in webhook_router.sessions.snapshot().items():
+        if key == "size":
+            session_count.add(value)
+        elif isinstance(value, (int, float)):
+            session_events.add(value, key)
+
+    upstream_events = metrics.Family("krishimitra_upstream_events_total", "counter", "Upstream calls, failures, hedges and circuit breaker events.", ("upstream", "event"))
+    circuits = metrics.Family("krishimitra_upstream_circuit_open", "gauge", "1 while an upstream's circuit breaker is open or probing.", ("upstream",))
+    for name, upstream in http_client.UPSTREAMS.items():
+        for key, value in {**upstream.stats, **upstream.breaker.stats}.items():
+            upstream_events.add(value, name, key)
+        circuits.add(int(upstream.breaker.state != upstream.breaker.CLOSED), name)
+
+    resources = metrics.Family("krishimitra_resource_ready", "gauge", "1 once a lazily loaded resource is ready.", ("resource",))
+    for name, resource in lazy.RESOURCES.items():
+        resources.add(int(resource.ready), name)
+    families = [cache_events, cache_entries, session_events, session_count, upstream_events, circuits, resources]
+
+    prefetch_events = metrics.Family("krishimitra_prefetch_events_total", "counter", "Advisory prefetch passes, refreshes and translations.", ("event",))
+    prefetch_state = metrics.Family("krishimitra_prefetch", "gauge", "Keys tracked for prefetch and refresh budget left per upstream.", ("field",))
+    for key, value in prefetcher.snapshot().items():
+        (prefetch_state if key == "tracked" or key.startswith("budget_") else prefetch_events).add(value, key)
+    families += [prefetch_events, prefetch_state]
+
+    engine_stats = getattr(pest_model.value, "stats", None)
+    if engine_stats is not None:
+        engine = metrics.Family("krishimitra_inference_total", "counter", "Pest model micro-batching engine events.", ("event",))
+        for key, value in engine_stats.items():
+            engine.add(value, key)
+        families.append(engine)
+
+    queue = webhook_router.reply_queue
+    if queue is not None:
+        jobs = metrics.Family("krishimitra_reply_jobs", "gauge", "Reply jobs in the queue database by status.", ("status",))
+        for status, count in queue.counts().items():
+            jobs.add(count, status)
+        events = metrics.Family("krishimitra_reply_queue_events_total", "counter", "Reply queue events in this process.", ("event",))
+        for key, value in queue.stats.items():
+            events.add(value, key)
+        families += [jobs, events]
+    return families
+
+metrics.register_collector(_component_metrics)
+
+@app.get("/metrics", tags=["Health Check"])
+def read_metrics():
+    """Prometheus text format: per-stage latency histograms, counters and cache/session/queue stats."""
+    return Response(content=metrics.render(), media_type=metrics.CONTENT_TYPE)
+
 @app.post("/twilio/error")
 async def twilio_error_webhook(request: Request) -> dict[str, Any]:
     """
@@ -67,8 +178,7 @@ async def twilio_error_webhook(request: Request) -> dict[str, Any]:
             payload = dict(form)
     except Exception as e:
         raw = (await request.body())[:2000]
-        print("[TWILIO DEBUGGER RAW]", raw)
-        print("[TWILIO DEBUGGER PARSE ERROR]", e)
+        logger.warning("Twilio debugger payload could not be parsed (%s): %r", e, raw)
 
-    print("[TWILIO DEBUGGER PAYLOAD]", payload)
+    logger.warning("Twilio debugger event: %s", payload)
     return {"status": "received"}
\ No newline at end of file
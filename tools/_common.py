@@ -0,0 +1,33 @@
+# tools/_common.py
+"""Shared helpers for the offline model tools. Run them from the project root,
+e.g. `python -m tools.export_pest_model`."""
+import os
+
+import numpy as np
+
+from agents.batch_diagnosis import IMAGE_EXTENSIONS
+from agents.pest_detection_agent import CLASS_NAMES, IMG_SIZE
+from utils.image_pipeline import decode_image, to_model_input
+
+
+def find_images(path: str, limit: int | None = None) -> list[str]:
+    """Image files under `path` (recursively), in a stable order."""
+    found = []
+    for root, _, files in sorted(os.walk(path)):
+        found.extend(os.path.join(root, f) for f in sorted(files) if f.lower().endswith(IMAGE_EXTENSIONS))
+    return found[:limit] if limit else found
+
+
+def label_for(image_path: str) -> str | None:
+    """The class name of an image stored in a folder named after its class (dataset layout), else None."""
+    folder = os.path.basename(os.path.dirname(image_path))
+    return folder if folder in CLASS_NAMES else None
+
+
+def load_batch(image_paths: list[str]) -> np.ndarray:
+    """Decodes and preprocesses images exactly as the webhook does, into one float32 batch."""
+    batch = np.empty((len(image_paths), IMG_SIZE, IMG_SIZE, 3), dtype=np.float32)
+    for i, image_path in enumerate(image_paths):
+        with open(image_path, "rb") as f:
+            to_model_input(decode_image(f.read(), IMG_SIZE), out=batch[i:i + 1])
+    return batch
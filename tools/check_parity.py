@@ -0,0 +1,80 @@
+# tools/check_parity.py
+"""
+Accuracy parity between the Keras pest model and an exported backend over a
+folder of sample leaf photos. Reports top-1 agreement, probability drift and,
+when images sit in folders named after their class (the dataset layout),
+labelled accuracy for both. Exits non-zero if agreement is below --min-agreement,
+so it can gate a deploy.
+
+    python -m tools.check_parity --backend tflite --samples data/leaves
+"""
+import argparse
+import sys
+
+import numpy as np
+
+from agents.pest_detection_agent import CLASS_NAMES, HEALTHY_CLASSES, load_pest_backend
+from core.config import settings
+from tools._common import find_images, label_for, load_batch
+
+
+def predict_all(backend, batch: np.ndarray, batch_size: int) -> np.ndarray:
+    return np.concatenate([backend.predict_on_batch(batch[i:i + batch_size]) for i in range(0, len(batch), batch_size)])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backend", choices=("tflite", "onnx"), default="tflite")
+    parser.add_argument("--samples", required=True, help="folder of leaf photos")
+    parser.add_argument("--limit", type=int, default=500)
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--keras-model", default=settings.MODEL_PATH)
+    parser.add_argument("--model", help="exported artifact; defaults to TFLITE_MODEL_PATH / ONNX_MODEL_PATH")
+    parser.add_argument("--min-agreement", type=float, default=0.99)
+    args = parser.parse_args()
+
+    settings.MODEL_PATH = args.keras_model
+    if args.model:
+        setattr(settings, "TFLITE_MODEL_PATH" if args.backend == "tflite" else "ONNX_MODEL_PATH", args.model)
+
+    paths = find_images(args.samples, args.limit)
+    if not paths:
+        raise SystemExit(f"No images found under {args.samples}")
+    batch = load_batch(paths)
+
+    reference = predict_all(load_pest_backend("keras"), batch, args.batch_size)
+    candidate = predict_all(load_pest_backend(args.backend), batch, args.batch_size)
+
+    ref_top, cand_top = reference.argmax(axis=1), candidate.argmax(axis=1)
+    agreement = float(np.mean(ref_top == cand_top))
+    drift = np.abs(reference - candidate)
+    # A healthy/diseased flip is the disagreement a farmer would actually notice.
+    is_healthy = np.array([name in HEALTHY_CLASSES for name in CLASS_NAMES])
+    health_flips = int(np.sum(is_healthy[ref_top] != is_healthy[cand_top]))
+
+    rows = [
+        ("images", len(paths)),
+        ("top-1 agreement", f"{agreement:.2%}"),
+        ("healthy/disease flips", health_flips),
+        ("max |p diff|", f"{drift.max():.4f}"),
+        ("mean |p diff|", f"{drift.mean():.6f}"),
+        ("confidence diff p99", f"{np.percentile(np.abs(reference.max(axis=1) - candidate.max(axis=1)), 99):.4f}"),
+    ]
+    labels = [label_for(p) for p in paths]
+    labelled = [i for i, label in enumerate(labels) if label]
+    if labelled:
+        truth = np.array([CLASS_NAMES.index(labels[i]) for i in labelled])
+        rows.append(("labelled images", len(labelled)))
+        rows.append(("keras accuracy", f"{np.mean(ref_top[labelled] == truth):.2%}"))
+        rows.append((f"{args.backend} accuracy", f"{np.mean(cand_top[labelled] == truth):.2%}"))
+    for name, value in rows:
+        print(f"{name + ':':<24}{value}")
+
+    if agreement < args.min_agreement:
+        print(f"FAIL: agreement below {args.min_agreement:.2%}")
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+# tools/diagnose_batch.py
+"""
+Diagnoses a field survey in one go: every leaf photo in a folder, a zip archive
+or a file of URLs (one per line) goes through the pest model in batches, and one
+row per photo is written as JSONL or CSV: class, confidence, top-k probabilities
+and remedy. Throughput is reported on stderr.
+
+Photos below the confidence threshold are marked needs_review. With
+--vision-review they are also sent to Gemini Vision while the batch carries on,
+and its replies are appended as extra rows (name, vision_reply) at the end.
+
+    python -m tools.diagnose_batch survey/ --out results.csv
+    python -m tools.diagnose_batch survey.zip --format jsonl --top-k 5 --vision-review
+    python -m tools.diagnose_batch --urls photos.txt --out results.jsonl
+"""
+import argparse
+import concurrent.futures
+import csv
+import json
+import os
+import sys
+import zipfile
+
+from agents.batch_diagnosis import (
+    CSV_FIELDS, BatchStats, csv_record, diagnose_images, from_directory, from_urls, from_zip, jsonl_line,
+    start_vision_review,
+)
+from agents.pest_detection_agent import load_pest_backend
+from core.config import settings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("source", nargs="?", help="folder of photos or a .zip archive")
+    parser.add_argument("--urls", help="text file with one image URL per line")
+    parser.add_argument("--out", help="output file; the format follows a .csv/.jsonl extension (default: stdout)")
+    parser.add_argument("--format", choices=("jsonl", "csv"))
+    parser.add_argument("--backend", choices=("keras", "tflite", "onnx"), default=settings.INFERENCE_BACKEND)
+    parser.add_argument("--batch-size", type=int, default=settings.BATCH_SIZE)
+    parser.add_argument("--workers", type=int, default=settings.BATCH_WORKERS, help="decode threads")
+    parser.add_argument("--top-k", type=int, default=3)
+    parser.add_argument("--vision-review", action="store_true", help="send low-confidence photos to Gemini Vision")
+    args = parser.parse_args()
+
+    if bool(args.source) == bool(args.urls):
+        parser.error("give either a folder/zip source or --urls")
+    fmt = args.format or ("csv" if args.out and args.out.endswith(".csv") else "jsonl")
+
+    archive = None
+    if args.urls:
+        with open(args.urls) as f:
+            items = from_urls([line.strip() for line in f if line.strip() and not line.startswith("#")])
+    elif os.path.isdir(args.source):
+        items = from_directory(args.source)
+    elif zipfile.is_zipfile(args.source):
+        archive = zipfile.ZipFile(args.source)
+        items = from_zip(archive)
+    else:
+        parser.error(f"{args.source} is neither a folder nor a zip archive")
+
+    backend = load_pest_backend(args.backend)
+    out = open(args.out, "w", newline="", encoding="utf-8") if args.out else sys.stdout
+    writer = csv.writer(out) if fmt == "csv" else None
+    write = (lambda row: writer.writerow(csv_record(row))) if writer else (lambda row: out.write(jsonl_line(row)))
+    if writer:
+        writer.writerow(CSV_FIELDS)
+
+    stats = BatchStats()
+    reviews: list[concurrent.futures.Future] = []
+    try:
+        for item, result in diagnose_images(items, backend.predict_on_batch, args.batch_size, args.workers, args.top_k, stats):
+            write(result)
+            if args.vision_review and result["needs_review"]:
+                reviews.append(start_vision_review(item))
+            if stats.images % 500 == 0:
+                print(f"... {stats.images} photos", file=sys.stderr)
+        for future in concurrent.futures.as_completed(reviews):
+            write(future.result())
+    finally:
+        if out is not sys.stdout:
+            out.close()
+        if archive is not None:
+            archive.close()
+
+    summary = stats.summary()
+    summary["vision_reviews"] = len(reviews)
+    print(json.dumps(summary), file=sys.stderr)
+    if stats.errors:
+        print(f"{stats.errors} photos could not be diagnosed; see the error column", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+# tools/export_pest_model.py
+"""
+Converts the Keras pest model into a lean inference artifact for the "tflite" or
+"onnx" INFERENCE_BACKEND.
+
+Quantization modes:
+  none     float32 weights and activations
+  float16  float16 weights (TFLite only); halves the file, same accuracy
+  dynamic  int8 weights, float activations; no calibration data needed
+  int8     int8 weights and activations, calibrated on sample leaf photos
+           (--calibration-dir, any folder of images, e.g. the training set)
+
+Inputs and outputs stay float32 in every mode, so the app's preprocessing is
+unchanged. ONNX export and the onnx backend need `pip install -r requirements-onnx.txt`. Check the result with `python -m tools.check_parity` before deploying.
+
+    python -m tools.export_pest_model --format tflite --quantize int8 --calibration-dir data/leaves
+"""
+import argparse
+import os
+import tempfile
+
+import numpy as np
+
+from core.config import settings
+from tools._common import find_images, load_batch
+
+QUANTIZE_MODES = ("none", "float16", "dynamic", "int8")
+
+
+def load_keras_model(path: str):
+    from agents.pest_detection_agent import CLASS_NAMES, create_model_architecture
+
+    model = create_model_architecture(num_classes=len(CLASS_NAMES))
+    model.load_weights(path)
+    return model
+
+
+def calibration_samples(calibration_dir: str | None, limit: int) -> np.ndarray:
+    if not calibration_dir:
+        raise SystemExit("--quantize int8 needs --calibration-dir with sample leaf photos")
+    paths = find_images(calibration_dir, limit)
+    if not paths:
+        raise SystemExit(f"No images found under {calibration_dir}")
+    print(f"Calibrating on {len(paths)} images from {calibration_dir}")
+    return load_batch(paths)
+
+
+def export_tflite(model, output: str, quantize: str, samples: np.ndarray | None) -> None:
+    import tensorflow as tf
+
+    with tempfile.TemporaryDirectory() as saved_model_dir:
+        # Going through a SavedModel keeps a dynamic batch dimension in the flatbuffer.
+        model.export(saved_model_dir, format="tf_saved_model", verbose=False)
+        converter = tf.lite.TFLiteConverter.from_saved_model(saved_model_dir)
+        if quantize != "none":
+            converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        if quantize == "float16":
+            converter.target_spec.supported_types = [tf.float16]
+        elif quantize == "int8":
+            converter.representative_dataset = lambda: ([sample[None]] for sample in samples)
+            converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+        flatbuffer = converter.convert()
+
+    with open(output, "wb") as f:
+        f.write(flatbuffer)
+
+
+class _CalibrationReader:
+    """onnxruntime CalibrationDataReader over the sample batch."""
+
+    def __init__(self, input_name: str, samples: np.ndarray):
+        self._feeds = iter({input_name: sample[None]} for sample in samples)
+
+    def get_next(self):
+        return next(self._feeds, None)
+
+
+def export_onnx(model, output: str, quantize: str, samples: np.ndarray | None) -> None:
+    if quantize == "float16":
+        raise SystemExit("float16 quantization is only supported for --format tflite")
+    if quantize == "none":
+        model.export(output, format="onnx", verbose=False)
+        return
+
+    import onnxruntime as ort
+    from onnxruntime.quantization import QuantType, quantize_dynamic, quantize_static
+
+    with tempfile.TemporaryDirectory() as tmp:
+        float_path = os.path.join(tmp, "model.onnx")
+        model.export(float_path, format="onnx", verbose=False)
+        if quantize == "dynamic":
+            quantize_dynamic(float_path, output, weight_type=QuantType.QInt8)
+        else:
+            input_name = ort.InferenceSession(float_path, providers=["CPUExecutionProvider"]).get_inputs()[0].name
+            quantize_static(float_path, output, _CalibrationReader(input_name, samples),
+                            activation_type=QuantType.QInt8, weight_type=QuantType.QInt8)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--format", choices=("tflite", "onnx"), default="tflite")
+    parser.add_argument("--quantize", choices=QUANTIZE_MODES, default="dynamic")
+    parser.add_argument("--keras-model", default=settings.MODEL_PATH)
+    parser.add_argument("--output", help="defaults to TFLITE_MODEL_PATH / ONNX_MODEL_PATH")
+    parser.add_argument("--calibration-dir")
+    parser.add_argument("--calibration-samples", type=int, default=200)
+    args = parser.parse_args()
+
+    output = args.output or (settings.TFLITE_MODEL_PATH if args.format == "tflite" else settings.ONNX_MODEL_PATH)
+    samples = calibration_samples(args.calibration_dir, args.calibration_samples) if args.quantize == "int8" else None
+
+    model = load_keras_model(args.keras_model)
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    if args.format == "tflite":
+        export_tflite(model, output, args.quantize, samples)
+    else:
+        export_onnx(model, output, args.quantize, samples)
+
+    size_mb = os.path.getsize(output) / 1e6
+    keras_mb = os.path.getsize(args.keras_model) / 1e6
+    print(f"Wrote {output} ({args.format}, {args.quantize}): {size_mb:.1f} MB (Keras file: {keras_mb:.1f} MB)")
+
+
+if __name__ == "__main__":
+    main()
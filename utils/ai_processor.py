@@ -1,70 +1,143 @@
-import google.generativeai as genai
+import hashlib
 import json
+import logging
+from core.cache import create_cache
 from core.config import settings
+from core.gemini import INTENT_MODEL, TEXT_MODEL, configure_model, get_model_async
+from core.http_client import GEMINI, run_blocking, run_sync
+from core.metrics import ERRORS, STAGE_SECONDS
+from utils.intent_router import classify_intent
+from utils.translation import translate_all_async, translate_async
 
-try:
-    genai.configure(api_key=settings.GEMINI_API_KEY)
-    model = genai.GenerativeModel('gemini-flash-latest')
-    print("✅ Gemini AI model configured successfully using 'gemini-flash-latest'.")
-except Exception as e:
-    model = None
-    print(f"CRITICAL ERROR: Failed to configure Gemini AI. Check your API key. Error: {e}")
+logger = logging.getLogger(__name__)
 
-def handle_query_with_ai(user_query: str) -> dict:
-    if not model:
-        return {"final_response": "AI model is not available. Please check the server configuration."}
+# --- Intent parsing with Gemini ---
+# The instructions travel as the model's system instruction, built once, and the output
+# is constrained to INTENT_SCHEMA, so each call only carries the farmer's message.
+INTENT_INSTRUCTION = """You are KrishiMitra, a friendly assistant ("mitra") for Indian farmers. Reply with JSON only.
+Tools:
+- get_weather_forecast: weather questions. parameters: location (city name).
+- get_market_price: crop market prices ("mandi bhav"). parameters: commodity (e.g. "Soyabean", "Gehu"), optional location.
+- diagnose_plant_disease: sick plants, pests or spotted leaves, or the farmer wants to send a photo.
+If tools are needed, return "call_tools" with one entry per question asked, each with tool_name, parameters and lang_code (ISO 639-1 code of the farmer's language, e.g. hi, en, mr).
+For greetings, thanks or anything else, return "final_response": a complete, warm reply in the farmer's own language.
+Use the recent conversation, when given, only to resolve follow-up questions."""
+
+INTENT_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "call_tools": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "tool_name": {
+                        "type": "string",
+                        "enum": ["get_weather_forecast", "get_market_price", "diagnose_plant_disease"],
+                    },
+                    "parameters": {
+                        "type": "object",
+                        "properties": {"location": {"type": "string"}, "commodity": {"type": "string"}},
+                    },
+                    "lang_code": {"type": "string"},
+                },
+                "required": ["tool_name", "parameters", "lang_code"],
+            },
+        },
+        "final_response": {"type": "string"},
+    },
+}
 
-    # MODIFIED META PROMPT
-    meta_prompt = f"""
-    You are KrishiMitra, a friendly and helpful AI assistant for farmers.
-    Your primary goal is to understand a farmer's query in their native language and provide an appropriate action or response.
-    Adopt a conversational and encouraging tone, like a knowledgeable friend ("mitra").
-    Analyze the user's query and the language it is in.
+SAFETY_SETTINGS = [
+    {"category": "HARM_CATEGORY_HARASSMENT", "threshold": "BLOCK_NONE"},
+    {"category": "HARM_CATEGORY_HATE_SPEECH", "threshold": "BLOCK_NONE"},
+]
 
-    Your tools:
-    1. `get_weather_forecast`: For weather-related queries. Requires a `location` (city name).
-    2. `get_market_price`: For crop market prices ("mandi bhav"). Requires a `commodity` (e.g., "Soyabean", "Gehu") and an optional `location`.
-    3. `diagnose_plant_disease`: If the user mentions a sick plant, pests, leaves with spots, etc., and wants to send a photo.
-    4. `general_greeting_or_chat`: For simple greetings, thanks, or general questions that don't fit other tools.
+configure_model(
+    INTENT_MODEL, TEXT_MODEL,
+    system_instruction=INTENT_INSTRUCTION,
+    generation_config={"response_mime_type": "application/json", "response_schema": INTENT_SCHEMA},
+)
 
-    Analyze the query below and respond with a JSON object ONLY. The JSON object must have one of two main keys:
+# Short-lived results keyed by normalised message + history; concurrent misses share one call.
+intent_cache = create_cache("intent", settings.INTENT_COALESCE_WINDOW, settings.INTENT_COALESCE_SIZE)
 
-    A) "call_tool": If a specific tool is needed. The value MUST be an object containing:
-       - "tool_name": One of the tool names from the list above.
-       - "parameters": An object with the required parameters extracted from the query (e.g., {{"location": "Indore", "commodity": "Wheat"}}).
-       - "lang_code": The two-letter ISO 639-1 code of the user's language (e.g., "hi" for Hindi, "en" for English, "mr" for Marathi).
+PARSE_FAILED_REPLY = "I'm sorry, I had trouble understanding that. Can you please rephrase?"
 
-    B) "final_response": Use this for `general_greeting_or_chat`. The value MUST be a complete, ready-to-send response.
-       **IMPORTANT**: This final response MUST be in the user's original language, as identified by the `lang_code`.
+def _format_history(history: tuple) -> str:
+    """Recent messages as prompt lines, so follow-ups like "and tomorrow?" can be resolved."""
+    if not history:
+        return ""
+    lines = "\n".join(f'{"Farmer" if role == "user" else "KrishiMitra"}: {text}' for role, text in history)
+    return f"Recent conversation (oldest first):\n{lines}\n"
 
-    ---
-    User Query: "{user_query}"
-    ---
+def _coalesce_key(user_query: str, history: tuple) -> str:
+    query = " ".join(user_query.casefold().split()).rstrip("?!.।")
+    if not history:
+        return query
+    digest = hashlib.blake2b(repr(tuple(history)).encode(), digest_size=8).hexdigest()
+    return f"{query}|{digest}"
 
-    Respond with ONLY the JSON object. Do not add any extra text or formatting.
+def parse_action(text: str) -> dict:
     """
+    The action in a schema-constrained reply: `call_tools` if it has any entries,
+    else `final_response`. Raises ValueError for anything else.
+    """
+    action = json.loads(text)
+    if not isinstance(action, dict):
+        raise ValueError(f"expected a JSON object, got {type(action).__name__}")
+    if action.get("call_tools"):
+        return {"call_tools": action["call_tools"]}
+    if action.get("call_tool"):
+        return {"call_tool": action["call_tool"]}
+    if isinstance(action.get("final_response"), str) and action["final_response"].strip():
+        return {"final_response": action["final_response"]}
+    raise ValueError(f"no action in {text[:200]!r}")
+
+async def _ask_gemini(model, contents: str) -> dict:
+    response = await run_blocking(GEMINI, model.generate_content, contents, safety_settings=SAFETY_SETTINGS)
+    return parse_action(response.text)
+
+async def handle_query_with_ai_async(user_query: str, history: tuple = ()) -> dict:
+    """
+    Turns a farmer's message into a `call_tools` (or single `call_tool`) or `final_response` action.
+    `history` holds recent (role, text) messages from the user's session.
+    """
+    # Local fast path: common queries skip the Gemini round-trip entirely.
+    if settings.INTENT_FAST_PATH:
+        action = classify_intent(user_query)
+        if action is not None:
+            return action
+
+    model = await get_model_async(INTENT_MODEL)
+    if not model:
+        return {"final_response": "AI model is not available. Please check the server configuration."}
+
+    contents = f'{_format_history(history)}User Query: "{user_query}"'
     try:
-        # Safety settings can remain the same
-        safety_settings = [
-            {"category": "HARM_CATEGORY_HARASSMENT", "threshold": "BLOCK_NONE"},
-            {"category": "HARM_CATEGORY_HATE_SPEECH", "threshold": "BLOCK_NONE"},
-        ]
-        response = model.generate_content(meta_prompt, safety_settings=safety_settings)
-        # Your JSON parsing logic is good, keep it
-        json_string = response.text.strip().replace("```json", "").replace("```", "")
-        return json.loads(json_string)
+        return await intent_cache.get_or_fetch(
+            _coalesce_key(user_query, history), lambda: _ask_gemini(model, contents)
+        )
     except Exception as e:
-        print(f"Gemini Meta-Prompt Error: {e}")
-        return {"final_response": "I'm sorry, I had trouble understanding that. Can you please rephrase?"}
+        logger.error("Gemini intent parsing error: %r", e)
+        ERRORS.inc("intent_parse")
+        return {"final_response": PARSE_FAILED_REPLY}
+
+def handle_query_with_ai(user_query: str, history: tuple = ()) -> dict:
+    """Sync wrapper around handle_query_with_ai_async."""
+    return run_sync(handle_query_with_ai_async(user_query, history))
     
 
+async def translate_final_text_async(text: str, lang_code: str) -> str:
+    """Translates a reply, served from the translation cache where possible."""
+    with STAGE_SECONDS.time("translation"):
+        return await translate_async(text, lang_code)
+
+async def translate_final_texts_async(texts: list[str], lang_code: str) -> list[str]:
+    """Translates the parts of a multi-part reply together, in one pass."""
+    with STAGE_SECONDS.time("translation"):
+        return await translate_all_async(texts, lang_code)
+
 def translate_final_text(text: str, lang_code: str) -> str:
-    if lang_code == 'en' or not model:
-        return text
-    prompt = f"Translate the following text to the language with the code '{lang_code}'. Respond with only the translated text. Text: \"{text}\""
-    try:
-        response = model.generate_content(prompt)
-        return response.text.strip()
-    except Exception as e:
-        print(f"Final translation error: {e}")
-        return text
\ No newline at end of file
+    """Sync wrapper around translate_final_text_async."""
+    return run_sync(translate_final_text_async(text, lang_code))
@@ -0,0 +1,139 @@
+# utils/image_admission.py
+"""
+Admission checks for incoming photos, cheapest first, so that videos, documents
+and unusable photos get an instant "please resend" reply instead of costing a
+full decode, model inference and a paid Gemini Vision call:
+
+1. `check_response`: the media response's Content-Type and Content-Length,
+   before any of the body is read.
+2. `ByteCap`: the running total of the streamed body.
+3. `probe`: format and dimensions from the image header only.
+4. `check_quality`: brightness, share of plant-coloured pixels and sharpness,
+   measured with NumPy on the small decoded image the model gets anyway.
+
+Each failed check raises ImageRejected, whose `reply` is the message to send.
+`vision_payload` separately downscales a photo before it is uploaded to Gemini.
+"""
+import io
+
+import numpy as np
+from PIL import Image
+
+from core.config import settings
+from utils.image_pipeline import open_image
+from utils.templates import register_static_text
+
+ACCEPTED_TYPES = ("image/jpeg", "image/jpg", "image/png", "image/webp")
+ACCEPTED_FORMATS = ("JPEG", "PNG", "WEBP", "MPO")  # MPO: multi-picture JPEGs from some phone cameras
+
+RESEND_REPLIES = {
+    "not_image": "That file is not a photo. Please send a photo of the affected leaf.",
+    "too_large": "That file is too large. Please send the leaf as a normal photo, not as a document.",
+    "too_small": "That photo is too small to see the leaf. Please send a closer, larger photo.",
+    "too_dark": "That photo is too dark. Please take it again in daylight.",
+    "too_bright": "That photo is too bright to see the leaf. Please take it again out of direct glare.",
+    "not_leaf": "We could not find a leaf in that photo. Please send a close-up of one affected leaf.",
+    "blurry": "That photo is blurry. Please hold the phone steady and send a sharp close-up of the leaf.",
+}
+register_static_text(*RESEND_REPLIES.values())
+
+
+class ImageRejected(ValueError):
+    """An incoming photo failed admission; `reason` is a RESEND_REPLIES key."""
+
+    def __init__(self, reason: str, detail: str = ""):
+        super().__init__(f"{reason}: {detail}" if detail else reason)
+        self.reason = reason
+
+    @property
+    def reply(self) -> str:
+        return RESEND_REPLIES[self.reason]
+
+
+def check_response(headers) -> None:
+    """Rejects media by its declared Content-Type and Content-Length before the body is downloaded."""
+    content_type = headers.get("content-type", "").split(";")[0].strip().lower()
+    if content_type and content_type not in ACCEPTED_TYPES:
+        raise ImageRejected("not_image", content_type)
+    length = headers.get("content-length")
+    if length and length.isdigit() and int(length) > settings.IMAGE_MAX_BYTES:
+        raise ImageRejected("too_large", f"{length} bytes")
+
+
+class ByteCap:
+    """Counts streamed bytes and rejects the download as soon as it passes IMAGE_MAX_BYTES."""
+
+    def __init__(self, limit: int | None = None):
+        self.limit = settings.IMAGE_MAX_BYTES if limit is None else limit
+        self.total = 0
+
+    def add(self, n: int) -> None:
+        self.total += n
+        if self.total > self.limit:
+            raise ImageRejected("too_large", f"over {self.limit} bytes")
+
+
+def probe(data: bytes | bytearray) -> tuple[str, int, int]:
+    """(format, width, height) read from the header only; rejects non-images and odd sizes."""
+    try:
+        img = open_image(data)
+    except Exception as e:
+        raise ImageRejected("not_image", repr(e))
+    if img.format not in ACCEPTED_FORMATS:
+        raise ImageRejected("not_image", str(img.format))
+    width, height = img.size
+    if min(width, height) < settings.IMAGE_MIN_SIDE:
+        raise ImageRejected("too_small", f"{width}x{height}")
+    if width * height > settings.IMAGE_MAX_PIXELS:
+        raise ImageRejected("too_large", f"{width}x{height}")
+    return img.format, width, height
+
+
+def quality(img: Image.Image) -> dict:
+    """
+    Brightness (mean luma, 0-255), plant_ratio (share of saturated pixels in the
+    yellow-green-brown range, where leaves and lesions fall) and sharpness
+    (variance of the Laplacian) of an RGB image, sampled at half resolution.
+    """
+    a = np.asarray(img, dtype=np.float32)[::2, ::2]
+    r, g, b = a[..., 0], a[..., 1], a[..., 2]
+    luma = 0.299 * r + 0.587 * g + 0.114 * b
+    laplacian = 4 * luma[1:-1, 1:-1] - luma[:-2, 1:-1] - luma[2:, 1:-1] - luma[1:-1, :-2] - luma[1:-1, 2:]
+    high, low = a.max(axis=-1), a.min(axis=-1)
+    saturated = (high - low) > 0.15 * high
+    plant = saturated & (high > 30) & (g > b) & (r < 1.6 * g)
+    return {
+        "brightness": float(luma.mean()),
+        "plant_ratio": float(plant.mean()),
+        "sharpness": float(laplacian.var()),
+    }
+
+
+def check_quality(img: Image.Image) -> dict:
+    """Rejects photos that are too dark, show no leaf, are too bright or are blurry; returns the measurements."""
+    q = quality(img)
+    if q["brightness"] < settings.IMAGE_MIN_BRIGHTNESS:
+        raise ImageRejected("too_dark", f"brightness {q['brightness']:.0f}")
+    if q["plant_ratio"] < settings.IMAGE_MIN_PLANT_RATIO:
+        raise ImageRejected("not_leaf", f"plant ratio {q['plant_ratio']:.2f}")
+    if q["brightness"] > settings.IMAGE_MAX_BRIGHTNESS:
+        raise ImageRejected("too_bright", f"brightness {q['brightness']:.0f}")
+    if q["sharpness"] < settings.IMAGE_MIN_SHARPNESS:
+        raise ImageRejected("blurry", f"sharpness {q['sharpness']:.0f}")
+    return q
+
+
+def vision_payload(img: Image.Image) -> dict:
+    """
+    The photo as a JPEG blob for Gemini, at most VISION_MAX_SIDE pixels on its
+    longer side. Given a PIL image, the SDK would upload it at full resolution as
+    lossless WebP, which is slow to encode and often larger than the original.
+    """
+    side = settings.VISION_MAX_SIDE
+    if img.format == "JPEG":
+        img.draft("RGB", (side, side))  # only before the pixels are loaded; a no-op after
+    img = img.convert("RGB")
+    img.thumbnail((side, side), Image.Resampling.BILINEAR)
+    buf = io.BytesIO()
+    img.save(buf, format="JPEG", quality=settings.VISION_JPEG_QUALITY)
+    return {"mime_type": "image/jpeg", "data": buf.getvalue()}
@@ -0,0 +1,34 @@
+# utils/image_hash.py
+import numpy as np
+from PIL import Image
+
+HASH_BITS = 64
+
+def _gray(img: Image.Image, width: int, height: int) -> np.ndarray:
+    return np.asarray(img.convert("L").resize((width, height), Image.Resampling.BILINEAR), dtype=np.float32)
+
+def _pack(bits: np.ndarray) -> int:
+    return int.from_bytes(np.packbits(bits.ravel()).tobytes(), "big")
+
+def dhash(img: Image.Image) -> int:
+    """64-bit difference hash: whether each pixel of a 9x8 thumbnail is brighter than its right neighbour."""
+    pixels = _gray(img, 9, 8)
+    return _pack(pixels[:, 1:] > pixels[:, :-1])
+
+_DCT_SIZE = 32
+# Orthonormal DCT-II basis; pHash keeps the 8x8 lowest frequencies of a 32x32 thumbnail.
+_k = np.arange(_DCT_SIZE)
+_DCT = np.cos(np.pi * (2 * _k[None, :] + 1) * _k[:, None] / (2 * _DCT_SIZE)).astype(np.float32)
+
+def phash(img: Image.Image) -> int:
+    """
+    64-bit perceptual hash: the sign of the low-frequency DCT coefficients relative
+    to their median. Survives re-compression, resizing and small crops better than dHash.
+    """
+    coeffs = (_DCT @ _gray(img, _DCT_SIZE, _DCT_SIZE) @ _DCT.T)[:8, :8]
+    return _pack(coeffs > np.median(coeffs))
+
+HASHERS = {"phash": phash, "dhash": dhash}
+
+def hamming(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
@@ -0,0 +1,260 @@
+# utils/intent_router.py
+"""
+Local fast-path intent router.
+
+Handles the common, unambiguous messages ("hi", "thanks", "Indore ka mausam",
+"gehu ka bhav Dewas", "Indore weather and soyabean bhav in Dewas") with keyword
+tables in English, Hindi and Marathi plus the city gazetteer, and returns the same
+`call_tool` / `call_tools` / `final_response` dict that the Gemini meta-prompt
+produces. Anything it is not confident about returns None so the caller falls
+back to Gemini.
+"""
+import re
+
+from utils.location_extractor import INDIAN_CITIES
+from utils.normalize import CITY_ALIASES, COMMODITY_ALIASES, normalize_text
+
+# Longer messages (or questions, for multi-question messages) tend to carry context
+# the keyword tables cannot see.
+MAX_TOKENS = 12
+MAX_QUESTIONS = 3
+
+# Phrases that ask for reasoning, advice or history rather than a lookup ("why is the
+# price falling", "no rain for 3 weeks, what should I do", "how much rain last year").
+# A message containing one always goes to Gemini, even if it names a tool and a city.
+REASONING_WORDS = {
+    "why", "how much", "how many", "how to", "what should", "should i", "what to do", "what can",
+    "advice", "suggest", "compare", "last year", "last month", "last week", "last season", "falling",
+    "rising", "no rain", "kyon", "kyun", "kyu", "kya karu", "kya karun", "kya kare", "kya karen",
+    "kya karna", "kaise kare", "salah", "pichle saal", "pichhle saal", "pichle mahine", "gir raha",
+    "badh raha", "kay karu", "kay karave", "gelya varshi", "क्यों", "क्या करूं", "क्या करूँ", "क्या करें",
+    "क्या करना", "सलाह", "पिछले साल", "पिछले महीने", "गिर रहा", "बढ़ रहा", "काय करू", "काय करावे",
+    "सल्ला", "गेल्या वर्षी",
+}
+# Words that add nothing to a lookup. Any other token the tables do not know (a number,
+# "subsidy", "fertilizer") is context the fast path would drop, so more than
+# MAX_UNKNOWN_TOKENS of them send the message to Gemini.
+STOP_WORDS = {
+    "a", "the", "in", "of", "for", "at", "on", "to", "is", "what", "whats", "tell", "me", "my",
+    "please", "today", "todays", "tomorrow", "now", "current", "check", "show", "give", "i", "want",
+    "know", "will", "it", "crop", "fasal", "kitna", "kitni", "bhi", "se", "pe", "par", "mai", "mera",
+    "meri", "abhi", "lag", "gaya", "gaye", "aa", "raha", "rahi", "do", "dijiye", "la", "cha", "chi",
+    "che", "patti", "leaf", "leaves", "plant", "khet", "में", "का", "की", "के", "है", "हैं", "क्या",
+    "कितना", "बताओ", "बताइए", "आज", "फसल", "लग", "गया", "मध्ये", "आहे", "काय", "सांगा", "किती",
+    "चा", "ची", "चे",
+}
+MAX_UNKNOWN_TOKENS = 2
+
+# Words that join two questions in one message.
+CONJUNCTIONS = {"and", "aur", "or", "ani", "aani", "tatha", "और", "तथा", "आणि", "व"}
+
+GREETING_WORDS = {
+    "hi", "hii", "hello", "hey", "helo", "namaste", "namaskar", "namskar", "ram ram", "jai kisan",
+    "good morning", "good evening", "नमस्ते", "नमस्कार", "राम राम", "जय किसान",
+}
+THANKS_WORDS = {
+    "thanks", "thank you", "thank u", "thankyou", "thx", "dhanyavad", "dhanyawad", "shukriya",
+    "dhanyavaad", "aabhar", "धन्यवाद", "शुक्रिया", "आभार",
+}
+# Filler that may accompany a greeting or thanks without changing its meaning.
+FILLER_WORDS = {"ji", "bhai", "sir", "mitra", "krishimitra", "जी", "भाई", "सर", "मित्र", "so", "much", "very", "bahut", "बहुत"}
+
+WEATHER_WORDS = {
+    "weather", "forecast", "temperature", "rain", "raining", "humidity", "mausam", "mosam", "mousam",
+    "barish", "baarish", "barsat", "tapman", "havaman", "paus", "मौसम", "बारिश", "बरसात", "तापमान",
+    "हवामान", "पाऊस", "पानी गिरेगा",
+}
+PRICE_WORDS = {
+    "price", "prices", "rate", "rates", "bhav", "bhaav", "mandi", "mandi bhav", "daam", "dar", "kimat",
+    "keemat", "kimmat", "bajarbhav", "bajar bhav", "market price", "भाव", "दाम", "मंडी", "कीमत", "किंमत",
+    "दर", "बाजारभाव", "बाजार भाव", "रेट",
+}
+DISEASE_WORDS = {
+    "disease", "diseased", "pest", "pests", "insect", "fungus", "infection", "spots", "spot", "blight",
+    "rust", "mildew", "sick", "yellow leaves", "keeda", "keede", "kida", "rog", "bimari", "beemari",
+    "dhabbe", "illi", "कीड़ा", "कीड़े", "कीट", "रोग", "बीमारी", "धब्बे", "इल्ली", "कीड", "पीली पत्ती",
+    "फफूंद", "आजार",
+}
+CROP_WORDS = {
+    "wheat", "soybean", "gram", "maize", "cotton", "onion", "potato", "tomato", "rice", "paddy",
+    "mustard", "arhar", "moong", "urad", "garlic", "chilli",
+}
+
+HINDI_MARKERS = {
+    "ka", "ki", "ke", "kya", "hai", "hain", "kitna", "kitne", "batao", "bataiye", "aaj", "kal", "mein",
+    "ko", "kaisa", "kaise", "mausam", "namaste", "dhanyavad", "shukriya", "barish",
+}
+MARATHI_MARKERS = {
+    "aahe", "ahe", "kay", "kasa", "kashi", "madhe", "madhye", "havaman", "paus", "bajarbhav", "kiti",
+    "sanga", "आहे", "काय", "कसा", "कसे", "मध्ये", "हवामान", "पाऊस", "किंमत", "बाजारभाव", "सांगा",
+    "आजार", "चा", "ची", "चे",
+}
+_DEVANAGARI = re.compile(r"[ऀ-ॿ]")
+
+GREETING_REPLIES = {
+    "en": "Namaste! 🙏 I'm KrishiMitra, your farming friend. Ask me about the weather or mandi prices, or send a photo of a sick leaf.",
+    "hi": "नमस्ते! 🙏 मैं कृषिमित्र हूँ, आपका खेती का साथी। मुझसे मौसम या मंडी भाव पूछें, या बीमार पत्ती की फोटो भेजें।",
+    "mr": "नमस्कार! 🙏 मी कृषीमित्र, तुमचा शेतीचा मित्र. मला हवामान किंवा बाजारभाव विचारा, किंवा आजारी पानाचा फोटो पाठवा.",
+}
+THANKS_REPLIES = {
+    "en": "You're welcome! 🌾 Happy farming. Message me anytime.",
+    "hi": "आपका स्वागत है! 🌾 खेती के लिए शुभकामनाएँ। कभी भी मैसेज करें।",
+    "mr": "तुमचे स्वागत आहे! 🌾 शेतीसाठी शुभेच्छा. कधीही मेसेज करा.",
+}
+
+
+class _Lexicon:
+    """Phrase table over normalized token n-grams with greedy longest-match scanning."""
+
+    def __init__(self):
+        self.phrases: dict[tuple[str, ...], tuple[str, str]] = {}
+        self.max_len = 1
+
+    def add(self, phrase: str, kind: str, value: str | None = None) -> None:
+        tokens = tuple(normalize_text(phrase).split())
+        if not tokens:
+            return
+        # First registration wins, so more specific tables are added first.
+        self.phrases.setdefault(tokens, (kind, value or " ".join(tokens)))
+        self.max_len = max(self.max_len, len(tokens))
+
+    def scan(self, tokens: list[str]) -> tuple[list[tuple[str, str, str]], list[str]]:
+        """
+        The (kind, value, matched text) phrases found in `tokens`, and the tokens no
+        phrase covered. `value` is the canonical form ("allahabad" for "prayagraj").
+        """
+        found, unmatched, i = [], [], 0
+        while i < len(tokens):
+            for n in range(min(self.max_len, len(tokens) - i), 0, -1):
+                hit = self.phrases.get(tuple(tokens[i:i + n]))
+                if hit:
+                    found.append((*hit, " ".join(tokens[i:i + n])))
+                    i += n
+                    break
+            else:
+                unmatched.append(tokens[i])
+                i += 1
+        return found, unmatched
+
+
+def _build_lexicon() -> _Lexicon:
+    lex = _Lexicon()
+    for words, kind in (
+        (PRICE_WORDS, "price"), (WEATHER_WORDS, "weather"), (DISEASE_WORDS, "disease"),
+        (GREETING_WORDS, "greeting"), (THANKS_WORDS, "thanks"), (FILLER_WORDS, "filler"),
+        (REASONING_WORDS, "reasoning"),
+    ):
+        for w in words:
+            lex.add(w, kind)
+    for alias, canonical in COMMODITY_ALIASES.items():
+        lex.add(alias, "commodity", canonical)
+    for crop in CROP_WORDS:
+        lex.add(crop, "commodity", crop)
+    for alias, canonical in CITY_ALIASES.items():
+        lex.add(alias, "city", canonical)
+        lex.add(canonical, "city", canonical)
+    for city in INDIAN_CITIES:
+        lex.add(city, "city", normalize_text(city))
+    return lex
+
+
+_LEXICON = _build_lexicon()
+
+
+def detect_language(text: str, tokens: list[str]) -> str:
+    marathi = sum(t in MARATHI_MARKERS for t in tokens)
+    if _DEVANAGARI.search(text):
+        return "mr" if marathi else "hi"
+    hindi = sum(t in HINDI_MARKERS for t in tokens)
+    if marathi > hindi:
+        return "mr"
+    return "hi" if hindi else "en"
+
+
+def _display(name: str) -> str:
+    return " ".join(part.capitalize() for part in name.split())
+
+
+def classify_intent(user_query: str) -> dict | None:
+    """
+    Returns a `call_tool` / `call_tools` / `final_response` action when the query is
+    unambiguous, otherwise None (meaning: ask Gemini).
+    """
+    tokens = normalize_text(user_query).split()
+    if not tokens:
+        return None
+    lang_code = detect_language(user_query, tokens)
+    if len(tokens) <= MAX_TOKENS:
+        action = _classify_tokens(tokens, lang_code)
+        if action is not None:
+            return action
+    return _classify_questions(tokens, lang_code)
+
+
+def _classify_questions(tokens: list[str], lang_code: str) -> dict | None:
+    """Splits at conjunctions; a `call_tools` action only if every part is a clear tool call."""
+    questions, current = [], []
+    for token in tokens:
+        if token in CONJUNCTIONS:
+            if current:
+                questions.append(current)
+            current = []
+        else:
+            current.append(token)
+    if current:
+        questions.append(current)
+    if not 2 <= len(questions) <= MAX_QUESTIONS or any(len(q) > MAX_TOKENS for q in questions):
+        return None
+
+    calls = []
+    for question in questions:
+        action = _classify_tokens(question, lang_code)
+        if action is None or "call_tool" not in action:
+            return None
+        calls.append(action["call_tool"])
+    return {"call_tools": calls}
+
+
+def _classify_tokens(tokens: list[str], lang_code: str) -> dict | None:
+    hits, unmatched = _LEXICON.scan(tokens)
+    kinds = [kind for kind, _, _ in hits]
+    if "reasoning" in kinds:
+        return None
+    unknown = [t for t in unmatched if t not in STOP_WORDS and t not in HINDI_MARKERS and t not in MARATHI_MARKERS]
+    if len(unknown) > MAX_UNKNOWN_TOKENS:
+        return None
+    matched_tokens = sum(len(text.split()) for kind, _, text in hits if kind in ("greeting", "thanks", "filler"))
+
+    intents = {k for k in kinds if k in ("weather", "price", "disease")}
+    # Cities are compared by canonical name but passed on as the farmer wrote them:
+    # core/router canonicalizes only the cache key, and the report shows their spelling.
+    cities = [v for k, v, _ in hits if k == "city"]
+    city_texts = [text for k, _, text in hits if k == "city"]
+    commodities = [v for k, v, _ in hits if k == "commodity"]
+
+    # Pure greeting / thanks: every token is accounted for by those tables.
+    if not intents and not cities and not commodities and matched_tokens == len(tokens):
+        if "thanks" in kinds:
+            return {"final_response": THANKS_REPLIES[lang_code]}
+        if "greeting" in kinds:
+            return {"final_response": GREETING_REPLIES[lang_code]}
+        return None
+
+    if len(intents) != 1 or len(set(cities)) > 1 or len(set(commodities)) > 1:
+        return None
+    intent = intents.pop()
+
+    if intent == "weather" and cities and not commodities:
+        return _call_tool("get_weather_forecast", {"location": _display(city_texts[0])}, lang_code)
+    if intent == "price" and commodities:
+        params = {"commodity": _display(commodities[0])}
+        if cities:
+            params["location"] = _display(city_texts[0])
+        return _call_tool("get_market_price", params, lang_code)
+    if intent == "disease" and not cities:
+        return _call_tool("diagnose_plant_disease", {}, lang_code)
+    return None
+
+
+def _call_tool(tool_name: str, parameters: dict, lang_code: str) -> dict:
+    return {"call_tool": {"tool_name": tool_name, "parameters": parameters, "lang_code": lang_code}}
@@ -1,11 +1,14 @@
 # utils/location_extractor.py
 import json
-import re
-import spacy
+import logging
+from typing import Iterable
+
 from core.config import settings
+from core.lazy import LazyResource
+from utils.normalize import CITY_ALIASES, normalize_text
+
+logger = logging.getLogger(__name__)
 
-# Load spaCy model and city data once on startup
-nlp = spacy.load("en_core_web_sm")
 INDIAN_CITIES = []
 try:
     with open(settings.INDIAN_CITIES_PATH, 'r') as file:
@@ -13,18 +16,76 @@ try:
         if isinstance(data, list):
             INDIAN_CITIES = [city.lower() for city in data]
 except Exception as e:
-    print(f"Error loading cities file: {e}")
+    logger.error("Error loading cities file: %s", e)
+
+class LocationMatcher:
+    """
+    Token n-gram hash index over place names and aliases.
+
+    Each name is normalized and stored as a tuple of tokens, so a lookup costs
+    O(words x longest_name_in_tokens) dict probes no matter how large the
+    gazetteer is, and multi-word names like "Navi Mumbai" match as a unit.
+    """
+
+    def __init__(self, names: Iterable[str], aliases: dict[str, str] | None = None):
+        self._index: dict[tuple[str, ...], str] = {}
+        self.max_tokens = 1
+        # Aliases go first so misspellings in the data file ("Banglore") resolve to the canonical name.
+        for alias, canonical in (aliases or {}).items():
+            self.add(canonical)
+            self.add(alias, canonical)
+        for name in names:
+            self.add(name)
+
+    def add(self, name: str, canonical: str | None = None) -> None:
+        tokens = tuple(normalize_text(name).split())
+        if not tokens:
+            return
+        target = normalize_text(canonical) if canonical else " ".join(tokens)
+        # Keep the first mapping so duplicate entries in the data file are harmless.
+        self._index.setdefault(tokens, " ".join(part.capitalize() for part in target.split()))
+        self.max_tokens = max(self.max_tokens, len(tokens))
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def match(self, text: str) -> str | None:
+        """Returns the display name of the first (longest) place mentioned in `text`."""
+        words = normalize_text(text).split()
+        for i in range(len(words)):
+            for n in range(min(self.max_tokens, len(words) - i), 0, -1):
+                name = self._index.get(tuple(words[i:i + n]))
+                if name:
+                    return name
+        return None
+
+# Built once at import; matching never scans the gazetteer.
+location_matcher = LocationMatcher(INDIAN_CITIES, CITY_ALIASES)
+
+# --- spaCy NER, loaded lazily and only used as a last resort ---
+def _load_nlp():
+    import spacy
+    # Only the entity recognizer is needed for GPE lookups.
+    return spacy.load(
+        "en_core_web_sm",
+        exclude=["tagger", "parser", "attribute_ruler", "lemmatizer", "senter"],
+    )
+
+# Not required for readiness: the gazetteer answers most queries without it.
+nlp = LazyResource("spacy", _load_nlp, required=False)
 
 def extract_location(text: str) -> str | None:
     """Extracts a location (city) from the text."""
-    words = re.findall(r'\w+', text.lower())
-    for city in INDIAN_CITIES:
-        if city in words:
-            return city.capitalize()
-    
-    doc = nlp(text)
+    city = location_matcher.match(text)
+    if city:
+        return city
+
+    model = nlp.get()
+    if model is None:
+        return None
+    doc = model(text)
     for ent in doc.ents:
         if ent.label_ == "GPE": # GPE = Geopolitical Entity
             return ent.text
-            
-    return None
\ No newline at end of file
+
+    return None
@@ -0,0 +1,77 @@
+# utils/normalize.py
+import re
+import unicodedata
+
+# Common misspellings, old names and transliterations -> canonical city name.
+CITY_ALIASES = {
+    "banglore": "bangalore",
+    "bengaluru": "bangalore",
+    "bombay": "mumbai",
+    "calcutta": "kolkata",
+    "madras": "chennai",
+    "gurugram": "gurgaon",
+    "poona": "pune",
+    "baroda": "vadodara",
+    "trivandrum": "thiruvananthapuram",
+    "kozhikode": "calicut",
+    "bhubaneswar": "bhubaneshwar",
+    "prayagraj": "allahabad",
+    "khargon": "khargone",
+    "indor": "indore",
+    "इंदौर": "indore",
+    "भोपाल": "bhopal",
+    "खरगोन": "khargone",
+    "देवास": "dewas",
+    "उज्जैन": "ujjain",
+    "जबलपुर": "jabalpur",
+    "ग्वालियर": "gwalior",
+    "मुंबई": "mumbai",
+    "पुणे": "pune",
+    "नागपुर": "nagpur",
+    "नाशिक": "nashik",
+    "दिल्ली": "delhi",
+}
+
+# Hindi/Marathi crop names (Latin and Devanagari) -> canonical English commodity.
+COMMODITY_ALIASES = {
+    "gehu": "wheat", "gehun": "wheat", "gahu": "wheat", "गेहूं": "wheat", "गेहूँ": "wheat", "गहू": "wheat",
+    "soyabean": "soybean", "soya": "soybean", "soyabeen": "soybean", "सोयाबीन": "soybean",
+    "chana": "gram", "channa": "gram", "harbhara": "gram", "चना": "gram", "हरभरा": "gram",
+    "makka": "maize", "makkai": "maize", "corn": "maize", "मक्का": "maize", "मका": "maize",
+    "kapas": "cotton", "kapus": "cotton", "कपास": "cotton", "कापूस": "cotton",
+    "pyaz": "onion", "pyaj": "onion", "kanda": "onion", "प्याज": "onion", "कांदा": "onion",
+    "aloo": "potato", "alu": "potato", "batata": "potato", "आलू": "potato", "बटाटा": "potato",
+    "tamatar": "tomato", "टमाटर": "tomato", "टोमॅटो": "tomato",
+    "dhan": "paddy", "chawal": "rice", "धान": "paddy", "चावल": "rice", "तांदूळ": "rice",
+    "sarson": "mustard", "सरसों": "mustard", "मोहरी": "mustard",
+    "tur": "arhar", "toor": "arhar", "tuar": "arhar", "तुअर": "arhar", "अरहर": "arhar", "तूर": "arhar",
+    "moong": "moong", "mung": "moong", "मूंग": "moong",
+    "urad": "urad", "udad": "urad", "उड़द": "urad", "उडीद": "urad",
+    "lahsun": "garlic", "lehsun": "garlic", "लहसुन": "garlic", "लसूण": "garlic",
+    "mirchi": "chilli", "mirch": "chilli", "मिर्च": "chilli", "मिरची": "chilli",
+}
+
+_SPACES = re.compile(r"\s+")
+
+def _strip_punctuation(text: str) -> str:
+    # Category-based rather than [^\w] so Devanagari vowel signs (Mn/Mc) survive.
+    return "".join(" " if unicodedata.category(ch)[0] in "PS" else ch for ch in text)
+
+def normalize_text(text: str | None) -> str:
+    """Unicode-normalizes, case-folds, strips punctuation and collapses whitespace."""
+    if not text:
+        return ""
+    text = unicodedata.normalize("NFC", text).casefold()
+    return _SPACES.sub(" ", _strip_punctuation(text)).strip()
+
+def normalize_city(city: str | None) -> str:
+    name = normalize_text(city)
+    return CITY_ALIASES.get(name, name)
+
+def normalize_commodity(commodity: str | None) -> str:
+    name = normalize_text(commodity)
+    return COMMODITY_ALIASES.get(name, name)
+
+# Keys go through the same normalization as lookups (e.g. NFC decomposes some Devanagari nukta forms).
+CITY_ALIASES = {normalize_text(k): v for k, v in CITY_ALIASES.items()}
+COMMODITY_ALIASES = {normalize_text(k): v for k, v in COMMODITY_ALIASES.items()}
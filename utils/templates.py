@@ -0,0 +1,47 @@
+# utils/templates.py
+import json
+
+# Every fixed reply string the bot can send. The translation warm-up pre-translates
+# these (and the templates' skeletons) at startup for the configured languages.
+STATIC_TEXTS: set[str] = set()
+
+class TemplatedText(str):
+    """
+    A rendered reply that remembers the template it came from.
+
+    It behaves exactly like the rendered string, but translation can translate the
+    fixed `template` skeleton once (cached), then substitute `values` afterwards.
+    Only the value fields named in `translatable` are translated themselves; the
+    rest (numbers, place names) are inserted verbatim.
+    """
+
+    def __new__(cls, template: str, values: dict, translatable: tuple[str, ...] = ()):
+        obj = super().__new__(cls, template.format(**values))
+        obj.template = template
+        obj.values = values
+        obj.translatable = tuple(translatable)
+        return obj
+
+def register_static_text(*texts: str) -> None:
+    STATIC_TEXTS.update(t for t in texts if t)
+
+def register_template(template: str) -> str:
+    """Registers a template skeleton for warm-up and returns it, for use at definition time."""
+    STATIC_TEXTS.add(template)
+    return template
+
+class TextCodec:
+    """JSON codec for cache backends that preserves TemplatedText across restarts."""
+
+    @staticmethod
+    def dumps(value) -> str:
+        if isinstance(value, TemplatedText):
+            return json.dumps({"template": value.template, "values": value.values, "translatable": value.translatable})
+        return json.dumps(value)
+
+    @staticmethod
+    def loads(raw: str):
+        value = json.loads(raw)
+        if isinstance(value, dict) and "template" in value:
+            return TemplatedText(value["template"], value["values"], tuple(value["translatable"]))
+        return value
@@ -0,0 +1,186 @@
+# utils/translation.py
+import asyncio
+import hashlib
+import json
+import logging
+import re
+import time
+from string import Formatter
+
+from core.cache import create_cache
+from core.config import settings
+from core.gemini import get_model_async
+from core.http_client import GEMINI, run_blocking
+from core.metrics import ERRORS
+from utils.templates import STATIC_TEXTS, TemplatedText, TextCodec
+
+logger = logging.getLogger(__name__)
+
+# Translations of the same text never change, so entries live for a long time and
+# (with the SQLite backend) survive restarts. Async code reads and writes it through
+# the *_async methods, so SQLite runs in a thread rather than on the event loop.
+translation_cache = create_cache(
+    "translation", settings.TRANSLATION_CACHE_TTL, settings.TRANSLATION_CACHE_SIZE,
+    backend=settings.TRANSLATION_CACHE_BACKEND, sqlite_path=settings.TRANSLATION_CACHE_PATH,
+    codec=TextCodec,
+)
+
+_FORMATTER = Formatter()
+# Only strip a Markdown fence around the whole reply; the disclaimer inside replies uses ``` too.
+_FENCE = re.compile(r"^```(?:json)?\s*|\s*```$")
+
+def _cache_key(text: str, lang_code: str) -> str:
+    return f"{lang_code}:{hashlib.sha1(text.encode('utf-8')).hexdigest()}"
+
+def _placeholders(template: str) -> set[str]:
+    return {field for _, field, _, _ in _FORMATTER.parse(template) if field}
+
+async def _translate_one(text: str, lang_code: str) -> str:
+    prompt = (
+        f"Translate the following text to the language with the code '{lang_code}'. "
+        f"Keep emojis, *asterisks*, _underscores_, line breaks and any placeholders in curly braces "
+        f"(like {{temp}}) exactly as they are. Respond with only the translated text. Text: \"{text}\""
+    )
+    model = await get_model_async()
+    response = await run_blocking(GEMINI, model.generate_content, prompt)
+    return response.text.strip()
+
+async def _translate_many(texts: list[str], lang_code: str) -> list[str]:
+    """Translates several strings in one Gemini call; raises if the reply does not line up."""
+    prompt = (
+        f"Translate each string in the JSON array below to the language with the code '{lang_code}'. "
+        f"Keep emojis, *asterisks*, _underscores_, line breaks and any placeholders in curly braces "
+        f"(like {{temp}}) exactly as they are. Respond with ONLY a JSON array of the translated strings, "
+        f"same length and same order.\n{json.dumps(texts, ensure_ascii=False)}"
+    )
+    model = await get_model_async()
+    response = await run_blocking(GEMINI, model.generate_content, prompt)
+    translated = json.loads(_FENCE.sub("", response.text.strip()))
+    if not isinstance(translated, list) or len(translated) != len(texts):
+        raise ValueError(f"Batch translation returned {len(translated)} items for {len(texts)} inputs")
+    return [str(t).strip() for t in translated]
+
+async def translate_batch_async(texts: list[str], lang_code: str) -> list[str]:
+    """
+    Translates `texts`, serving cached entries and sending the rest to Gemini in
+    one batched call. Strings that fail to translate come back unchanged (and uncached).
+    """
+    if lang_code == 'en' or not await get_model_async():
+        return list(texts)
+
+    unique = [t for t in set(texts) if t]
+    cached = await translation_cache.get_many_async([_cache_key(t, lang_code) for t in unique])
+    results = {t: cached[_cache_key(t, lang_code)] for t in unique}
+    missing = [t for t, translated in results.items() if translated is None]
+
+    if len(missing) == 1:
+        text = missing[0]
+        try:
+            results[text] = await translation_cache.get_or_fetch(
+                _cache_key(text, lang_code), lambda: _translate_one(text, lang_code)
+            )
+        except Exception as e:
+            logger.error("Translation error: %r", e)
+            ERRORS.inc("translation")
+    elif missing:
+        try:
+            for text, translated in zip(missing, await _translate_many(missing, lang_code)):
+                await translation_cache.set_async(_cache_key(text, lang_code), translated)
+                results[text] = translated
+        except Exception as e:
+            logger.warning("Batch translation error, translating individually: %r", e)
+            singles = await asyncio.gather(
+                *(translate_batch_async([t], lang_code) for t in missing)
+            )
+            results.update({t: s[0] for t, s in zip(missing, singles)})
+
+    return [results.get(t) or t for t in texts]
+
+async def cached_translation_async(text: str, lang_code: str) -> str:
+    """The cached translation of `text`, or `text` itself; never calls Gemini."""
+    if lang_code == 'en' or not text:
+        return text
+    return await translation_cache.get_async(_cache_key(text, lang_code)) or text
+
+async def is_translated(text: str, lang_code: str) -> bool:
+    """Whether translate_async(text, lang_code) would be served entirely from the cache."""
+    if lang_code == 'en':
+        return True
+    now = time.time()
+    for part in _parts(text):
+        entry = await translation_cache.peek_async(_cache_key(part, lang_code))
+        if entry is None or entry[0] <= now:
+            return False
+    return True
+
+def _parts(text: str) -> list[str]:
+    """The strings to translate for one reply: its template skeleton and translatable values, or the text itself."""
+    if not text:
+        return []
+    if isinstance(text, TemplatedText):
+        fields = [f for f in text.translatable if f in text.values]
+        return [text.template, *(str(text.values[f]) for f in fields)]
+    return [text]
+
+def _assemble(text: str, translated: list[str]) -> str | None:
+    """Rebuilds one reply from its translated parts; None if the model mangled a placeholder."""
+    if not isinstance(text, TemplatedText):
+        return translated[0] if translated else text
+    skeleton = translated[0]
+    if _placeholders(skeleton) != _placeholders(text.template):
+        return None
+    fields = [f for f in text.translatable if f in text.values]
+    values = dict(text.values)
+    values.update(zip(fields, translated[1:]))
+    try:
+        return skeleton.format(**values)
+    except (KeyError, IndexError, ValueError):
+        return None
+
+async def translate_all_async(texts: list[str], lang_code: str) -> list[str]:
+    """
+    Translates several replies in one pass: the parts of every reply go into a
+    single translate_batch_async call, so at most one Gemini request is made.
+    """
+    if lang_code == 'en':
+        return list(texts)
+    parts = [_parts(t) for t in texts]
+    translated = await translate_batch_async([p for ps in parts for p in ps], lang_code)
+
+    results, retry, i = [], [], 0
+    for text, ps in zip(texts, parts):
+        result = _assemble(text, translated[i:i + len(ps)])
+        i += len(ps)
+        if result is None:
+            retry.append(len(results))
+        results.append(result)
+    if retry:
+        # Translate the rendered replies whose skeleton did not survive as a whole instead.
+        for j, fixed in zip(retry, await translate_batch_async([str(texts[j]) for j in retry], lang_code)):
+            results[j] = fixed
+    return results
+
+async def translate_async(text: str, lang_code: str) -> str:
+    """Translates one reply, using the template skeleton when the reply has one."""
+    if lang_code == 'en' or not text:
+        return text
+    return (await translate_all_async([text], lang_code))[0]
+
+async def warm_translations(lang_codes: list[str]) -> int:
+    """
+    Pre-translates every registered static reply and template skeleton for each
+    language. Already-cached strings cost nothing, so this is cheap after the first run.
+    Returns the number of strings sent to Gemini.
+    """
+    texts = sorted(STATIC_TEXTS)
+    sent = 0
+    for lang_code in lang_codes:
+        if lang_code == 'en':
+            continue
+        cached = await translation_cache.get_many_async([_cache_key(t, lang_code) for t in texts])
+        pending = [t for t in texts if cached[_cache_key(t, lang_code)] is None]
+        for i in range(0, len(pending), settings.TRANSLATION_BATCH_SIZE):
+            await translate_batch_async(pending[i:i + settings.TRANSLATION_BATCH_SIZE], lang_code)
+        sent += len(pending)
+        logger.info("Translation cache warm for '%s' (%d new of %d strings).", lang_code, len(pending), len(texts))
+    return sent